@@ -1,16 +1,53 @@
 import os
 import sys
-import shutil
+import bisect
+import heapq
+import time
+import multiprocessing
 import yaml  # pip install pyyaml
 import random
+from collections import namedtuple
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QFileDialog, QMessageBox, QScrollArea,
     QRadioButton, QGroupBox, QFrame, QDialog, QLineEdit, QTableWidget,
-    QTableWidgetItem, QHeaderView, QDialogButtonBox, QAbstractItemView
+    QTableWidgetItem, QHeaderView, QDialogButtonBox, QAbstractItemView,
+    QComboBox, QCheckBox, QDockWidget, QProgressDialog
 )
-from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QImage
-from PyQt5.QtCore import Qt, QRect, QPoint, QEvent, QStandardPaths
+from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QFontMetrics, QStaticText
+from PyQt5.QtCore import Qt, QRect, QPoint, QEvent, QStandardPaths, QThread, QTimer, pyqtSignal
+
+import numpy as np  # pip install numpy
+
+import via_yolo
+from via_boxes import BoxStore, yolo_to_coords
+from via_filmstrip import FilmstripDelegate, FilmstripModel, FilmstripView
+from via_history import EditHistory, Journal, add_many_op, add_op, apply_op, clear_op, delete_op
+from via_index import AnnotationIndex, stem_of
+from via_labelcache import LabelCache
+from via_leases import BatchLeases, batch_count
+from via_prefetch import ImagePrefetcher
+from via_proposals import ProposalProvider, filter_new, make_backend
+from via_remap import ClassRemap, class_mapping, discard_remap, pending_remap
+from via_output import OUTPUT_MODES, ImageOutput
+from via_phash import PhashCache, group_duplicates
+from via_savequeue import SaveJob, SaveQueue
+from via_scan import FolderScanner, path_key
+from via_sources import ARCHIVE_EXTS, VIDEO_EXTS, image_dims, iter_source_ids, source_name, split_source
+from via_stats import DatasetStats
+from via_statspanel import StatsPanel
+from via_thumbs import ThumbnailCache
+from via_tiles import TilePyramid
+from via_trace import TRACER
+
+# Upper bound for wheel zoom (display pixels per image pixel).
+MAX_ZOOM = 32.0
+# Above this many scaled pixels the image is drawn from tiles instead of
+# being rescaled as a whole.
+TILED_RENDER_PIXELS = 16 * 1024 * 1024
+# Viewport-sized decodes are rounded up to this many pixels so that small
+# window resizes keep hitting the decode cache.
+DECODE_SIZE_STEP = 256
 
 
 def resource_path(filename: str) -> str:
@@ -24,8 +61,46 @@ def resource_path(filename: str) -> str:
     return os.path.join(base_path, filename)
 
 
+# Pre-built painting state of one class: its outline pen and the name label
+# as prepared static text, with the label size measured once.
+BoxStyle = namedtuple("BoxStyle", "name pen text label_width label_height text_dx text_dy")
+
+LABEL_BRUSH = QColor(0, 0, 0, 128)
+LABEL_TEXT_COLOR = QColor(255, 255, 255)
+
+
+class BackgroundTask(QThread):
+    """
+    Runs func(*args) on a worker thread and emits its return value.
+    """
+
+    result = pyqtSignal(object)
+
+    def __init__(self, func, *args, parent=None):
+        super().__init__(parent)
+        self.func = func
+        self.args = args
+
+    def run(self):
+        try:
+            value = self.func(*self.args)
+        except Exception as e:
+            print(f"Background task failed: {e}")
+            value = None
+        self.result.emit(value)
+
+
 class BoundingBoxAnnotator(QMainWindow):
 
+    # Emitted from a proposal pool thread; delivered on the GUI thread.
+    proposals_ready = pyqtSignal(str, object)
+    # Emitted from a prefetch thread when a sharper decode of an image is ready.
+    image_ready = pyqtSignal(str, object)
+    # Emitted from the save worker with each SaveJob written, or that failed
+    # (with the error).
+    label_saved = pyqtSignal(object)
+    save_failed = pyqtSignal(object, str)
+
     def __init__(self):
         super().__init__()
 
@@ -35,6 +110,7 @@ class BoundingBoxAnnotator(QMainWindow):
             os.makedirs(config_dir)
         # YAML file will be stored here.
         self.yaml_path = os.path.join(config_dir, "classes.yaml")
+        self.config_dir = config_dir
 
         # Load classes from YAML (or create default if missing) and auto-assign colors.
         self.load_classes()
@@ -47,14 +123,29 @@ class BoundingBoxAnnotator(QMainWindow):
         self.image_folder = ""
         self.output_folder = ""
         self.image_list = []
+        self.image_keys = []  # natural-sort keys parallel to image_list
+        self.scanner = None
         self.current_idx = -1
         self.current_image_path = ""
-        self.boxes = []  # (QRect, class_id)
+        # Last image left with boxes on it; labels are copied forward from it.
+        self.copy_source_path = ""
+        self.image_width = 0
+        self.image_height = 0
+        self.boxes = BoxStore()  # original-pixel boxes; iterates as (QRect, class_id)
 
         self.drawing = False
         self.start_point = QPoint()
         self.end_point = QPoint()
         self.current_box = None
+        self.hover_row = -1  # box under the cursor, highlighted on the top layer
+
+        # Undo/redo of box edits on the current image, mirrored to a journal
+        # in the output folder. journal_base is the label mtime the edits of
+        # this visit started from; journal_dirty marks unsaved journaled edits.
+        self.history = EditHistory()
+        self.journal = None
+        self.journal_base = None
+        self.journal_dirty = False
         self.image_modified = False
         self.erasing = False
 
@@ -63,16 +154,102 @@ class BoundingBoxAnnotator(QMainWindow):
         else:
             self.current_class = 1
 
-        # Image display variables.
+        # Image display variables. original_image is decoded at the size the
+        # view needs (viewport-sized at zoom 1.0, which fits the window) and
+        # replaced by a sharper decode when zooming in; image_width and
+        # image_height always hold the true image size.
         self.original_pixmap = None
+        self.original_image = None
+        self.sharper_request = None
         self.scaled_pixmap = None
         self.image_rect = None
+        self.tile_pyramid = None
+
+        # Layered rendering caches: the scaled image is kept per display size,
+        # the base layer per (display size, viewport, offsets) and the overlay holds
+        # the committed boxes until they change.
+        self.scaled_key = None
+        self.base_layer = None
+        self.base_key = None
+        self.overlay_layer = None
 
         self.background_color = QColor(40, 40, 40, 255)
         self.x_offset = 0
         self.y_offset = 0
         self.zoom_factor = 1.0
 
+        # Decodes neighbouring images in the background (next 3, previous 1).
+        self.prefetcher = ImagePrefetcher(ahead=3, behind=1, max_bytes=512 * 1024 * 1024)
+        self.image_ready.connect(self.on_image_ready)
+        # Image copies and label writes are done by a background worker.
+        self.save_queue = SaveQueue(on_saved=self.on_job_saved, on_failed=self.save_failed.emit)
+        self.label_saved.connect(self.on_label_saved)
+        self.save_failed.connect(self.on_save_failed)
+        # How images are placed in output/images (see via_output).
+        self.output_mode = "auto"
+        self.image_output = None
+
+        # Annotation status index (see via_index) and the in-memory views of
+        # it used for navigation and progress.
+        self.index = None
+        self.index_task = None
+        self.labeled_stems = set()
+        self.labeled_count = 0
+        self.filter_class = None
+        self.filter_stems = None
+
+        # Parsed-label cache of labels_output (see via_labelcache), refreshed
+        # in the background whenever an output folder is opened. In dataset
+        # mode an existing images/ + labels/ tree is edited in place.
+        self.label_cache = None
+        self.cache_task = None
+        self.dataset_mode = False
+
+        # Perceptual hashes of image_list (see via_phash), cached in the app
+        # data folder. duplicate_anchors[i] is the first image of i's run of
+        # near-identical frames.
+        self.hash_cache = PhashCache(os.path.join(config_dir, "phash_cache.sqlite"))
+        self.hash_task = None
+        self.duplicate_anchors = []
+
+        # Thumbnails for the filmstrip, persisted in the app data folder.
+        self.thumbs = ThumbnailCache(os.path.join(config_dir, "thumbnails"))
+
+        # Label statistics of the output folder, rebuilt from the label cache
+        # and updated on every save.
+        self.stats = DatasetStats()
+
+        # Detector proposals (see via_proposals), enabled with
+        # VIA_PROPOSALS=stub or VIA_PROPOSALS=onnx:/path/model.onnx.
+        self.proposals = []
+        self.show_proposals = True
+        self.proposer = None
+        self.proposals_ready.connect(self.on_proposals_ready)
+        spec = os.environ.get("VIA_PROPOSALS")
+        if spec:
+            try:
+                self.proposer = ProposalProvider(make_backend(spec), ahead=self.prefetcher.ahead,
+                                                 behind=self.prefetcher.behind, on_ready=self.proposals_ready.emit)
+            except (ValueError, OSError) as e:
+                print(f"Proposals disabled: {e}")
+
+        # Performance overlay and Chrome trace file (F3, or VIA_TRACE=1 at start).
+        self.perf_overlay = TRACER.enabled
+        self.trace_path = None
+        self.trace_timer = QTimer(self)
+        self.trace_timer.setInterval(10000)
+        self.trace_timer.timeout.connect(self.write_trace)
+        if TRACER.enabled:
+            self.start_trace_file()
+
+        # Work-queue mode (see via_leases): navigation stays inside one leased
+        # batch of image_list, renewed by a heartbeat while it is held.
+        self.leases = None
+        self.work_batch = None
+        self.lease_timer = QTimer(self)
+        self.lease_timer.setInterval(60000)
+        self.lease_timer.timeout.connect(self.renew_lease)
+
         self.setup_ui()
 
     def load_classes(self):
@@ -148,6 +325,33 @@ class BoundingBoxAnnotator(QMainWindow):
                         break
 
         self.class_colors = {cls["id"]: QColor(cls["color_hex"]) for cls in self.classes}
+        self.build_render_styles()
+
+    def make_box_style(self, name, color, metrics):
+        pen = QPen(color)
+        pen.setWidth(2)
+        text = QStaticText(name)
+        text.prepare(font=self.font())
+        label_width = max(80, metrics.horizontalAdvance(name) + 8)
+        label_height = 20
+        return BoxStyle(name, pen, text, label_width, label_height,
+                        (label_width - metrics.horizontalAdvance(name)) // 2,
+                        (label_height - metrics.height()) // 2)
+
+    def build_render_styles(self):
+        """
+        Builds the id -> BoxStyle map used for painting, so repaints do not
+        allocate pens or look up class names per box.
+        """
+        metrics = QFontMetrics(self.font())
+        self.render_styles = {
+            cls["id"]: self.make_box_style(cls.get("name", "Unknown"), self.class_colors[cls["id"]], metrics)
+            for cls in self.classes
+        }
+        self.fallback_style = self.make_box_style("Unknown", QColor("#FFFF00"), metrics)
+
+    def style_for(self, class_id):
+        return self.render_styles.get(class_id, self.fallback_style)
 
     def setup_ui(self):
         main_widget = QWidget()
@@ -166,10 +370,30 @@ class BoundingBoxAnnotator(QMainWindow):
         self.input_btn.clicked.connect(self.select_input_folder)
         toolbar.addWidget(self.input_btn)
 
+        self.source_btn = QPushButton("Open Archive/Video")
+        self.source_btn.clicked.connect(self.select_input_source)
+        toolbar.addWidget(self.source_btn)
+
+        self.recursive_check = QCheckBox("Include subfolders")
+        self.recursive_check.setFocusPolicy(Qt.NoFocus)
+        toolbar.addWidget(self.recursive_check)
+
         self.output_btn = QPushButton("Select Output Folder")
         self.output_btn.clicked.connect(self.select_output_folder)
         toolbar.addWidget(self.output_btn)
 
+        self.dataset_btn = QPushButton("Open YOLO Dataset")
+        self.dataset_btn.setToolTip("Review an existing dataset folder with images/ and labels/ in place")
+        self.dataset_btn.clicked.connect(self.select_dataset_folder)
+        toolbar.addWidget(self.dataset_btn)
+
+        self.output_mode_combo = QComboBox()
+        self.output_mode_combo.addItems(OUTPUT_MODES)
+        self.output_mode_combo.setToolTip("How annotated images are placed in the output images folder")
+        self.output_mode_combo.setFocusPolicy(Qt.NoFocus)
+        self.output_mode_combo.currentTextChanged.connect(self.set_output_mode)
+        toolbar.addWidget(self.output_mode_combo)
+
         self.prev_btn = QPushButton("Previous")
         self.prev_btn.clicked.connect(lambda: self.change_image(-1))
         toolbar.addWidget(self.prev_btn)
@@ -191,19 +415,84 @@ class BoundingBoxAnnotator(QMainWindow):
         self.config_btn.clicked.connect(self.edit_classes)
         toolbar.addWidget(self.config_btn)
 
+        self.stats_btn = QPushButton("Statistics")
+        self.stats_btn.clicked.connect(self.toggle_stats_panel)
+        toolbar.addWidget(self.stats_btn)
+
+        self.filmstrip_btn = QPushButton("Filmstrip")
+        self.filmstrip_btn.clicked.connect(self.toggle_filmstrip)
+        toolbar.addWidget(self.filmstrip_btn)
+
         self.status_label = QLabel("No image loaded")
         toolbar.addWidget(self.status_label)
 
         main_layout.addLayout(toolbar)
 
+        # Navigation by annotation status.
+        nav_bar = QHBoxLayout()
+        nav_bar.setContentsMargins(0, 0, 0, 0)
+        nav_bar.setSpacing(10)
+
+        self.next_unlabeled_btn = QPushButton("Next Unlabeled")
+        self.next_unlabeled_btn.clicked.connect(self.next_unlabeled)
+        nav_bar.addWidget(self.next_unlabeled_btn)
+
+        self.filter_combo = QComboBox()
+        self.filter_combo.setFocusPolicy(Qt.NoFocus)
+        self.filter_combo.setToolTip("Only navigate images that contain the selected class")
+        self.filter_combo.currentIndexChanged.connect(self.on_filter_changed)
+        nav_bar.addWidget(self.filter_combo)
+
+        self.skip_dupes_check = QCheckBox("Skip near-duplicates")
+        self.skip_dupes_check.setToolTip("Next/Previous skip frames nearly identical to the one before them")
+        self.skip_dupes_check.setFocusPolicy(Qt.NoFocus)
+        nav_bar.addWidget(self.skip_dupes_check)
+
+        self.copy_forward_check = QCheckBox("Copy labels forward")
+        self.copy_forward_check.setToolTip("Start unlabeled images with the boxes of the last labeled image you left")
+        self.copy_forward_check.setFocusPolicy(Qt.NoFocus)
+        nav_bar.addWidget(self.copy_forward_check)
+
+        self.work_queue_check = QCheckBox("Work queue")
+        self.work_queue_check.setToolTip("Share the folder with other annotators: work on one leased batch at a time")
+        self.work_queue_check.setFocusPolicy(Qt.NoFocus)
+        self.work_queue_check.toggled.connect(self.set_work_queue)
+        nav_bar.addWidget(self.work_queue_check)
+
+        self.progress_label = QLabel("")
+        nav_bar.addWidget(self.progress_label)
+        nav_bar.addStretch()
+        main_layout.addLayout(nav_bar)
+
         # Help text.
         help_text = QLabel(
-            "Draw: Click and drag  |  Erase: Ctrl+Click on box  |  "
+            "Draw: Click and drag  |  Erase: Ctrl+Click on box  |  Undo/Redo: Ctrl+Z / Ctrl+Y  |  "
             "Save: Auto on image change  |  Space Bar to navigate  |  "
-            "Wheel to zoom (anchored; min=1.0)."
+            "Wheel to zoom (anchored; min=1.0)  |  A: accept proposals, P: show/hide  |  F3: performance overlay."
         )
         main_layout.addWidget(help_text)
 
+        self.stats_panel = StatsPanel()
+        self.stats_dock = QDockWidget("Statistics", self)
+        self.stats_dock.setWidget(self.stats_panel)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.stats_dock)
+        self.stats_dock.hide()
+
+        self.filmstrip_model = FilmstripModel(self.thumbs, lambda stem: stem in self.labeled_stems,
+                                              self.filmstrip_label_rows, self.image_stem, self)
+        self.filmstrip = FilmstripView(self.filmstrip_model,
+                                       FilmstripDelegate(lambda cid: self.style_for(cid).pen.color(),
+                                                         self.thumbs.size, self))
+        self.filmstrip.image_chosen.connect(self.on_filmstrip_chosen)
+        self.filmstrip_timer = QTimer(self)
+        self.filmstrip_timer.setSingleShot(True)
+        self.filmstrip_timer.setInterval(1000)
+        self.filmstrip_timer.timeout.connect(self.sync_filmstrip)
+        self.filmstrip_dock = QDockWidget("Filmstrip", self)
+        self.filmstrip_dock.setWidget(self.filmstrip)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.filmstrip_dock)
+        self.filmstrip_dock.hide()
+
         # Dynamic class selection.
         self.class_group = QGroupBox("Select Class")
         class_layout = QHBoxLayout()
@@ -221,6 +510,7 @@ class BoundingBoxAnnotator(QMainWindow):
             self.class_buttons.append(btn)
         self.class_group.setLayout(class_layout)
         main_layout.addWidget(self.class_group)
+        self.reload_class_filter()
 
         # Scroll area for the image.
         self.scroll_area = QScrollArea()
@@ -248,6 +538,7 @@ class BoundingBoxAnnotator(QMainWindow):
 
         self.prev_btn.setEnabled(False)
         self.next_btn.setEnabled(False)
+        self.next_unlabeled_btn.setEnabled(False)
         self.save_btn.setEnabled(False)
         self.clear_btn.setEnabled(False)
 
@@ -293,6 +584,8 @@ class BoundingBoxAnnotator(QMainWindow):
         Opens a dialog with a table to view, add, or remove classes.
         The dialog uses a white background so text is easily readable.
         """
+        if not self.settle_pending_remap():
+            return
         dialog = QDialog(self)
         dialog.setWindowTitle("Edit Classes")
         dialog.resize(400, 300)
@@ -329,6 +622,8 @@ class BoundingBoxAnnotator(QMainWindow):
         table.setSelectionMode(QAbstractItemView.SingleSelection)
         for row, cls in enumerate(self.classes):
             id_item = QTableWidgetItem(str(cls.get("id", "")))
+            # The id the row started with, to tell renumbered classes from new ones.
+            id_item.setData(Qt.UserRole, cls.get("id"))
             name_item = QTableWidgetItem(cls.get("name", ""))
             table.setItem(row, 0, id_item)
             table.setItem(row, 1, name_item)
@@ -364,6 +659,7 @@ class BoundingBoxAnnotator(QMainWindow):
 
         if dialog.exec_() == QDialog.Accepted:
             new_classes = []
+            kept = {}
             for row in range(table.rowCount()):
                 id_item = table.item(row, 0)
                 name_item = table.item(row, 1)
@@ -372,16 +668,142 @@ class BoundingBoxAnnotator(QMainWindow):
                         cid = int(id_item.text())
                         cname = name_item.text().strip()
                         if cname:
-                            new_classes.append({"id": cid, "name": cname})
+                            original = id_item.data(Qt.UserRole)
+                            if original is not None:
+                                kept[int(original)] = cid
+                            # Rows given the same id are merged into the first.
+                            if all(cls["id"] != cid for cls in new_classes):
+                                new_classes.append({"id": cid, "name": cname})
                     except Exception as e:
                         print(f"Error reading row {row}: {e}")
-            self.classes = new_classes
-            self.save_updated_classes()
-            self.reload_class_buttons()
+            mapping = class_mapping({int(cls["id"]) for cls in self.classes}, kept)
+            if mapping and self.output_folder and next(via_yolo.iter_label_files(self.labels_output, True), None):
+                self.check_class_remap(mapping, new_classes)
+            else:
+                self.apply_classes(new_classes)
         else:
             # Discard changes.
             pass
 
+    def settle_pending_remap(self):
+        """
+        An unfinished class remap of labels_output must be finished or
+        discarded before the class table changes again. Returns True when
+        the table may be edited.
+        """
+        if not self.output_folder or pending_remap(self.labels_output) is None:
+            return True
+        answer = self.ask_question(
+            "Unfinished label update",
+            "An earlier update of class ids in this output folder's labels was interrupted, "
+            "so some labels still use the old ids.\n\n"
+            "Yes finishes it now (edit the classes again afterwards). Discard leaves the labels "
+            "as they are, partly updated.",
+            QMessageBox.Yes | QMessageBox.Discard | QMessageBox.Cancel,
+        )
+        if answer == QMessageBox.Yes:
+            self.start_class_remap(pending_remap(self.labels_output))
+        elif answer == QMessageBox.Discard:
+            discard_remap(self.labels_output)
+            return True
+        return False
+
+    def apply_classes(self, new_classes):
+        self.classes = new_classes
+        self.save_updated_classes()
+        self.reload_class_buttons()
+
+    def check_class_remap(self, mapping, new_classes):
+        """
+        Dry-runs mapping over labels_output in the background and asks
+        whether existing labels should follow the new class ids.
+        """
+        if self.image_modified and self.boxes:
+            self.save_annotation(auto_save=True)
+        # Queued saves still carry the old ids.
+        self.save_queue.drain()
+        remap = ClassRemap(self.labels_output, mapping)
+        self.remap_progress = self.busy_dialog("Checking existing labels...")
+        self.remap_task = BackgroundTask(remap.plan)
+        self.remap_task.result.connect(lambda counts: self.confirm_class_remap(mapping, new_classes, counts))
+        self.remap_task.start()
+
+    def confirm_class_remap(self, mapping, new_classes, counts):
+        self.remap_progress.close()
+        if counts is None:
+            self.show_warning("Error", "Could not read the existing labels; the classes were not changed.")
+            return
+        total, files, boxes, dropped = counts
+        if not files:
+            self.apply_classes(new_classes)
+            return
+        answer = self.ask_question(
+            "Update existing labels?",
+            f"The new class table renumbers or removes class ids used by existing labels.\n\n"
+            f"{files} of {total} label file(s) would change: {boxes} box(es) renumbered, "
+            f"{dropped} box(es) of removed classes deleted.\n\n"
+            f"Yes rewrites the labels, No keeps them as they are.",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+        )
+        if answer == QMessageBox.Cancel:
+            return
+        self.apply_classes(new_classes)
+        if answer == QMessageBox.Yes:
+            self.start_class_remap(mapping)
+
+    def start_class_remap(self, mapping):
+        """
+        Rewrites the class ids of every label in labels_output on a process
+        pool, then refreshes the index, label cache and current image.
+        """
+        self.remap_progress = self.busy_dialog("Updating class ids in existing labels...")
+        self.remap_task = BackgroundTask(self.run_class_remap, mapping)
+        self.remap_task.result.connect(self.on_class_remap_done)
+        self.remap_task.start()
+
+    def run_class_remap(self, mapping):
+        counts = ClassRemap(self.labels_output, mapping).run()
+        self.index.rebuild(self.labels_output)
+        return counts
+
+    def on_class_remap_done(self, counts):
+        self.remap_progress.close()
+        if counts is None:
+            self.show_warning("Error", "Updating the labels was interrupted. "
+                                       "It is finished when this output folder is opened again.")
+            return
+        self.open_label_cache()
+        self.refresh_index_views()
+        if self.image_list:
+            self.load_current_image()
+        files, boxes, dropped = counts
+        self.show_information("Labels updated",
+                              f"{files} label file(s) rewritten: {boxes} box(es) renumbered, {dropped} deleted.")
+
+    def resume_class_remap(self):
+        """
+        Offers to finish a class remap of labels_output that was interrupted.
+        """
+        mapping = pending_remap(self.labels_output)
+        if mapping is None:
+            return
+        answer = self.ask_question(
+            "Unfinished label update",
+            "Updating class ids in this output folder's labels was interrupted, "
+            "so some labels still use the old ids. Finish it now?",
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        if answer == QMessageBox.Yes:
+            self.start_class_remap(mapping)
+
+    def busy_dialog(self, text):
+        dialog = QProgressDialog(text, None, 0, 0, self)
+        dialog.setWindowTitle("Please wait")
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(0)
+        dialog.show()
+        return dialog
+
     def save_updated_classes(self):
         try:
             with open(self.yaml_path, "w") as f:
@@ -411,11 +833,30 @@ class BoundingBoxAnnotator(QMainWindow):
             )
             layout_group.addWidget(btn)
             self.class_buttons.append(btn)
+        self.build_render_styles()
+        self.reload_class_filter()
+        self.invalidate_overlay()
+        self.update_display()
         self.show_information("Saved", "Classes updated successfully.")
 
     def keyPressEvent(self, event):
-        if event.key() == Qt.Key_Space:
+        ctrl = event.modifiers() & Qt.ControlModifier
+        if ctrl and event.key() == Qt.Key_Z and event.modifiers() & Qt.ShiftModifier:
+            self.redo()
+        elif ctrl and event.key() == Qt.Key_Z:
+            self.undo()
+        elif ctrl and event.key() == Qt.Key_Y:
+            self.redo()
+        elif event.key() == Qt.Key_Space:
             self.change_image(1)
+        elif event.key() == Qt.Key_F3:
+            self.toggle_perf_overlay()
+        elif event.key() == Qt.Key_A:
+            self.accept_proposals()
+        elif event.key() == Qt.Key_P:
+            self.show_proposals = not self.show_proposals
+            self.invalidate_overlay()
+            self.update_display()
         elif Qt.Key_1 <= event.key() <= Qt.Key_9:
             idx = event.key() - Qt.Key_1
             if 0 <= idx < len(self.class_buttons):
@@ -431,117 +872,883 @@ class BoundingBoxAnnotator(QMainWindow):
         if folder:
             self.image_folder = folder
             self.load_images_from_folder()
-            self.status_label.setText(f"Loaded {len(self.image_list)} images from {folder}")
+
+    def select_input_source(self):
+        patterns = " ".join(f"*{ext}" for ext in ARCHIVE_EXTS + VIDEO_EXTS)
+        path, _ = QFileDialog.getOpenFileName(self, "Open Archive or Video", "",
+                                              f"Archives and videos ({patterns})")
+        if path:
+            self.image_folder = path
+            self.load_images_from_folder()
 
     def select_output_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Output Folder")
         if folder:
-            self.output_folder = folder
-            if not os.path.exists(self.output_folder):
-                os.makedirs(self.output_folder)
-            self.images_output = os.path.join(self.output_folder, "images")
-            self.labels_output = os.path.join(self.output_folder, "labels")
-            if not os.path.exists(self.images_output):
-                os.makedirs(self.images_output)
-            if not os.path.exists(self.labels_output):
-                os.makedirs(self.labels_output)
+            self.dataset_mode = False
+            self.set_output_folder(folder)
+
+    def select_dataset_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select YOLO Dataset Folder (with images/ and labels/)")
+        if folder:
+            self.open_dataset(folder)
+
+    def open_dataset(self, folder):
+        """
+        Uses folder/images as input and folder itself as output, so labels
+        are loaded and saved in place and images are never copied.
+        """
+        images = os.path.join(folder, "images")
+        labels = os.path.join(folder, "labels")
+        if not os.path.isdir(images) or not os.path.isdir(labels):
+            self.show_warning("Not a YOLO dataset", "The folder must contain images/ and labels/ subfolders.")
+            return
+        self.dataset_mode = True
+        self.set_output_folder(folder)
+        self.image_folder = images
+        self.load_images_from_folder()
+
+    def set_output_folder(self, folder):
+        # Leases belong to the previous output folder.
+        self.work_queue_check.setChecked(False)
+        self.output_folder = folder
+        if not os.path.exists(self.output_folder):
+            os.makedirs(self.output_folder)
+        self.images_output = os.path.join(self.output_folder, "images")
+        self.labels_output = os.path.join(self.output_folder, "labels")
+        if not os.path.exists(self.images_output):
+            os.makedirs(self.images_output)
+        if not os.path.exists(self.labels_output):
+            os.makedirs(self.labels_output)
+        self.image_output = ImageOutput(self.images_output, self.output_mode)
+        self.open_index()
+        self.open_label_cache()
+        self.open_journal()
+        self.resume_class_remap()
+
+    def open_label_cache(self):
+        """
+        Maps the label cache of labels_output and brings it up to date in
+        the background; until then stale labels are parsed from text.
+        """
+        self.label_cache = LabelCache(self.labels_output)
+        self.stats.reset()
+        self.filmstrip_model.invalidate_labels()
+        if next(via_yolo.iter_label_files(self.labels_output, True), None):
+            # Saves recorded while the cache builds may be missing from it.
+            self.stats.begin_rebuild()
+            task = self.cache_task = BackgroundTask(self.label_cache.build)
+            task.result.connect(lambda _: self.rebuild_stats(task))
+            task.start()
+        self.refresh_stats_panel()
+
+    def rebuild_stats(self, task):
+        if task is not self.cache_task:
+            # The build of a previous output folder.
+            return
+        self.stats.rebuild(self.label_cache)
+        self.refresh_stats_panel()
+
+    def toggle_stats_panel(self):
+        self.stats_dock.setVisible(not self.stats_dock.isVisible())
+        self.refresh_stats_panel()
+
+    def refresh_stats_panel(self):
+        if not self.stats_dock.isVisible():
+            return
+        class_names = {cid: style.name for cid, style in self.render_styles.items()}
+        self.stats_panel.set_stats(self.stats if self.output_folder else None, len(self.image_list),
+                                   class_names, self.class_colors)
+
+    def toggle_filmstrip(self):
+        self.filmstrip_dock.setVisible(not self.filmstrip_dock.isVisible())
+        self.sync_filmstrip()
+
+    def sync_filmstrip(self):
+        # The model only follows image_list while the panel is shown, and at
+        # most once per filmstrip_timer interval during a scan.
+        if not self.filmstrip_dock.isVisible():
+            return
+        if self.filmstrip_model.paths != self.image_list:
+            self.filmstrip_model.set_paths(self.image_list)
+        if self.current_idx >= 0:
+            self.filmstrip.show_row(self.filmstrip_model.row_of(self.current_image_path))
+
+    def on_filmstrip_chosen(self, row):
+        # The model can lag behind image_list while a scan is running.
+        idx = self.index_of(self.filmstrip_model.paths[row])
+        if idx >= 0:
+            self.go_to_image(idx)
+
+    def index_of(self, path):
+        """
+        Position of path in image_list, or -1.
+        """
+        key = path_key(path, self.image_folder)
+        idx = bisect.bisect_left(self.image_keys, key)
+        # Keys ignore case, so a few paths can share one.
+        while idx < len(self.image_list) and self.image_keys[idx] == key:
+            if self.image_list[idx] == path:
+                return idx
+            idx += 1
+        return -1
+
+    def output_name(self, path):
+        # Subfolder images are named after their relative folder (see
+        # via_sources); a dataset keeps its folders (see image_stem).
+        if self.dataset_mode and split_source(path)[1] is None:
+            return self.image_stem(path) + os.path.splitext(path)[1]
+        return source_name(path, self.image_folder)
+
+    def image_stem(self, path):
+        """
+        Label key of path. A dataset keeps its split folders: the label of
+        images/train/x.jpg is labels/train/x.txt, keyed "train/x".
+        """
+        if self.dataset_mode and split_source(path)[1] is None:
+            key = via_yolo.label_key(path, self.image_folder)
+            if key is not None:
+                return key
+        return stem_of(path, self.image_folder)
+
+    def label_path(self, path):
+        return via_yolo.key_label_path(self.labels_output, self.image_stem(path))
+
+    def label_key(self, lbl_path):
+        # None for a label outside labels_output (e.g. a previous output folder).
+        return via_yolo.label_key(lbl_path, self.labels_output)
+
+    def filmstrip_label_rows(self, path):
+        """
+        YOLO rows of the saved label of path for its filmstrip cell, or None.
+        """
+        if not self.output_folder:
+            return None
+        lbl_path = self.label_path(path)
+        if not os.path.exists(lbl_path):
+            return None
+        return self.read_label_rows(lbl_path)
+
+    def go_to_image(self, idx):
+        if idx == self.current_idx or not 0 <= idx < len(self.image_list):
+            return
+        if not self.in_work_batch(idx):
+            self.status_label.setText(f"{self.status_label.text()}  (outside your work batch)")
+            return
+        if self.image_modified and self.boxes:
+            self.save_annotation(auto_save=True)
+        self.current_idx = idx
+        self.load_current_image()
+
+    def open_journal(self, owner=None):
+        """
+        Opens the crash-recovery journal of the output folder; in work-queue
+        mode each annotator has its own (see via_history.Journal).
+        """
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = Journal(self.output_folder, owner, self.leases.ttl if owner else None)
+
+    def open_index(self, shared=False):
+        """
+        Opens the status index of the output folder, rebuilding it in the
+        background when it is missing but labels already exist. shared is
+        for folders used by several annotators at once.
+        """
+        if self.index is not None:
+            self.index.close()
+        self.index = AnnotationIndex(self.output_folder, shared)
+        if self.index.is_empty() and next(via_yolo.iter_label_files(self.labels_output, True), None):
+            self.progress_label.setText("Indexing existing labels...")
+            self.index_task = BackgroundTask(self.index.rebuild, self.labels_output)
+            self.index_task.result.connect(lambda _: self.refresh_index_views())
+            self.index_task.start()
+        else:
+            self.refresh_index_views()
+
+    def refresh_index_views(self):
+        self.labeled_stems = self.index.labeled_stems() if self.index else set()
+        if self.filter_class is not None and self.index:
+            self.filter_stems = self.index.stems_with_class(self.filter_class)
+        self.labeled_count = sum(1 for p in self.image_list if self.image_stem(p) in self.labeled_stems)
+        self.update_progress()
+        self.filmstrip.viewport().update()
+
+    def update_progress(self):
+        if self.index is None or not self.image_list:
+            self.progress_label.setText("")
+            return
+        total = len(self.image_list)
+        pct = 100.0 * self.labeled_count / total
+        text = f"Labeled {self.labeled_count}/{total} ({pct:.1f}%)"
+        duplicates = sum(1 for i, anchor in enumerate(self.duplicate_anchors) if anchor != i)
+        if duplicates:
+            text += f"  |  {duplicates} near-duplicate(s)"
+        self.progress_label.setText(text)
+
+    def reload_class_filter(self):
+        self.filter_combo.blockSignals(True)
+        self.filter_combo.clear()
+        self.filter_combo.addItem("All images", None)
+        for cls in self.classes:
+            self.filter_combo.addItem(f"Containing {cls['name']}", cls["id"])
+        index = self.filter_combo.findData(self.filter_class)
+        self.filter_combo.setCurrentIndex(max(0, index))
+        self.filter_combo.blockSignals(False)
+        self.on_filter_changed(self.filter_combo.currentIndex())
+
+    def on_filter_changed(self, combo_index):
+        self.filter_class = self.filter_combo.itemData(combo_index)
+        if self.filter_class is None or self.index is None:
+            self.filter_stems = None
+            return
+        self.filter_stems = self.index.stems_with_class(self.filter_class)
+        if self.image_list and not self.matches_filter(self.current_idx):
+            matches = [i for i in range(len(self.image_list)) if self.in_work_batch(i) and self.matches_filter(i)]
+            if matches:
+                if self.image_modified and self.boxes:
+                    self.save_annotation(auto_save=True)
+                later = [i for i in matches if i > self.current_idx]
+                self.current_idx = later[0] if later else matches[0]
+                self.load_current_image()
+
+    def matches_filter(self, idx):
+        return self.filter_stems is None or self.image_stem(self.image_list[idx]) in self.filter_stems
+
+    def record_saved(self, stem, class_ids, rows=()):
+        """
+        Updates the index, statistics and in-memory views after a save of
+        stem; rows are its YOLO rows.
+        """
+        if self.index is None:
+            return
+        self.stats.update(stem, rows)
+        self.refresh_stats_panel()
+        self.filmstrip_model.invalidate_labels(stem)
+        self.index.record(stem, class_ids, time.time_ns())
+        was_labeled = stem in self.labeled_stems
+        if class_ids and not was_labeled:
+            self.labeled_stems.add(stem)
+            self.labeled_count += 1
+        elif not class_ids and was_labeled:
+            self.labeled_stems.discard(stem)
+            self.labeled_count -= 1
+        if self.filter_stems is not None:
+            if self.filter_class in class_ids:
+                self.filter_stems.add(stem)
+            else:
+                self.filter_stems.discard(stem)
+        self.update_progress()
+
+    def next_unlabeled(self):
+        if not self.image_list:
+            return
+        if self.image_modified and self.boxes:
+            self.save_annotation(auto_save=True)
+        n = len(self.image_list)
+        for step in range(1, n + 1):
+            idx = (self.current_idx + step) % n
+            if self.in_work_batch(idx) and self.image_stem(self.image_list[idx]) not in self.labeled_stems:
+                self.current_idx = idx
+                self.load_current_image()
+                return
+        self.show_information("Done", "All images are labeled.")
+
+    def set_work_queue(self, enabled):
+        # Edits journaled so far belong to the journal being replaced.
+        if self.output_folder and self.image_modified and self.boxes:
+            self.save_annotation(auto_save=True)
+        if not enabled:
+            self.lease_timer.stop()
+            if self.leases is not None:
+                self.leases.release_all()
+                self.leases = None
+                self.open_journal()
+                self.open_index()
+            self.work_batch = None
+            if self.image_list:
+                self.update_status()
+            return
+        if not self.output_folder:
+            self.show_warning("Warning", "Please select an output folder shared with the other annotators first.")
+            self.work_queue_check.setChecked(False)
+            return
+        self.leases = BatchLeases(self.output_folder)
+        self.open_journal(self.leases.owner)
+        self.open_index(shared=True)
+        # Also keeps the journal marked alive while no batch is held yet.
+        self.lease_timer.start()
+        # Batches are only numbered the same everywhere once the scan is complete.
+        if self.scanner is not None and self.scanner.isRunning():
+            self.status_label.setText("Work queue starts when the folder scan finishes...")
+        else:
+            self.claim_work_batch()
+
+    def describe_batch(self, batch):
+        size = self.leases.batch_size
+        names = self.image_list[batch * size:(batch + 1) * size]
+        return self.output_name(names[0]), self.output_name(names[-1])
+
+    def claim_work_batch(self):
+        """
+        Leases the first free batch and shows its first image.
+        """
+        if self.leases is None or not self.image_list:
+            return
+        total = batch_count(len(self.image_list), self.leases.batch_size)
+        self.work_batch = self.leases.claim_next(total, self.describe_batch)
+        if self.work_batch is None:
+            self.lease_timer.stop()
+            self.show_information("Done", "Every batch is finished or leased by another annotator.")
+            self.work_queue_check.setChecked(False)
+            return
+        self.lease_timer.start()
+        self.go_to_image(self.work_batch * self.leases.batch_size)
+        self.update_status()
+
+    def finish_work_batch(self):
+        self.leases.release(self.work_batch, done=True)
+        self.work_batch = None
+        self.claim_work_batch()
+
+    def in_work_batch(self, idx):
+        return self.work_batch is None or idx // self.leases.batch_size == self.work_batch
+
+    def renew_lease(self):
+        if self.leases is None:
+            return
+        self.journal.touch()
+        if self.work_batch in self.leases.heartbeat():
+            lost = self.work_batch
+            self.work_batch = None
+            self.show_warning("Lease lost", f"Batch {lost + 1} was taken over by another annotator after its "
+                                            f"lease expired. Continuing with a new batch.")
+            self.claim_work_batch()
+
+    def set_output_mode(self, mode):
+        # Saves already queued keep the strategy they were submitted with.
+        self.output_mode = mode
+        if self.output_folder:
+            self.image_output = ImageOutput(self.images_output, mode)
 
     def load_images_from_folder(self):
+        """
+        Starts a background scan of self.image_folder. Images are merged into
+        image_list in natural order as they are found and the first one is
+        shown as soon as it arrives.
+        """
+        if self.scanner is not None:
+            # Batches the old scanner already queued must not reach the new list.
+            self.scanner.found.disconnect(self.on_images_found)
+            self.scanner.done.disconnect(self.on_scan_finished)
+            self.scanner.stop()
+        if self.leases is not None:
+            self.leases.release_all()
+            self.work_batch = None
         self.image_list = []
-        valid_exts = ('.jpg', '.jpeg', '.png', '.bmp')
-        for file in os.listdir(self.image_folder):
-            ext = os.path.splitext(file)[1].lower()
-            if ext in valid_exts:
-                self.image_list.append(os.path.join(self.image_folder, file))
-        if self.image_list:
+        self.image_keys = []
+        self.duplicate_anchors = []
+        self.current_idx = -1
+        self.copy_source_path = ""
+        self.labeled_count = 0
+        self.prefetcher.clear()
+        self.filmstrip_model.set_paths([])
+        self.status_label.setText(f"Scanning {self.image_folder}...")
+        # Archives and videos in the folder (or image_folder itself being one)
+        # are listed member by member; see via_sources.
+        self.scanner = FolderScanner(self.image_folder, recursive=self.recursive_check.isChecked(),
+                                     iterate=iter_source_ids)
+        self.scanner.found.connect(self.on_images_found)
+        self.scanner.done.connect(self.on_scan_finished)
+        self.scanner.start()
+
+    def merge_scanned(self, batch):
+        """
+        Merges a sorted list of (key, path) into image_keys and image_list.
+        """
+        keys, paths = self.image_keys, self.image_list
+        if len(batch) * 32 < len(keys):
+            # A few paths into a long list: insert each at its place.
+            for key, path in batch:
+                i = bisect.bisect_right(keys, key)
+                keys.insert(i, key)
+                paths.insert(i, path)
+            return
+        merged = list(heapq.merge(zip(keys, paths), batch, key=lambda item: item[0]))
+        self.image_keys = [key for key, _ in merged]
+        self.image_list = [path for _, path in merged]
+
+    def on_images_found(self, paths):
+        if self.sender() is not self.scanner:
+            # Queued by a scanner that has since been replaced.
+            return
+        batch = sorted((path_key(p, self.image_folder), p) for p in paths)
+        current_path = self.current_image_path if self.current_idx >= 0 else None
+        self.merge_scanned(batch)
+        if self.filmstrip_dock.isVisible() and not self.filmstrip_timer.isActive():
+            self.filmstrip_timer.start()
+        self.labeled_count += sum(1 for _, p in batch if self.image_stem(p) in self.labeled_stems)
+        self.update_progress()
+        if current_path is None:
             self.current_idx = 0
             self.load_current_image()
             self.prev_btn.setEnabled(True)
             self.next_btn.setEnabled(True)
+            self.next_unlabeled_btn.setEnabled(True)
             self.save_btn.setEnabled(True)
             self.clear_btn.setEnabled(True)
+        else:
+            self.current_idx = self.index_of(current_path)
+            self.update_status()
+
+    def on_scan_finished(self, count):
+        if self.sender() is not self.scanner:
+            return
+        self.filmstrip_timer.stop()
+        self.sync_filmstrip()
+        self.status_label.setText(f"Loaded {count} images from {self.image_folder}")
+        if self.leases is not None:
+            self.claim_work_batch()
+        self.refresh_stats_panel()
+        paths = list(self.image_list)
+        self.hash_task = BackgroundTask(self.hash_cache.hash_paths, paths)
+        self.hash_task.result.connect(lambda hashes: self.on_hashes_ready(paths, hashes))
+        self.hash_task.start()
+
+    def on_hashes_ready(self, paths, hashes):
+        if hashes is None or paths != self.image_list:
+            return
+        self.duplicate_anchors = group_duplicates(hashes)
+        self.update_progress()
+
+    def is_duplicate(self, idx):
+        return idx < len(self.duplicate_anchors) and self.duplicate_anchors[idx] != idx
+
+    def update_status(self):
+        file_name = self.output_name(self.current_image_path)
+        text = f"Image {self.current_idx+1}/{len(self.image_list)}: {file_name}"
+        if self.work_batch is not None:
+            total = batch_count(len(self.image_list), self.leases.batch_size)
+            text += f"  |  batch {self.work_batch + 1}/{total}"
+        self.status_label.setText(text)
+        if self.filmstrip_dock.isVisible():
+            self.filmstrip.show_row(self.filmstrip_model.row_of(self.current_image_path))
 
     def load_current_image(self):
         if 0 <= self.current_idx < len(self.image_list):
+            if self.journal_dirty and self.journal is not None:
+                # Leaving without saving: these edits are not to be recovered.
+                self.journal.discard(self.image_stem(self.current_image_path))
+            self.journal_dirty = False
+            self.history.reset()
+            if self.boxes and self.current_image_path:
+                self.copy_source_path = self.current_image_path
             self.current_image_path = self.image_list[self.current_idx]
-            self.boxes = []
+            self.boxes.reset()
+            self.invalidate_overlay()
             self.image_modified = False
+            self.hover_row = -1
             self.zoom_factor = 1.0
             self.x_offset = 0
             self.y_offset = 0
 
-            pixmap = QPixmap(self.current_image_path)
+            # Decoding happens on the prefetch pool at viewport size; only the
+            # pixmap upload runs here.
+            self.update_decode_size()
+            image = self.prefetcher.get(self.current_image_path)
+            pixmap = QPixmap.fromImage(image)
             self.original_pixmap = pixmap
-
-            file_name = os.path.basename(self.current_image_path)
-            base_name, _ = os.path.splitext(file_name)
+            self.original_image = image
+            self.tile_pyramid = None
+            self.sharper_request = None
+            size = image_dims(self.current_image_path)
+            if size is None:
+                size = (pixmap.width(), pixmap.height())
+            self.image_width, self.image_height = size
+            # About 64 grid cells along the longer side for box hit-testing.
+            self.boxes.set_cell_size(max(16.0, max(size) / 64.0))
+            self.prefetcher.schedule(self.image_list, self.current_idx)
+
+            file_name = self.output_name(self.current_image_path)
+            base_name = self.image_stem(self.current_image_path)
             if self.output_folder:
-                image_output_path = os.path.join(self.images_output, file_name)
-                lbl_path = os.path.join(self.labels_output, base_name + ".txt")
-                if os.path.exists(image_output_path) and os.path.exists(lbl_path):
-                    self.load_annotation(lbl_path, pixmap.width(), pixmap.height())
+                lbl_path = self.label_path(self.current_image_path)
+                # Only blocks when this image still has a save in flight.
+                self.save_queue.wait_for(lbl_path)
+                # Outside dataset mode a label only counts if its image was placed too.
+                if (self.dataset_mode or self.image_output.contains(file_name)) and os.path.exists(lbl_path):
+                    self.load_annotation(lbl_path, self.image_width, self.image_height)
+                self.journal_base = os.stat(lbl_path).st_mtime_ns if os.path.exists(lbl_path) else None
+                recovered = self.journal.take_pending(base_name, self.journal_base)
+                for op in recovered:
+                    apply_op(self.boxes, op)
+                    self.history.record(op)
+                if recovered:
+                    self.journal_dirty = True
+                    self.image_modified = True
+                    self.invalidate_overlay()
+            else:
+                recovered = []
+            copied = 0
+            if not self.boxes and not recovered and self.copy_forward_check.isChecked():
+                copied = self.copy_labels_forward()
+            self.proposals = []
+            if self.proposer is not None:
+                self.proposer.schedule(self.image_list, self.current_idx)
+                self.set_proposals(self.proposer.get(self.current_image_path))
+            self.update_display()
+            self.update_status()
+            if recovered:
+                self.status_label.setText(
+                    f"{self.status_label.text()}  (recovered {len(recovered)} unsaved edit(s))"
+                )
+            elif copied:
+                self.status_label.setText(
+                    f"{self.status_label.text()}  (copied {copied} box(es) from "
+                    f"{self.output_name(self.copy_source_path)})"
+                )
+
+    def copy_labels_forward(self):
+        """
+        Adds the saved boxes of the last image left with boxes as one
+        undoable edit. That is not image_list[current_idx - 1] when
+        duplicates are skipped, as skipped frames stay unlabeled.
+        Returns the number of boxes copied.
+        """
+        if not self.output_folder or not self.copy_source_path:
+            return 0
+        prev_path = self.label_path(self.copy_source_path)
+        # Moving on has just queued that image's save.
+        self.save_queue.wait_for(prev_path)
+        if not os.path.exists(prev_path):
+            return 0
+        rows = self.read_label_rows(prev_path)
+        coords = yolo_to_coords(rows, self.image_width, self.image_height)
+        boxes = [(x, y, w, h, int(cid)) for (x, y, w, h), cid in zip(coords.tolist(), rows[:, 0].tolist())
+                 if w > 0 and h > 0]
+        if boxes:
+            self.apply_edit(add_many_op(self.boxes, boxes))
+        return len(boxes)
+
+    def read_label_rows(self, lbl_path):
+        """
+        (n, 5) rows of a label file, from the label cache when it is current.
+        """
+        rows = None
+        if self.label_cache is not None:
+            rows = self.label_cache.get(self.label_key(lbl_path), lbl_path)
+        if rows is None:
+            with TRACER.span("label_parse"):
+                rows = via_yolo.read_label_array(lbl_path)
+        return rows
+
+    def set_proposals(self, proposals):
+        # Proposals duplicating a box that is already there are not shown.
+        self.proposals = filter_new(proposals or [], self.boxes.coords)
+        self.invalidate_overlay()
+
+    def on_proposals_ready(self, path, proposals):
+        if path == self.current_image_path and not self.proposals:
+            self.set_proposals(proposals)
+            self.update_display()
+
+    def accept_proposals(self):
+        """
+        Turns all shown proposals into boxes as one undoable edit.
+        """
+        if not self.proposals or not self.show_proposals:
+            return
+        boxes = []
+        for p in self.proposals:
+            x = max(0, min(int(p.x), self.image_width - 1))
+            y = max(0, min(int(p.y), self.image_height - 1))
+            w = min(int(p.w), self.image_width - x)
+            h = min(int(p.h), self.image_height - y)
+            if w > 0 and h > 0:
+                boxes.append((x, y, w, h, p.class_id))
+        self.proposals = []
+        if boxes:
+            self.apply_edit(add_many_op(self.boxes, boxes))
+        else:
+            self.invalidate_overlay()
             self.update_display()
-            self.status_label.setText(f"Image {self.current_idx+1}/{len(self.image_list)}: {file_name}")
 
     def load_annotation(self, lbl_path, img_width, img_height):
         try:
-            with open(lbl_path, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) == 5:
-                        class_id = int(parts[0])
-                        x_center = float(parts[1])
-                        y_center = float(parts[2])
-                        w_norm = float(parts[3])
-                        h_norm = float(parts[4])
-                        x = int((x_center - w_norm/2) * img_width)
-                        y = int((y_center - h_norm/2) * img_height)
-                        w = int(w_norm * img_width)
-                        h = int(h_norm * img_height)
-                        self.boxes.append((QRect(x, y, w, h), class_id))
+            self.boxes.extend_from_yolo(self.read_label_rows(lbl_path), img_width, img_height)
             if self.boxes:
                 self.image_modified = True
+            self.invalidate_overlay()
         except Exception as e:
             print(f"Error loading annotation: {e}")
 
     def update_display(self):
+        """
+        Composes the display from three layers: the scaled image (base),
+        the committed boxes (overlay) and the in-progress box (top).
+        Only the layers whose inputs changed are re-rendered, so dragging
+        a box repaints just the top layer.
+        """
         if self.original_pixmap is None:
             return
-        w = int(self.original_pixmap.width() * self.zoom_factor)
-        h = int(self.original_pixmap.height() * self.zoom_factor)
-        self.scaled_pixmap = self.original_pixmap.scaled(w, h, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        with TRACER.span("frame"):
+            self.compose_display()
+
+    def compose_display(self):
+        self.render_base_layer()
+        if self.overlay_layer is None:
+            self.render_overlay_layer()
+        drawing = self.drawing and self.current_box
+        hovering = 0 <= self.hover_row < len(self.boxes)
+        if not drawing and not hovering and not self.perf_overlay:
+            self.image_display.setPixmap(self.overlay_layer)
+            return
+        canvas = QPixmap(self.overlay_layer)
+        painter = QPainter(canvas)
+        if hovering:
+            box = self.map_to_display_coords(self.boxes.rect(self.hover_row))
+            painter.fillRect(box, QColor(255, 255, 255, 48))
+            pen = QPen(QColor(255, 255, 255))
+            pen.setWidth(3)
+            painter.setPen(pen)
+            painter.drawRect(box)
+        if drawing:
+            color = self.class_colors.get(self.current_class, QColor("#FFFF00"))
+            pen = QPen(color)
+            pen.setWidth(2)
+            painter.setPen(pen)
+            painter.drawRect(self.current_box)
+        if self.perf_overlay:
+            self.draw_perf_overlay(painter)
+        painter.end()
+        self.image_display.setPixmap(canvas)
+
+    def draw_perf_overlay(self, painter):
+        """
+        Draws recent timings, the decode cache hit rate and queue depths in
+        the top-left corner. Frame time is that of the previous frame.
+        """
+        save_depth = self.save_queue.pending_count()
+        prefetch_depth = self.prefetcher.pending_count()
+        TRACER.counter("save_queue", save_depth)
+        TRACER.counter("prefetch_queue", prefetch_depth)
+
+        def fmt(name):
+            last, mean = TRACER.last_ms(name), TRACER.mean_ms(name)
+            return "-" if last is None else f"{last:.1f} ms (avg {mean:.1f})"
+
+        lines = [
+            f"frame   {fmt('frame')}",
+            f"decode  {fmt('decode')}",
+            f"boxes   {fmt('draw_boxes')}",
+            f"labels  {fmt('label_parse')}",
+            f"save    {fmt('save')}",
+            f"cache   {self.prefetcher.cache.hit_rate() * 100:.0f}% hits",
+            f"decoded {self.original_image.width()}x{self.original_image.height()} "
+            f"of {self.image_width}x{self.image_height}",
+            f"queues  save {save_depth}  prefetch {prefetch_depth}",
+        ]
+        if self.proposer is not None:
+            lines.append(f"proposals pending {self.proposer.pending_count()}")
+        rect = QRect(8, 8, 260, 16 * len(lines) + 8)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 170))
+        painter.drawRect(rect)
+        painter.setPen(QColor(0, 255, 0))
+        for i, line in enumerate(lines):
+            painter.drawText(rect.x() + 6, rect.y() + 18 + 16 * i, line)
+
+    def toggle_perf_overlay(self):
+        """
+        Turns tracing and the overlay on or off together. Spans cost next to
+        nothing while tracing is off.
+        """
+        TRACER.enabled = not TRACER.enabled
+        self.perf_overlay = TRACER.enabled
+        if TRACER.enabled:
+            self.start_trace_file()
+        else:
+            self.trace_timer.stop()
+            self.write_trace()
+        self.update_display()
+
+    def start_trace_file(self):
+        if self.trace_path is None:
+            trace_dir = os.path.join(self.config_dir, "traces")
+            os.makedirs(trace_dir, exist_ok=True)
+            self.trace_path = os.path.join(trace_dir, time.strftime("via-trace-%Y%m%d-%H%M%S.json"))
+            print(f"Writing performance trace to {self.trace_path}")
+        self.trace_timer.start()
+
+    def write_trace(self):
+        """
+        Rewrites this session's trace file from the tracer's event buffer.
+        """
+        if self.trace_path is None:
+            return
+        try:
+            TRACER.write(self.trace_path)
+        except OSError as e:
+            print(f"Failed to write trace file: {e}")
+
+    def update_decode_size(self):
+        """
+        Points the prefetcher at the current viewport size, rounded up.
+        """
+        size = self.image_display.size()
+        step = DECODE_SIZE_STEP
+        self.prefetcher.max_size = (-(-size.width() // step) * step, -(-size.height() // step) * step)
+
+    def display_size(self, zoom):
+        """
+        Display size of the image at a zoom factor. Zoom 1.0 fits the image
+        into the viewport, without enlarging images smaller than it.
+        """
+        if not self.image_width or not self.image_height:
+            return self.original_pixmap.width(), self.original_pixmap.height()
+        lbl_size = self.image_display.size()
+        fit = min(1.0, lbl_size.width() / self.image_width, lbl_size.height() / self.image_height)
+        return max(1, int(self.image_width * fit * zoom)), max(1, int(self.image_height * fit * zoom))
+
+    def request_sharper_image(self):
+        """
+        Decodes the current image again when the display needs more pixels
+        than were decoded: at the new viewport size after the window grew,
+        or at full resolution once zoomed in. The upscaled image is shown
+        until the decode arrives through image_ready.
+        """
+        full = self.zoom_factor != 1.0
+        path = self.current_image_path
+        request = (path, full, self.prefetcher.max_size)
+        if self.sharper_request == request:
+            return
+        self.sharper_request = request
+        future = self.prefetcher.fetch(path, full=full)
+        future.add_done_callback(lambda f: self.image_ready.emit(path, f.result()))
+
+    def on_image_ready(self, path, image):
+        if path != self.current_image_path or image.isNull() or image.width() <= self.original_image.width():
+            return
+        self.original_image = image
+        self.original_pixmap = QPixmap.fromImage(image)
+        self.tile_pyramid = None
+        self.update_display()
+
+    def render_base_layer(self):
+        w, h = self.display_size(self.zoom_factor)
+        # One pixel of slack for rounding in viewport-sized decodes.
+        if w > self.original_image.width() + 1 and self.original_image.width() < self.image_width:
+            self.request_sharper_image()
+        # Huge scaled sizes are drawn tile by tile, clipped to the viewport.
+        tiled = w * h > TILED_RENDER_PIXELS
+        scaled_key = (self.original_pixmap.cacheKey(), w, h)
+        if tiled:
+            self.scaled_pixmap = None
+            self.scaled_key = None
+            if self.tile_pyramid is None:
+                self.tile_pyramid = TilePyramid(self.original_image)
+        elif self.scaled_key != scaled_key:
+            with TRACER.span("scale"):
+                self.scaled_pixmap = self.original_pixmap.scaled(w, h, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            self.scaled_key = scaled_key
         lbl_size = self.image_display.size()
         if self.zoom_factor == 1.0:
             px = max(0, (lbl_size.width() - w) // 2)
             py = max(0, (lbl_size.height() - h) // 2)
             self.x_offset = px
             self.y_offset = py
-        self.image_rect = QRect(self.x_offset, self.y_offset, self.scaled_pixmap.width(), self.scaled_pixmap.height())
+        base_key = (scaled_key, tiled, lbl_size.width(), lbl_size.height(), self.x_offset, self.y_offset)
+        if self.base_key == base_key:
+            return
+        if tiled:
+            self.image_rect = QRect(self.x_offset, self.y_offset, w, h)
+        else:
+            self.image_rect = QRect(self.x_offset, self.y_offset, self.scaled_pixmap.width(), self.scaled_pixmap.height())
         canvas = QPixmap(lbl_size)
         canvas.fill(self.background_color)
         painter = QPainter(canvas)
-        painter.drawPixmap(self.image_rect, self.scaled_pixmap)
+        if tiled:
+            with TRACER.span("tile_render"):
+                self.tile_pyramid.render(painter, self.image_rect, canvas.rect())
+        else:
+            painter.drawPixmap(self.image_rect, self.scaled_pixmap)
         pen = QPen(QColor(60, 60, 60))
         pen.setWidth(2)
         painter.setPen(pen)
         painter.drawRect(self.image_rect)
-        for box, class_id in self.boxes:
-            disp_box = self.map_to_display_coords(box)
-            self.draw_box(painter, disp_box, class_id)
-        if self.drawing and self.current_box:
-            color = self.class_colors.get(self.current_class, QColor("#FFFF00"))
-            pen = QPen(color)
-            pen.setWidth(2)
-            painter.setPen(pen)
-            painter.drawRect(self.current_box)
         painter.end()
-        self.image_display.setPixmap(canvas)
+        self.base_layer = canvas
+        self.base_key = base_key
+        self.overlay_layer = None
+
+    def render_overlay_layer(self):
+        canvas = QPixmap(self.base_layer)
+        painter = QPainter(canvas)
+        with TRACER.span("draw_boxes"):
+            self.draw_boxes(painter, self.display_rects(), self.boxes.class_ids)
+        if self.proposals and self.show_proposals:
+            self.draw_proposals(painter)
+        painter.end()
+        self.overlay_layer = canvas
+
+    def draw_proposals(self, painter):
+        """
+        Proposals are drawn dashed with their score, apart from real boxes.
+        """
+        painter.setBrush(Qt.NoBrush)
+        for p in self.proposals:
+            box = self.map_to_display_coords(QRect(int(p.x), int(p.y), int(p.w), int(p.h)))
+            pen = QPen(self.style_for(p.class_id).pen)
+            pen.setStyle(Qt.DashLine)
+            painter.setPen(pen)
+            painter.drawRect(box)
+            painter.drawText(box.x() + 4, box.y() + box.height() - 4,
+                             f"{self.get_class_name(p.class_id)} {p.score:.2f}?")
+
+    def invalidate_overlay(self):
+        """
+        Marks the committed-box layer stale; call after any change to self.boxes.
+        """
+        self.overlay_layer = None
+        self.hover_row = -1
+
+    def display_to_original_point(self, pt):
+        """
+        Maps a display point to (x, y) floats in original image pixels.
+        """
+        x_scale = self.image_width / self.image_rect.width()
+        y_scale = self.image_height / self.image_rect.height()
+        return (pt.x() - self.image_rect.x()) * x_scale, (pt.y() - self.image_rect.y()) * y_scale
+
+    def box_at(self, pt):
+        """
+        Row of the smallest box under display point pt, or -1.
+        """
+        if not self.point_within_image(pt) or not self.boxes:
+            return -1
+        return self.boxes.hit_test(*self.display_to_original_point(pt))
+
+    def boxes_in_region(self, disp_rect):
+        """
+        Rows of the boxes overlapping a display rectangle, for selection tools.
+        """
+        orig = self.map_to_original_coords(disp_rect.normalized())
+        return self.boxes.query_rect(orig.x(), orig.y(), orig.width(), orig.height())
+
+    def display_rects(self):
+        """
+        Display rectangles of all boxes as an (n, 4) int array.
+        """
+        if not self.original_pixmap or not self.image_rect:
+            return self.boxes.coords.astype(np.int64)
+        x_scale = self.image_rect.width() / self.image_width
+        y_scale = self.image_rect.height() / self.image_height
+        return self.boxes.display_rects(x_scale, y_scale, self.x_offset, self.y_offset)
 
     def map_to_display_coords(self, orig_box):
-        if not self.original_pixmap or not self.scaled_pixmap or not self.image_rect:
+        if not self.original_pixmap or not self.image_rect:
             return orig_box
-        x_scale = self.scaled_pixmap.width() / self.original_pixmap.width()
-        y_scale = self.scaled_pixmap.height() / self.original_pixmap.height()
+        x_scale = self.image_rect.width() / self.image_width
+        y_scale = self.image_rect.height() / self.image_height
         sx = int(orig_box.x() * x_scale) + self.x_offset
         sy = int(orig_box.y() * y_scale) + self.y_offset
         sw = int(orig_box.width() * x_scale)
@@ -549,44 +1756,49 @@ class BoundingBoxAnnotator(QMainWindow):
         return QRect(sx, sy, sw, sh)
 
     def map_to_original_coords(self, disp_box):
-        if not self.original_pixmap or not self.scaled_pixmap or not self.image_rect:
+        if not self.original_pixmap or not self.image_rect:
             return disp_box
-        x_scale = self.original_pixmap.width() / self.scaled_pixmap.width()
-        y_scale = self.original_pixmap.height() / self.scaled_pixmap.height()
+        x_scale = self.image_width / self.image_rect.width()
+        y_scale = self.image_height / self.image_rect.height()
         ox = int((disp_box.x() - self.image_rect.x()) * x_scale)
         oy = int((disp_box.y() - self.image_rect.y()) * y_scale)
         ow = int(disp_box.width() * x_scale)
         oh = int(disp_box.height() * y_scale)
-        ox = max(0, min(ox, self.original_pixmap.width() - 1))
-        oy = max(0, min(oy, self.original_pixmap.height() - 1))
-        ow = min(ow, self.original_pixmap.width() - ox)
-        oh = min(oh, self.original_pixmap.height() - oy)
+        ox = max(0, min(ox, self.image_width - 1))
+        oy = max(0, min(oy, self.image_height - 1))
+        ow = min(ow, self.image_width - ox)
+        oh = min(oh, self.image_height - oy)
         return QRect(ox, oy, ow, oh)
 
     def point_within_image(self, pt):
         return self.image_rect is not None and self.image_rect.contains(pt)
 
-    def draw_box(self, painter, box, class_id):
-        color = self.class_colors.get(class_id, QColor("#FFFF00"))
-        pen = QPen(color)
-        pen.setWidth(2)
-        painter.setPen(pen)
-        painter.drawRect(box)
-        cname = self.get_class_name(class_id)
-        painter.setBrush(QColor(0, 0, 0, 128))
-        txt_rect = QRect(box.x(), box.y() - 20, 80, 20)
-        painter.drawRect(txt_rect)
-        painter.setPen(QColor(255, 255, 255))
-        painter.drawText(txt_rect, Qt.AlignCenter, cname)
+    def draw_boxes(self, painter, display, class_ids):
+        """
+        Paints an (n, 4) array of display rectangles class by class: all
+        outlines in one drawRects call, then all label backgrounds, then
+        the names as pre-laid-out static text.
+        """
+        for class_id in np.unique(class_ids).tolist():
+            style = self.style_for(class_id)
+            rects = display[class_ids == class_id]
+            painter.setPen(style.pen)
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRects(self.boxes.qrects(rects))
+            origins = rects[:, :2].tolist()
+            labels = [QRect(x, y - style.label_height, style.label_width, style.label_height) for x, y in origins]
+            painter.setBrush(LABEL_BRUSH)
+            painter.drawRects(labels)
+            painter.setPen(LABEL_TEXT_COLOR)
+            for x, y in origins:
+                painter.drawStaticText(x + style.text_dx, y - style.label_height + style.text_dy, style.text)
 
     def get_class_name(self, class_id):
-        for cls in self.classes:
-            if cls["id"] == class_id:
-                return cls.get("name", "Unknown")
-        return "Unknown"
+        return self.style_for(class_id).name
 
     def on_resize(self, event):
         if self.original_pixmap:
+            self.update_decode_size()
             self.update_display()
         super().resizeEvent(event)
 
@@ -596,28 +1808,112 @@ class BoundingBoxAnnotator(QMainWindow):
         if self.image_modified and self.boxes:
             self.save_annotation(auto_save=True)
         ni = self.current_idx + direction
+        # With a class filter active, skip images that do not contain it.
+        skip_dupes = self.skip_dupes_check.isChecked()
+        while 0 <= ni < len(self.image_list) and self.in_work_batch(ni) and (
+                not self.matches_filter(ni) or (skip_dupes and self.is_duplicate(ni))):
+            ni += direction
+        if not self.in_work_batch(ni) or (self.work_batch is not None and ni >= len(self.image_list)):
+            # Stepping forward past the end of the batch completes it.
+            if direction > 0:
+                self.finish_work_batch()
+            return
         if 0 <= ni < len(self.image_list):
             self.current_idx = ni
             self.load_current_image()
 
+    def closeEvent(self, event):
+        if self.scanner is not None:
+            self.scanner.stop()
+        self.prefetcher.shutdown()
+        self.thumbs.shutdown()
+        if self.leases is not None:
+            # Unfinished batches go straight back to the others.
+            self.leases.release_all()
+        if self.proposer is not None:
+            self.proposer.shutdown()
+        self.save_queue.close()
+        if self.cache_task is not None:
+            self.cache_task.wait()
+        if self.hash_task is not None:
+            self.hash_task.wait()
+        self.hash_cache.close()
+        if self.index is not None:
+            self.index.close()
+        if self.journal is not None:
+            self.journal.close()
+        if TRACER.enabled:
+            self.trace_timer.stop()
+            self.write_trace()
+        super().closeEvent(event)
+
     def clear_boxes(self):
-        self.boxes = []
+        if self.boxes:
+            self.apply_edit(clear_op(self.boxes))
+        else:
+            self.image_modified = True
+            self.update_display()
+
+    def apply_edit(self, op):
+        """
+        Applies a box edit, records it for undo and appends it to the journal.
+        """
+        apply_op(self.boxes, op)
+        self.history.record(op)
+        self.journal_edit(op)
+
+    def journal_edit(self, op):
+        if self.journal is not None and self.current_image_path:
+            self.journal.append(self.image_stem(self.current_image_path), op, self.journal_base)
+            self.journal_dirty = True
+        self.invalidate_overlay()
         self.image_modified = True
         self.update_display()
 
+    def undo(self):
+        op = self.history.undo(self.boxes)
+        if op is not None:
+            self.journal_edit(op)
+
+    def redo(self):
+        op = self.history.redo(self.boxes)
+        if op is not None:
+            self.journal_edit(op)
+
+    def on_job_saved(self, job):
+        # Runs on the save worker once the label is on disk.
+        if self.journal is not None:
+            self.journal.commit(self.label_key(job.label_path))
+        self.label_saved.emit(job)
+
+    def on_label_saved(self, job):
+        # The index and statistics only count labels that reached the disk.
+        key = self.label_key(job.label_path) if self.output_folder else None
+        if key is None:
+            return
+        if job.label_text is None:
+            self.record_saved(key, [])
+            return
+        rows = via_yolo.parse_label_array(job.label_text)
+        self.record_saved(key, rows[:, 0].astype(int).tolist(), rows)
+
+    def on_save_failed(self, job, error):
+        # The journal keeps the unsaved edits; they are offered again when the
+        # image is reopened.
+        self.show_warning("Save failed", f"Could not save {job.label_path}:\n{error}")
+
     def eventFilter(self, source, event):
         if source == self.image_display and event.type() == QEvent.Wheel:
             if not self.original_pixmap or not self.image_rect:
                 return False
             old_rect = self.image_rect
             if event.angleDelta().y() > 0:
-                new_zoom = self.zoom_factor * 1.1
+                new_zoom = min(self.zoom_factor * 1.1, MAX_ZOOM)
             else:
                 new_zoom = self.zoom_factor / 1.1
                 if new_zoom < 1.0:
                     new_zoom = 1.0
-            new_width = self.original_pixmap.width() * new_zoom
-            new_height = self.original_pixmap.height() * new_zoom
+            new_width, new_height = self.display_size(new_zoom)
             mouse_pt = event.pos()
             rel_x = (mouse_pt.x() - old_rect.x()) / old_rect.width() if old_rect.width() else 0.5
             rel_y = (mouse_pt.y() - old_rect.y()) / old_rect.height() if old_rect.height() else 0.5
@@ -642,16 +1938,11 @@ class BoundingBoxAnnotator(QMainWindow):
                     return super().eventFilter(source, event)
                 self.erasing = (QApplication.keyboardModifiers() == Qt.ControlModifier)
                 if self.erasing:
-                    removed = False
-                    for i, (box, _) in enumerate(self.boxes):
-                        disp_box = self.map_to_display_coords(box)
-                        if disp_box.contains(pt):
-                            self.boxes.pop(i)
-                            self.image_modified = True
-                            removed = True
-                            break
-                    if removed:
-                        self.update_display()
+                    # The spatial index returns the smallest box under the click,
+                    # so nested boxes can be removed from the inside out.
+                    row = self.box_at(pt)
+                    if row >= 0:
+                        self.apply_edit(delete_op(self.boxes, row))
                 else:
                     self.drawing = True
                     self.start_point = pt
@@ -662,6 +1953,11 @@ class BoundingBoxAnnotator(QMainWindow):
                 self.end_point = event.pos()
                 self.current_box = QRect(self.start_point, self.end_point).normalized()
                 self.update_display()
+            elif event.type() == QEvent.MouseMove and self.original_pixmap is not None and self.image_rect:
+                row = self.box_at(event.pos())
+                if row != self.hover_row:
+                    self.hover_row = row
+                    self.update_display()
             elif event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton and self.drawing:
                 self.drawing = False
                 self.end_point = event.pos()
@@ -669,15 +1965,15 @@ class BoundingBoxAnnotator(QMainWindow):
                 if final_box.width() > 5 and final_box.height() > 5:
                     orig_box = self.map_to_original_coords(final_box)
                     if orig_box.width() > 0 and orig_box.height() > 0:
-                        self.boxes.append((orig_box, self.current_class))
-                        self.image_modified = True
+                        self.apply_edit(add_op(self.boxes, orig_box.x(), orig_box.y(), orig_box.width(),
+                                               orig_box.height(), self.current_class))
                 self.current_box = None
                 self.update_display()
         return super().eventFilter(source, event)
 
-    def show_warning(self, title, text):
+    def message_box(self, icon, title, text):
         msg = QMessageBox(self)
-        msg.setIcon(QMessageBox.Warning)
+        msg.setIcon(icon)
         msg.setWindowTitle(title)
         msg.setText(text)
         msg.setStyleSheet("""
@@ -692,62 +1988,59 @@ class BoundingBoxAnnotator(QMainWindow):
                 background-color: white;
             }
         """)
-        msg.exec_()
+        return msg
+
+    def show_warning(self, title, text):
+        self.message_box(QMessageBox.Warning, title, text).exec_()
 
     def show_information(self, title, text):
-        msg = QMessageBox(self)
-        msg.setIcon(QMessageBox.Information)
-        msg.setWindowTitle(title)
-        msg.setText(text)
-        msg.setStyleSheet("""
-            QMessageBox {
-                background-color: white;
-            }
-            QMessageBox QLabel {
-                background-color: white;
-                color: black;
-            }
-            QMessageBox QDialogButtonBox {
-                background-color: white;
-            }
-        """)
-        msg.exec_()
+        self.message_box(QMessageBox.Information, title, text).exec_()
+
+    def ask_question(self, title, text, buttons):
+        msg = self.message_box(QMessageBox.Question, title, text)
+        msg.setStandardButtons(buttons)
+        return msg.exec_()
 
     def save_annotation(self, auto_save=False):
         if not self.image_folder or not self.output_folder:
             if not auto_save:
                 self.show_warning("Warning", "Please select input and output folders first.")
             return
-        file_name = os.path.basename(self.current_image_path)
-        base_name, ext = os.path.splitext(file_name)
-        image_output_path = os.path.join(self.images_output, file_name)
-        label_output_path = os.path.join(self.labels_output, base_name + ".txt")
+        file_name = self.output_name(self.current_image_path)
+        label_output_path = self.label_path(self.current_image_path)
+        # A dataset is edited in place: its images are never placed or removed.
+        image_output = None if self.dataset_mode else self.image_output
+        # The save worker writes the journal commit marker once the label is on disk.
+        self.journal_dirty = False
         if not self.boxes:
-            if os.path.exists(label_output_path):
-                os.remove(label_output_path)
-                print(f"Deleted annotation file: {label_output_path}")
-            if os.path.exists(image_output_path):
-                os.remove(image_output_path)
-                print(f"Deleted image copy: {image_output_path}")
-            if not auto_save:
-                self.show_information("Removed", "No bounding boxes drawn. Existing annotation and image copy removed.")
-            return
-        shutil.copy2(self.current_image_path, image_output_path)
-        img = QImage(self.current_image_path)
-        img_width = img.width()
-        img_height = img.height()
-        with open(label_output_path, 'w') as f:
-            for box, cid in self.boxes:
-                x_center = (box.x() + box.width() / 2) / img_width
-                y_center = (box.y() + box.height() / 2) / img_height
-                w = box.width() / img_width
-                h = box.height() / img_height
-                f.write(f"{cid} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n")
-        if not auto_save:
+            self.save_queue.submit(SaveJob(self.current_image_path, file_name, image_output,
+                                           label_output_path, None))
+            # A failed save is reported by on_save_failed.
+            if not auto_save and self.save_queue.wait_for(label_output_path) is None:
+                self.journal_base = None
+                removed = "Existing annotation removed." if self.dataset_mode else \
+                    "Existing annotation and image copy removed."
+                self.show_information("Removed", f"No bounding boxes drawn. {removed}")
+            return
+        # Sizes come from the header probe done on load, not a second decode.
+        img_width = self.image_width
+        img_height = self.image_height
+        rows = self.boxes.to_yolo(img_width, img_height)
+        # The label text is snapshotted here; copying and writing happen on
+        # the save worker. Manual saves wait so the confirmation is accurate.
+        self.save_queue.submit(SaveJob(
+            self.current_image_path, file_name, image_output, label_output_path,
+            via_yolo.format_label_array(rows)
+        ))
+        if not auto_save and self.save_queue.wait_for(label_output_path) is None:
+            # Later edits of this visit are journaled against the new label file.
+            self.journal_base = os.stat(label_output_path).st_mtime_ns
             self.show_information("Success", f"Annotation saved to {label_output_path}")
 
 
 def main():
+    # Needed for process pools in frozen (PyInstaller) builds.
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = BoundingBoxAnnotator()
     window.show()
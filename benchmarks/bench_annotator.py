@@ -0,0 +1,256 @@
+"""
+Offscreen benchmarks for the annotator hot paths.
+
+Generates synthetic image folders and YOLO labels, drives
+BoundingBoxAnnotator under QT_QPA_PLATFORM=offscreen and reports latency
+percentiles per operation plus peak RSS. Results are written as JSON and
+can be compared against a previous run:
+
+    python benchmarks/bench_annotator.py --output bench.json
+    python benchmarks/bench_annotator.py --compare bench.json --threshold 1.25
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from PyQt5.QtCore import QPoint, QRect, QStandardPaths, QT_VERSION_STR  # noqa: E402
+from PyQt5.QtGui import QColor, QImage, QPainter  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+RESOLUTIONS = {"720p": (1280, 720), "12mp": (4000, 3000), "24mp": (6000, 4000)}
+BOX_COUNTS = (10, 200, 2000)
+
+
+def load_app_module():
+    spec = importlib.util.spec_from_file_location("via_main", os.path.join(REPO_ROOT, "VIA main code.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_dataset(root, size, images, boxes, seed=0):
+    """
+    Writes images noisy enough to defeat trivial compression and a label
+    file with the requested number of boxes for each.
+    """
+    rng = random.Random(seed)
+    width, height = size
+    image_dir = os.path.join(root, "input")
+    label_dir = os.path.join(root, "output", "labels")
+    os.makedirs(image_dir)
+    os.makedirs(label_dir)
+    os.makedirs(os.path.join(root, "output", "images"))
+    for i in range(images):
+        img = QImage(width, height, QImage.Format_RGB32)
+        img.fill(QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        painter = QPainter(img)
+        for _ in range(200):
+            painter.fillRect(rng.randrange(width), rng.randrange(height), rng.randrange(8, width // 4),
+                             rng.randrange(8, height // 4),
+                             QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        painter.end()
+        name = f"frame_{i:05d}"
+        img.save(os.path.join(image_dir, name + ".jpg"), "JPG", 90)
+        shutil.copy(os.path.join(image_dir, name + ".jpg"), os.path.join(root, "output", "images"))
+        with open(os.path.join(label_dir, name + ".txt"), "w") as f:
+            for _ in range(boxes):
+                w, h = rng.uniform(0.01, 0.2), rng.uniform(0.01, 0.2)
+                f.write(f"{rng.randint(1, 3)} {rng.uniform(w / 2, 1 - w / 2):.6f} "
+                        f"{rng.uniform(h / 2, 1 - h / 2):.6f} {w:.6f} {h:.6f}\n")
+    return image_dir, os.path.join(root, "output")
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "n": len(ordered),
+        "p50_ms": pick(0.50) * 1000,
+        "p90_ms": pick(0.90) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+class Timer:
+    def __init__(self):
+        self.samples = {}
+
+    def measure(self, name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.samples.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+
+def run_case(module, app, size_name, box_count, images, repeat):
+    root = tempfile.mkdtemp(prefix="via-bench-")
+    try:
+        image_dir, output_dir = make_dataset(root, RESOLUTIONS[size_name], images, box_count)
+        window = module.BoundingBoxAnnotator()
+        window.resize(1400, 900)
+        window.show()
+        window.set_output_folder(output_dir)
+        window.image_folder = image_dir
+        window.load_images_from_folder()
+        window.scanner.wait()
+        app.processEvents()
+        timer = Timer()
+
+        for _ in range(repeat):
+            for idx in range(len(window.image_list)):
+                window.current_idx = idx
+                timer.measure("load_current_image", window.load_current_image)
+                app.processEvents()
+
+                window.invalidate_overlay()
+                window.base_key = None
+                window.scaled_key = None
+                timer.measure("update_display_full", window.update_display)
+                window.invalidate_overlay()
+                timer.measure("update_display_overlay", window.update_display)
+
+                rect = window.image_rect
+                window.drawing = True
+                window.start_point = QPoint(rect.x() + 10, rect.y() + 10)
+                for step in range(20):
+                    window.current_box = QRect(window.start_point, QPoint(rect.x() + 40 + step * 5,
+                                                                          rect.y() + 40 + step * 5))
+                    timer.measure("update_display_drag", window.update_display)
+                window.drawing = False
+                window.current_box = None
+
+                box = QRect(10, 10, 100, 100)
+                timer.measure("map_to_display_coords", window.map_to_display_coords, box)
+
+                file_name = os.path.basename(window.current_image_path)
+                lbl_path = os.path.join(window.labels_output, os.path.splitext(file_name)[0] + ".txt")
+                window.boxes.reset()
+                timer.measure("load_annotation", window.load_annotation, lbl_path,
+                              window.image_width, window.image_height)
+
+                window.image_modified = True
+                timer.measure("save_annotation_submit", window.save_annotation, True)
+                timer.measure("save_annotation_drain", window.save_queue.drain)
+
+            window.current_idx = 0
+            window.load_current_image()
+            for _ in range(len(window.image_list) - 1):
+                window.image_modified = False
+                timer.measure("change_image", window.change_image, 1)
+                app.processEvents()
+
+        window.close()
+        return {name: percentiles(samples) for name, samples in timer.samples.items()}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints p50 ratios against baseline and returns the regressed keys.
+    """
+    regressions = []
+    for case, ops in results["cases"].items():
+        for op, stats in ops.items():
+            old = baseline.get("cases", {}).get(case, {}).get(op)
+            if not old or old["p50_ms"] <= 0:
+                continue
+            ratio = stats["p50_ms"] / old["p50_ms"]
+            flag = "REGRESSION" if ratio > threshold else ""
+            print(f"{case:>16} {op:<26} {old['p50_ms']:9.3f} -> {stats['p50_ms']:9.3f} ms  x{ratio:5.2f} {flag}")
+            if ratio > threshold:
+                regressions.append(f"{case}/{op}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Venus Image Annotator hot paths offscreen.")
+    parser.add_argument("--sizes", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--boxes", nargs="+", type=int, default=list(BOX_COUNTS))
+    parser.add_argument("--images", type=int, default=5, help="Images per synthetic folder.")
+    parser.add_argument("--repeat", type=int, default=2, help="Passes over each folder.")
+    parser.add_argument("--output", help="Write JSON results to this file.")
+    parser.add_argument("--compare", help="Baseline JSON to compare p50 latencies against.")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="p50 ratio above which an operation counts as regressed.")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    # Keep the benchmark's classes.yaml away from the user's configuration.
+    QStandardPaths.setTestModeEnabled(True)
+    module = load_app_module()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "qt": QT_VERSION_STR,
+            "platform": platform.platform(),
+            "images": args.images,
+            "repeat": args.repeat,
+        },
+        "cases": {},
+    }
+    for size_name in args.sizes:
+        for box_count in args.boxes:
+            case = f"{size_name}/{box_count}boxes"
+            print(f"Running {case}...", file=sys.stderr)
+            results["cases"][case] = run_case(module, app, size_name, box_count, args.images, args.repeat)
+            for op, stats in results["cases"][case].items():
+                print(f"{case:>16} {op:<26} p50 {stats['p50_ms']:9.3f} ms  p90 {stats['p90_ms']:9.3f} ms  "
+                      f"p99 {stats['p99_ms']:9.3f} ms")
+    results["meta"]["peak_rss_mb"] = peak_rss_mb()
+    print(f"Peak RSS: {results['meta']['peak_rss_mb']:.1f} MB" if results["meta"]["peak_rss_mb"] else
+          "Peak RSS: unavailable")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
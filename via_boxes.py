@@ -0,0 +1,287 @@
+"""
+Array-backed storage for the boxes of the current image.
+Coordinates are kept in original image pixels as floats, next to int class
+ids and per-box flags, so display transforms and YOLO conversion run as
+vectorized NumPy operations instead of per-box Python loops.
+"""
+import math
+
+import numpy as np
+from PyQt5.QtCore import QRect
+
+FLAG_NONE = 0
+
+
+def yolo_to_coords(rows, img_width, img_height):
+    """
+    Converts an (n, 5) array of YOLO rows to (n, 4) truncated pixel boxes.
+    """
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+    xc, yc, wn, hn = rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4]
+    return np.stack([
+        np.trunc((xc - wn / 2) * img_width),
+        np.trunc((yc - hn / 2) * img_height),
+        np.trunc(wn * img_width),
+        np.trunc(hn * img_height),
+    ], axis=1)
+
+
+class GridIndex:
+    """
+    Uniform grid over original image coordinates mapping cells to box ids.
+    Boxes spanning more than max_cells cells are kept in a separate list
+    that every query checks, so huge boxes do not flood the grid.
+    """
+
+    def __init__(self, cell_size=64.0, max_cells=256):
+        self.cell_size = float(cell_size)
+        self.max_cells = max_cells
+        self._cells = {}
+        self._large = set()
+
+    def _cell_range(self, x, y, w, h):
+        c = self.cell_size
+        return (int(math.floor(x / c)), int(math.floor(y / c)),
+                int(math.floor((x + max(w, 0)) / c)), int(math.floor((y + max(h, 0)) / c)))
+
+    def add(self, box_id, x, y, w, h):
+        cx0, cy0, cx1, cy1 = self._cell_range(x, y, w, h)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > self.max_cells:
+            self._large.add(box_id)
+            return
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                self._cells.setdefault((cx, cy), set()).add(box_id)
+
+    def remove(self, box_id, x, y, w, h):
+        if box_id in self._large:
+            self._large.discard(box_id)
+            return
+        cx0, cy0, cx1, cy1 = self._cell_range(x, y, w, h)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                cell = self._cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(box_id)
+                    if not cell:
+                        del self._cells[(cx, cy)]
+
+    def clear(self):
+        self._cells.clear()
+        self._large.clear()
+
+    def candidates(self, x, y, w=0.0, h=0.0):
+        """
+        Ids of boxes that may intersect the given rectangle.
+        """
+        cx0, cy0, cx1, cy1 = self._cell_range(x, y, w, h)
+        found = set(self._large)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                cell = self._cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        return found
+
+
+class BoxStore:
+    """
+    Growable arrays of boxes in insertion order.
+    Iterating yields (QRect, class_id) pairs like the former list of tuples.
+    Every box has a stable id (ascending in row order) that the spatial
+    index refers to; the index is kept in sync on every add and remove.
+    """
+
+    def __init__(self, capacity=64):
+        self._coords = np.zeros((capacity, 4), dtype=np.float64)  # x, y, w, h
+        self._class_ids = np.zeros(capacity, dtype=np.int32)
+        self._flags = np.zeros(capacity, dtype=np.uint8)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._next_id = 0
+        self._n = 0
+        self.grid = GridIndex()
+
+    @property
+    def coords(self):
+        return self._coords[:self._n]
+
+    @property
+    def class_ids(self):
+        return self._class_ids[:self._n]
+
+    @property
+    def flags(self):
+        return self._flags[:self._n]
+
+    @property
+    def ids(self):
+        return self._ids[:self._n]
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        for row in range(self._n):
+            yield self.rect(row), int(self._class_ids[row])
+
+    def _reserve(self, n):
+        capacity = len(self._class_ids)
+        if n <= capacity:
+            return
+        while capacity < n:
+            capacity *= 2
+        for name in ("_coords", "_class_ids", "_flags", "_ids"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def append(self, x, y, w, h, class_id, flags=FLAG_NONE):
+        return self.insert(self._n, x, y, w, h, class_id, flags)
+
+    def insert(self, row, x, y, w, h, class_id, flags=FLAG_NONE, box_id=None):
+        """
+        Inserts a box at row. box_id restores a previously removed box at its
+        old position; new boxes get a fresh id.
+        """
+        if box_id is None:
+            box_id = self._next_id
+        self._next_id = max(self._next_id, box_id + 1)
+        self._reserve(self._n + 1)
+        for arr in (self._coords, self._class_ids, self._flags, self._ids):
+            arr[row + 1:self._n + 1] = arr[row:self._n]
+        self._coords[row] = (x, y, w, h)
+        self._class_ids[row] = class_id
+        self._flags[row] = flags
+        self._ids[row] = box_id
+        self._n += 1
+        self.grid.add(box_id, x, y, w, h)
+        return row
+
+    def extend(self, coords, class_ids, flags=None):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 4)
+        count = len(coords)
+        self._reserve(self._n + count)
+        self._coords[self._n:self._n + count] = coords
+        self._class_ids[self._n:self._n + count] = class_ids
+        self._flags[self._n:self._n + count] = FLAG_NONE if flags is None else flags
+        new_ids = np.arange(self._next_id, self._next_id + count)
+        self._ids[self._n:self._n + count] = new_ids
+        self._next_id += count
+        self._n += count
+        for box_id, (x, y, w, h) in zip(new_ids.tolist(), coords.tolist()):
+            self.grid.add(box_id, x, y, w, h)
+
+    def pop(self, row):
+        """
+        Removes row and returns it as (x, y, w, h, class_id, flags).
+        """
+        removed = tuple(self._coords[row].tolist()) + (int(self._class_ids[row]), int(self._flags[row]))
+        self.grid.remove(int(self._ids[row]), *removed[:4])
+        for arr in (self._coords, self._class_ids, self._flags, self._ids):
+            arr[row:self._n - 1] = arr[row + 1:self._n]
+        self._n -= 1
+        return removed
+
+    def clear(self):
+        self._n = 0
+        self.grid.clear()
+
+    def reset(self):
+        """
+        Clears the store and restarts box ids, for loading a new image.
+        """
+        self.clear()
+        self._next_id = 0
+
+    def peek_next_id(self):
+        return self._next_id
+
+    def set_cell_size(self, cell_size):
+        """
+        Rebuilds the spatial index with a new grid cell size.
+        """
+        self.grid = GridIndex(cell_size)
+        for box_id, (x, y, w, h) in zip(self.ids.tolist(), self.coords.tolist()):
+            self.grid.add(box_id, x, y, w, h)
+
+    def rows_for_ids(self, box_ids):
+        """
+        Maps box ids to their current rows (ids ascend with row order).
+        """
+        if not box_ids:
+            return np.empty(0, dtype=np.int64)
+        wanted = np.fromiter(box_ids, dtype=np.int64)
+        ids = self.ids
+        rows = np.searchsorted(ids, wanted)
+        valid = rows < self._n
+        rows, wanted = rows[valid], wanted[valid]
+        return np.sort(rows[ids[rows] == wanted])
+
+    def hit_test(self, x, y):
+        """
+        Returns the row of the smallest box containing (x, y), or -1.
+        """
+        rows = self.rows_for_ids(self.grid.candidates(x, y))
+        if not len(rows):
+            return -1
+        c = self._coords[rows]
+        inside = (c[:, 0] <= x) & (x < c[:, 0] + c[:, 2]) & (c[:, 1] <= y) & (y < c[:, 1] + c[:, 3])
+        if not inside.any():
+            return -1
+        rows, c = rows[inside], c[inside]
+        return int(rows[np.argmin(c[:, 2] * c[:, 3])])
+
+    def query_rect(self, x, y, w, h):
+        """
+        Returns the sorted rows of all boxes overlapping the given rectangle.
+        """
+        rows = self.rows_for_ids(self.grid.candidates(x, y, w, h))
+        if not len(rows):
+            return rows
+        c = self._coords[rows]
+        overlap = (c[:, 0] < x + w) & (x < c[:, 0] + c[:, 2]) & (c[:, 1] < y + h) & (y < c[:, 1] + c[:, 3])
+        return rows[overlap]
+
+    def rect(self, row):
+        x, y, w, h = self._coords[row]
+        return QRect(int(x), int(y), int(w), int(h))
+
+    def display_rects(self, x_scale, y_scale, x_offset, y_offset):
+        """
+        Returns an (n, 4) int array of display rectangles, truncated the same
+        way as BoundingBoxAnnotator.map_to_display_coords.
+        """
+        c = self.coords
+        out = np.empty((self._n, 4), dtype=np.int64)
+        out[:, 0] = np.trunc(np.trunc(c[:, 0]) * x_scale) + x_offset
+        out[:, 1] = np.trunc(np.trunc(c[:, 1]) * y_scale) + y_offset
+        out[:, 2] = np.trunc(np.trunc(c[:, 2]) * x_scale)
+        out[:, 3] = np.trunc(np.trunc(c[:, 3]) * y_scale)
+        return out
+
+    def qrects(self, display):
+        """
+        QRect view over an array returned by display_rects.
+        """
+        return [QRect(x, y, w, h) for x, y, w, h in display.tolist()]
+
+    def extend_from_yolo(self, rows, img_width, img_height):
+        """
+        Appends an (n, 5) array of YOLO rows converted to pixel boxes.
+        """
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+        self.extend(yolo_to_coords(rows, img_width, img_height), rows[:, 0].astype(np.int32))
+
+    def to_yolo(self, img_width, img_height):
+        """
+        Returns the boxes as an (n, 5) float array of YOLO rows.
+        """
+        c = self.coords
+        rows = np.empty((self._n, 5), dtype=np.float64)
+        rows[:, 0] = self.class_ids
+        rows[:, 1] = (c[:, 0] + c[:, 2] / 2) / img_width
+        rows[:, 2] = (c[:, 1] + c[:, 3] / 2) / img_height
+        rows[:, 3] = c[:, 2] / img_width
+        rows[:, 4] = c[:, 3] / img_height
+        return rows
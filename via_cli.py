@@ -0,0 +1,332 @@
+"""
+Headless batch tools for YOLO label folders.
+
+    venus-annotator validate labels/ --classes classes.yaml
+    venus-annotator remap labels/ --map 1:2 --map 3:drop
+    venus-annotator remap labels/ --resume
+    venus-annotator rewrite labels/ --precision 6
+    venus-annotator cache labels/
+    venus-annotator stats labels/ --classes classes.yaml
+    venus-annotator export output/ --format coco --dest dataset.json
+    venus-annotator import dataset.json --format coco --dest output/
+
+Files are processed in parallel across cores; results are streamed to
+stdout and throughput is reported on stderr.
+"""
+import argparse
+import os
+import sys
+import time
+
+import yaml
+
+import via_export
+import via_yolo
+from via_labelcache import LabelCache
+from via_remap import ClassRemap, pending_remap, remap_text
+from via_stats import DatasetStats
+
+
+def load_class_names(yaml_path):
+    with open(yaml_path, "r") as f:
+        config = yaml.safe_load(f) or {}
+    return {int(cls["id"]): str(cls.get("name", cls["id"])) for cls in config.get("classes", [])}
+
+
+def load_class_ids(yaml_path):
+    return set(load_class_names(yaml_path))
+
+
+def parse_mapping(items):
+    """
+    Parses ["1:2", "3:drop"] into {1: 2, 3: None}.
+    """
+    mapping = {}
+    for item in items:
+        for pair in item.split(","):
+            src, _, dst = pair.partition(":")
+            if not dst:
+                raise argparse.ArgumentTypeError(f"Invalid mapping '{pair}', expected OLD:NEW")
+            mapping[int(src)] = None if dst.strip().lower() == "drop" else int(dst)
+    return mapping
+
+
+def output_path(path, labels_dir, output_dir):
+    """
+    Where the result for path goes: path itself, or the same place below
+    output_dir as path has below labels_dir (split folders are kept).
+    """
+    if not output_dir:
+        return path
+    target = os.path.join(output_dir, os.path.relpath(path, labels_dir))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    return target
+
+
+def validate_file(path, known_ids):
+    with open(path, "r") as f:
+        rows, malformed = via_yolo.parse_labels(f.read())
+    messages = [f"line {n}: malformed" for n in malformed]
+    messages += [f"box {i + 1}: {msg}" for i, msg in via_yolo.validate_rows(rows, known_ids)]
+    return path, messages
+
+
+def remap_file(path, mapping, labels_dir, output_dir, dry_run):
+    with open(path, "r") as f:
+        text, changed, dropped = remap_text(f.read(), mapping)
+    if not dry_run and (changed or dropped or output_dir):
+        via_yolo.atomic_write_text(output_path(path, labels_dir, output_dir), text)
+    return path, [f"{changed + dropped} box(es) remapped, {dropped} dropped"] if changed or dropped else []
+
+
+def rewrite_file(path, labels_dir, output_dir, precision, dry_run):
+    with open(path, "r") as f:
+        text = f.read()
+    rows, malformed = via_yolo.parse_labels(text)
+    new_text = via_yolo.format_labels(rows, precision)
+    if new_text == text and not output_dir:
+        return path, []
+    if not dry_run:
+        via_yolo.atomic_write_text(output_path(path, labels_dir, output_dir), new_text)
+    messages = ["rewritten"]
+    if malformed:
+        messages.append(f"{len(malformed)} malformed line(s) dropped")
+    return path, messages
+
+
+def _run_job(job):
+    func, path, args = job
+    try:
+        return func(path, *args)
+    except Exception as e:
+        return path, [f"error: {e}"]
+
+
+class ThroughputReporter:
+    """
+    Prints a files/s (and MB/s, when bytes are counted) progress line to
+    stderr at most once per interval.
+    """
+
+    def __init__(self, interval=1.0, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.count = 0
+        self.bytes = 0
+
+    def _rates(self, elapsed):
+        text = f"{self.count / elapsed:.0f} files/s"
+        if self.bytes:
+            text += f", {self.bytes / elapsed / 1e6:.1f} MB/s"
+        return text
+
+    def tick(self, nbytes=0):
+        self.count += 1
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            print(f"\r{self.count} files, {self._rates(now - self.start)}", end="", file=self.stream, flush=True)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start
+        rates = self._rates(elapsed) if elapsed > 0 else "0 files/s"
+        size = f", {self.bytes / 1e6:.1f} MB" if self.bytes else ""
+        print(f"\rProcessed {self.count} files{size} in {elapsed:.2f}s ({rates})", file=self.stream)
+
+
+def run_parallel(func, paths, args, workers=None, chunksize=256):
+    """
+    Applies func(path, *args) to every path on a process pool and yields
+    (path, messages) in input order as results arrive. Paths are taken
+    lazily, a bounded number of chunks at a time.
+    """
+    jobs = ((func, path, args) for path in paths)
+    yield from via_export.pool_map(_run_job, jobs, workers, chunksize)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="venus-annotator",
+        description="Batch tools for Venus Image Annotator YOLO label folders."
+    )
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: number of CPUs).")
+    parser.add_argument("--chunksize", type=int, default=256,
+                        help="Files handed to a worker at a time.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("validate", help="Report malformed, out-of-range, degenerate or unknown-class boxes.")
+    p.add_argument("labels", help="Folder of YOLO .txt label files.")
+    p.add_argument("--classes", help="classes.yaml used to check class ids.")
+
+    p = sub.add_parser("remap", help="Change or drop class ids.")
+    p.add_argument("labels", help="Folder of YOLO .txt label files.")
+    p.add_argument("--map", action="append",
+                   help="OLD:NEW or OLD:drop; may be repeated or comma separated.")
+    p.add_argument("--resume", action="store_true",
+                   help="Finish an interrupted in-place remap (uses its recorded mapping).")
+    p.add_argument("--output", help="Write results here instead of in place.")
+    p.add_argument("--dry-run", action="store_true")
+
+    p = sub.add_parser("rewrite", help="Rewrite labels with consistent precision.")
+    p.add_argument("labels", help="Folder of YOLO .txt label files.")
+    p.add_argument("--output", help="Write results here instead of in place.")
+    p.add_argument("--precision", type=int, default=via_yolo.DEFAULT_PRECISION)
+    p.add_argument("--dry-run", action="store_true")
+
+    p = sub.add_parser("cache", help="Build or refresh the binary parsed-label cache of a folder.")
+    p.add_argument("labels", help="Folder of YOLO .txt label files.")
+
+    p = sub.add_parser("stats", help="Print class balance, box sizes and problem counts (uses the label cache).")
+    p.add_argument("labels", help="Folder of YOLO .txt label files.")
+    p.add_argument("--classes", help="classes.yaml used for class names.")
+
+    p = sub.add_parser("export", help="Export an output folder to COCO JSON, VOC XML or tar shards.")
+    p.add_argument("source", help="Annotator output folder (with images/ and labels/).")
+    p.add_argument("--format", choices=via_export.EXPORT_FORMATS, required=True)
+    p.add_argument("--dest", required=True,
+                   help="COCO: JSON file. VOC and shards: folder to write into.")
+    p.add_argument("--classes", help="classes.yaml used for category names.")
+    p.add_argument("--shard-size", type=int, default=1024, help="Maximum shard size in MB.")
+    p.add_argument("--shard-samples", type=int, default=10000, help="Maximum samples per shard.")
+
+    p = sub.add_parser("import", help="Import COCO JSON, VOC XML or tar shards as YOLO labels.")
+    p.add_argument("source", help="COCO: JSON file. VOC: folder of XML files. Shards: .tar file or folder.")
+    p.add_argument("--format", choices=via_export.EXPORT_FORMATS, required=True)
+    p.add_argument("--dest", required=True, help="Output folder; labels go to labels/, shard images to images/.")
+    p.add_argument("--classes", help="classes.yaml used to map VOC class names to ids.")
+    p.add_argument("--precision", type=int, default=via_yolo.DEFAULT_PRECISION)
+    return parser
+
+
+def run_transfer(args):
+    """
+    Runs an export or import command and reports like the label tools.
+    """
+    class_names = load_class_names(args.classes) if args.classes else None
+    if args.command == "export":
+        results = via_export.export_dataset(
+            args.source, args.format, args.dest, class_names, args.workers, args.chunksize,
+            args.shard_size * 1024 * 1024, args.shard_samples)
+    else:
+        results = via_export.import_dataset(
+            args.source, args.format, args.dest, class_names, args.precision, args.workers, args.chunksize)
+    reporter = ThroughputReporter()
+    flagged = 0
+    for path, messages, nbytes in results:
+        reporter.tick(nbytes)
+        if messages:
+            flagged += 1
+            for msg in messages:
+                print(f"{path}: {msg}")
+    reporter.finish()
+    print(f"{flagged} file(s) reported", file=sys.stderr)
+    return 0
+
+
+def run_remap(args, parser):
+    """
+    Remaps labels in place through via_remap, which can resume after an
+    interruption without applying the mapping twice. Results are printed
+    per file as chunks finish, like the other label commands.
+    """
+    pending = pending_remap(args.labels)
+    if args.resume:
+        if pending is None:
+            parser.error(f"No unfinished remap in {args.labels}")
+        mapping = pending
+    else:
+        mapping = parse_mapping(args.map)
+        if pending is not None and pending != mapping:
+            parser.error(f"{args.labels} has an unfinished remap with another mapping; finish it with --resume")
+    reporter = ThroughputReporter()
+    flagged = 0
+
+    def progress(path, counts):
+        nonlocal flagged
+        reporter.tick()
+        if counts is None:
+            message = "rewritten (staged by the interrupted run)"
+        elif any(counts):
+            changed, dropped = counts
+            message = f"{changed + dropped} box(es) remapped, {dropped} dropped"
+        else:
+            return
+        flagged += 1
+        print(f"{path}: {message}")
+
+    ClassRemap(args.labels, mapping).run(args.workers, progress)
+    reporter.finish()
+    print(f"{flagged} file(s) reported", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command in ("export", "import"):
+        if not os.path.exists(args.source):
+            parser.error(f"No such file or directory: {args.source}")
+        return run_transfer(args)
+
+    if not os.path.isdir(args.labels):
+        parser.error(f"Not a directory: {args.labels}")
+    if getattr(args, "output", None):
+        os.makedirs(args.output, exist_ok=True)
+
+    if args.command == "cache":
+        start = time.perf_counter()
+        files, parsed = LabelCache(args.labels).build(args.workers, args.chunksize)
+        print(f"{files} label file(s) cached, {parsed} parsed in {time.perf_counter() - start:.2f}s",
+              file=sys.stderr)
+        return 0
+
+    if args.command == "stats":
+        cache = LabelCache(args.labels)
+        cache.build(args.workers, args.chunksize)
+        stats = DatasetStats()
+        stats.rebuild(cache)
+        class_names = load_class_names(args.classes) if args.classes else None
+        for line in stats.summary(class_names):
+            print(line)
+        return 0
+
+    if args.command == "remap" and not args.map and not args.resume:
+        parser.error("remap needs --map or --resume")
+    if args.command == "remap" and args.resume and (args.output or args.dry_run):
+        parser.error("--resume only applies to in-place remaps")
+    if args.command == "remap" and not args.output and not args.dry_run:
+        return run_remap(args, parser)
+
+    if args.command == "validate":
+        known_ids = load_class_ids(args.classes) if args.classes else None
+        func, func_args = validate_file, (known_ids,)
+    elif args.command == "remap":
+        func = remap_file
+        func_args = (parse_mapping(args.map), args.labels, args.output, args.dry_run)
+    else:
+        func = rewrite_file
+        func_args = (args.labels, args.output, args.precision, args.dry_run)
+
+    reporter = ThroughputReporter()
+    flagged = 0
+    # Split folders (labels/train, labels/val) are processed too, like the
+    # label cache and in-place remaps do.
+    paths = via_yolo.iter_label_files(args.labels, recursive=True)
+    for path, messages in run_parallel(func, paths, func_args, args.workers, args.chunksize):
+        reporter.tick()
+        if messages:
+            flagged += 1
+            for msg in messages:
+                print(f"{path}: {msg}")
+    reporter.finish()
+    print(f"{flagged} file(s) reported", file=sys.stderr)
+    return 1 if args.command == "validate" and flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
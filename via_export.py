@@ -0,0 +1,419 @@
+"""
+Export of an annotator output folder (images/ + labels/) to COCO JSON,
+Pascal VOC XML or tar shards in WebDataset layout, and import of those
+formats back into YOLO labels.
+
+Label files and image headers are read on a process pool and streamed to
+the writer, so memory use does not grow with the dataset: work is submitted
+in a bounded window of chunks, COCO annotations are spooled to a temporary
+file while the image list is written, and shards are written by the workers
+themselves. Images listed in the manifest may be archive members or video
+frames and are read through via_sources.
+
+Every export and import function is a generator of (path, messages, nbytes)
+so callers can report progress and problems as they arrive.
+"""
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import xml.etree.ElementTree as ET
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import via_yolo
+from via_index import stem_of
+from via_output import MANIFEST_NAME, read_manifest
+from via_scan import IMAGE_EXTS
+from via_sources import CONTAINER_ERRORS, image_dims, read_bytes, source_name, source_size, split_source
+
+EXPORT_FORMATS = ("coco", "voc", "shards")
+SHARD_PATTERN = "shard-%06d.tar"
+
+# width and height are 0 when the image is missing or unreadable.
+Sample = namedtuple("Sample", "stem label_path image_path width height rows nbytes")
+
+
+def _run_chunk(job):
+    func, items = job
+    return [func(item) for item in items]
+
+
+def pool_map(func, items, workers=None, chunksize=64):
+    """
+    Yields func(item) for every item in order, computed on a process pool.
+    Unlike Executor.map, items are taken lazily: at most two chunks per
+    worker are in flight at a time.
+    """
+    if workers == 1:
+        yield from map(func, items)
+        return
+    items = iter(items)
+    window = 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < window:
+                    chunk = list(islice(items, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(pool.submit(_run_chunk, (func, chunk)))
+                if not pending:
+                    return
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def find_images(output_folder):
+    """
+    Returns {stem: image path} for output/images and the manifest.
+    """
+    images = {}
+    manifest = os.path.join(output_folder, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        for name, src in read_manifest(manifest).items():
+            images[os.path.splitext(name)[0]] = src
+    images_dir = os.path.join(output_folder, "images")
+    if os.path.isdir(images_dir):
+        with os.scandir(images_dir) as it:
+            for entry in it:
+                if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTS:
+                    images[stem_of(entry.name)] = entry.path
+    return images
+
+
+def read_sample(pair):
+    label_path, image_path = pair
+    rows = via_yolo.read_labels(label_path)
+    size = image_dims(image_path) if image_path else None
+    width, height = size or (0, 0)
+    nbytes = os.path.getsize(label_path)
+    if image_path:
+        try:
+            nbytes += source_size(image_path)
+        except CONTAINER_ERRORS:
+            pass
+    return Sample(stem_of(label_path), label_path, image_path, width, height, rows, nbytes)
+
+
+def iter_samples(output_folder, workers=None, chunksize=64):
+    """
+    Yields a Sample per label file in output/labels, in name order.
+    """
+    images = find_images(output_folder)
+    labels_dir = os.path.join(output_folder, "labels")
+    pairs = ((path, images.get(stem_of(path))) for path in via_yolo.iter_label_files(labels_dir))
+    yield from pool_map(read_sample, pairs, workers, chunksize)
+
+
+def _pixel_box(row, width, height):
+    """
+    Converts a YOLO row to (class_id, x_min, y_min, x_max, y_max) in pixels.
+    """
+    cid, xc, yc, w, h = row
+    return (cid, (xc - w / 2) * width, (yc - h / 2) * height,
+            (xc + w / 2) * width, (yc + h / 2) * height)
+
+
+def _image_name(sample):
+    """
+    File name of the sample's image in the export: its stem and the
+    extension of its source.
+    """
+    return sample.stem + os.path.splitext(source_name(sample.image_path))[1]
+
+
+def _sample_problem(sample):
+    if sample.image_path is None:
+        return "no image found"
+    if not sample.width or not sample.height:
+        return "image size unknown"
+    return None
+
+
+def _copy_spool(spool, out):
+    spool.seek(0)
+    shutil.copyfileobj(spool, out)
+
+
+def export_coco(samples, dest, class_names):
+    """
+    Streams samples into a single COCO JSON file at dest.
+    """
+    tmp_path = dest + ".tmp"
+    used_ids = set()
+    ann_id = 0
+    with open(tmp_path, "w", encoding="utf-8") as out, tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        out.write('{"info": {"description": "Venus Image Annotator export"}, "images": [')
+        image_id = 0
+        for sample in samples:
+            problem = _sample_problem(sample)
+            if problem:
+                yield sample.label_path, [problem], 0
+                continue
+            image_id += 1
+            entry = {"id": image_id, "file_name": _image_name(sample),
+                     "width": sample.width, "height": sample.height}
+            text = ("" if image_id == 1 else ", ") + json.dumps(entry)
+            for row in sample.rows:
+                cid, x0, y0, x1, y1 = _pixel_box(row, sample.width, sample.height)
+                ann_id += 1
+                used_ids.add(cid)
+                ann = {"id": ann_id, "image_id": image_id, "category_id": cid,
+                       "bbox": [round(x0, 2), round(y0, 2), round(x1 - x0, 2), round(y1 - y0, 2)],
+                       "area": round((x1 - x0) * (y1 - y0), 2), "iscrowd": 0}
+                spool.write(("" if ann_id == 1 else ", ") + json.dumps(ann))
+            out.write(text)
+            yield sample.label_path, [], len(text)
+        out.write('], "annotations": [')
+        _copy_spool(spool, out)
+        categories = [{"id": cid, "name": class_names.get(cid, str(cid))}
+                      for cid in sorted(used_ids | set(class_names))]
+        out.write('], "categories": ' + json.dumps(categories) + "}\n")
+    os.replace(tmp_path, dest)
+
+
+def voc_xml(sample, class_names):
+    root = ET.Element("annotation")
+    ET.SubElement(root, "folder").text = os.path.basename(os.path.dirname(split_source(sample.image_path)[0]))
+    ET.SubElement(root, "filename").text = _image_name(sample)
+    size = ET.SubElement(root, "size")
+    ET.SubElement(size, "width").text = str(sample.width)
+    ET.SubElement(size, "height").text = str(sample.height)
+    ET.SubElement(size, "depth").text = "3"
+    for row in sample.rows:
+        cid, x0, y0, x1, y1 = _pixel_box(row, sample.width, sample.height)
+        obj = ET.SubElement(root, "object")
+        ET.SubElement(obj, "name").text = class_names.get(cid, str(cid))
+        ET.SubElement(obj, "pose").text = "Unspecified"
+        ET.SubElement(obj, "truncated").text = "0"
+        ET.SubElement(obj, "difficult").text = "0"
+        bndbox = ET.SubElement(obj, "bndbox")
+        # VOC pixel coordinates are 1-based.
+        for tag, value in (("xmin", x0), ("ymin", y0), ("xmax", x1), ("ymax", y1)):
+            ET.SubElement(bndbox, tag).text = str(int(round(value)) + 1)
+    return ET.tostring(root, encoding="unicode") + "\n"
+
+
+def export_voc(samples, dest, class_names):
+    """
+    Writes one VOC XML file per sample into dest.
+    """
+    os.makedirs(dest, exist_ok=True)
+    for sample in samples:
+        problem = _sample_problem(sample)
+        if problem:
+            yield sample.label_path, [problem], 0
+            continue
+        text = voc_xml(sample, class_names)
+        via_yolo.atomic_write_text(os.path.join(dest, sample.stem + ".xml"), text)
+        yield sample.label_path, [], len(text)
+
+
+def write_shard(job):
+    """
+    Writes one tar shard of (stem, image_path, label_path) members and
+    returns (shard_path, bytes written). Archive members and video frames
+    are read through via_sources.
+    """
+    shard_path, members = job
+    tmp_path = shard_path + ".tmp"
+    with tarfile.open(tmp_path, "w") as tar:
+        for stem, image_path, label_path in members:
+            container, member = split_source(image_path)
+            ext = os.path.splitext(source_name(image_path))[1].lower()
+            # WebDataset groups files by the key before the first dot.
+            if member is None:
+                tar.add(image_path, arcname=stem + ext)
+            else:
+                data = read_bytes(image_path)
+                info = tarfile.TarInfo(stem + ext)
+                info.size = len(data)
+                info.mtime = os.stat(container).st_mtime
+                tar.addfile(info, io.BytesIO(data))
+            tar.add(label_path, arcname=stem + via_yolo.LABEL_EXT)
+    os.replace(tmp_path, shard_path)
+    return shard_path, os.path.getsize(shard_path)
+
+
+def plan_shards(samples, dest, shard_bytes, shard_samples, skipped):
+    """
+    Groups samples into shard jobs of at most shard_bytes input bytes or
+    shard_samples samples. Samples without an image go to skipped.
+    """
+    members, size, index = [], 0, 0
+    for sample in samples:
+        if sample.image_path is None:
+            skipped.append(sample.label_path)
+            continue
+        if members and (size + sample.nbytes > shard_bytes or len(members) >= shard_samples):
+            yield os.path.join(dest, SHARD_PATTERN % index), members
+            members, size, index = [], 0, index + 1
+        members.append((sample.stem, sample.image_path, sample.label_path))
+        size += sample.nbytes
+    if members:
+        yield os.path.join(dest, SHARD_PATTERN % index), members
+
+
+def export_shards(samples, dest, shard_bytes=1024 ** 3, shard_samples=10000, workers=None):
+    """
+    Writes tar shards of image + label pairs into dest, one shard per worker task.
+    """
+    os.makedirs(dest, exist_ok=True)
+    skipped = []
+    jobs = plan_shards(samples, dest, shard_bytes, shard_samples, skipped)
+    for shard_path, nbytes in pool_map(write_shard, jobs, workers, chunksize=1):
+        yield shard_path, [], nbytes
+    for label_path in skipped:
+        yield label_path, ["no image found"], 0
+
+
+def export_dataset(output_folder, fmt, dest, class_names=None, workers=None, chunksize=64,
+                   shard_bytes=1024 ** 3, shard_samples=10000):
+    class_names = class_names or {}
+    samples = iter_samples(output_folder, workers, chunksize)
+    if fmt == "coco":
+        return export_coco(samples, dest, class_names)
+    if fmt == "voc":
+        return export_voc(samples, dest, class_names)
+    if fmt == "shards":
+        return export_shards(samples, dest, shard_bytes, shard_samples, workers)
+    raise ValueError(f"Unknown export format '{fmt}'")
+
+
+def _yolo_row(cid, x0, y0, x1, y1, width, height):
+    return (cid, (x0 + x1) / 2 / width, (y0 + y1) / 2 / height, (x1 - x0) / width, (y1 - y0) / height)
+
+
+def import_coco(src, labels_dir, precision=via_yolo.DEFAULT_PRECISION):
+    """
+    Writes a YOLO label file per annotated image of a COCO JSON file.
+    COCO category ids become class ids.
+    """
+    with open(src, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    images = {img["id"]: img for img in data.get("images", [])}
+    rows = {}
+    for ann in data.get("annotations", []):
+        img = images.get(ann["image_id"])
+        if img is None:
+            continue
+        x, y, w, h = ann["bbox"]
+        rows.setdefault(ann["image_id"], []).append(
+            _yolo_row(ann["category_id"], x, y, x + w, y + h, img["width"], img["height"]))
+    for image_id, image_rows in rows.items():
+        path = via_yolo.label_path_for(labels_dir, images[image_id]["file_name"])
+        text = via_yolo.format_labels(image_rows, precision)
+        via_yolo.atomic_write_text(path, text)
+        yield path, [], len(text)
+
+
+def import_voc_file(job):
+    path, labels_dir, name_to_id, precision = job
+    try:
+        root = ET.parse(path).getroot()
+    except (OSError, ET.ParseError) as e:
+        return path, [f"error: {e}"], 0
+    try:
+        # Some exporters write sizes as floats ("500.0").
+        width, height = (int(float(root.findtext(f"size/{tag}"))) for tag in ("width", "height"))
+    except (TypeError, ValueError):
+        return path, ["error: missing or invalid <size>"], 0
+    if width <= 0 or height <= 0:
+        return path, [f"error: image size {width}x{height}"], 0
+    rows, messages = [], []
+    for k, obj in enumerate(root.iter("object")):
+        name = obj.findtext("name", "").strip()
+        cid = name_to_id.get(name)
+        if cid is None and name.lstrip("-").isdigit():
+            cid = int(name)
+        if cid is None:
+            messages.append(f"unknown class '{name}' skipped")
+            continue
+        try:
+            x0, y0, x1, y1 = (float(obj.findtext(f"bndbox/{tag}")) - 1 for tag in ("xmin", "ymin", "xmax", "ymax"))
+        except (TypeError, ValueError):
+            messages.append(f"object {k} ('{name}'): missing or invalid <bndbox> skipped")
+            continue
+        rows.append(_yolo_row(cid, x0, y0, x1, y1, width, height))
+    if not rows:
+        return path, messages + ["no boxes"], 0
+    text = via_yolo.format_labels(rows, precision)
+    via_yolo.atomic_write_text(via_yolo.label_path_for(labels_dir, root.findtext("filename", path)), text)
+    return path, messages, len(text)
+
+
+def import_voc(src, labels_dir, name_to_id, precision=via_yolo.DEFAULT_PRECISION, workers=None, chunksize=64):
+    with os.scandir(src) as it:
+        paths = sorted(e.path for e in it if e.is_file() and e.name.endswith(".xml"))
+    jobs = ((path, labels_dir, name_to_id, precision) for path in paths)
+    yield from pool_map(import_voc_file, jobs, workers, chunksize)
+
+
+def extract_shard(job):
+    """
+    Unpacks label members of a shard into labels_dir and everything else
+    into images_dir. Every file is written next to its destination and
+    renamed into place, so an interrupted import leaves no truncated files.
+    """
+    shard_path, images_dir, labels_dir = job
+    nbytes = 0
+    with tarfile.open(shard_path, "r") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = os.path.basename(member.name)
+            with tar.extractfile(member) as src:
+                if name.endswith(via_yolo.LABEL_EXT):
+                    via_yolo.atomic_write_text(os.path.join(labels_dir, name), src.read().decode("utf-8"))
+                else:
+                    _extract_image(src, os.path.join(images_dir, name))
+            nbytes += member.size
+    return shard_path, [], nbytes
+
+
+def _extract_image(src, dest):
+    tmp_path = dest + ".tmp"
+    try:
+        with open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def import_shards(src, images_dir, labels_dir, workers=None):
+    if os.path.isdir(src):
+        with os.scandir(src) as it:
+            shards = sorted(e.path for e in it if e.name.endswith(".tar"))
+    else:
+        shards = [src]
+    jobs = ((path, images_dir, labels_dir) for path in shards)
+    yield from pool_map(extract_shard, jobs, workers, chunksize=1)
+
+
+def import_dataset(src, fmt, output_folder, class_names=None, precision=via_yolo.DEFAULT_PRECISION,
+                   workers=None, chunksize=64):
+    """
+    Imports src into output_folder/labels (and output_folder/images for shards).
+    """
+    images_dir = os.path.join(output_folder, "images")
+    labels_dir = os.path.join(output_folder, "labels")
+    os.makedirs(labels_dir, exist_ok=True)
+    if fmt == "coco":
+        return import_coco(src, labels_dir, precision)
+    if fmt == "voc":
+        name_to_id = {name: cid for cid, name in (class_names or {}).items()}
+        return import_voc(src, labels_dir, name_to_id, precision, workers, chunksize)
+    if fmt == "shards":
+        os.makedirs(images_dir, exist_ok=True)
+        return import_shards(src, images_dir, labels_dir, workers)
+    raise ValueError(f"Unknown import format '{fmt}'")
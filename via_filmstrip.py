@@ -0,0 +1,199 @@
+"""
+Filmstrip panel: a virtualized grid of thumbnails over image_list.
+
+The view asks the model only for the cells it paints, so a folder of 100k
+images costs no more than the visible rows. Missing thumbnails are requested
+from a ThumbnailCache and the cell is repainted when they arrive. Each cell
+shows the image's boxes and a mark when it is labeled.
+"""
+import os
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QPoint, QRect, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QPalette, QPen
+from PyQt5.QtWidgets import QAbstractItemView, QListView, QStyle, QStyledItemDelegate
+
+
+CELL_PADDING = 4
+CAPTION_HEIGHT = 16
+LABELED_COLOR = QColor(80, 200, 120)
+PLACEHOLDER_COLOR = QColor(60, 60, 60)
+
+
+class FilmstripModel(QAbstractListModel):
+    """
+    Rows are image paths. is_labeled(stem), label_rows(path) and
+    image_stem(path) come from the window; label rows are remembered until
+    invalidate_labels().
+    """
+
+    # Emitted from a thumbnail worker; delivered on the GUI thread.
+    thumb_ready = pyqtSignal(str)
+
+    def __init__(self, thumbs, is_labeled, label_rows, image_stem, parent=None):
+        super().__init__(parent)
+        self.thumbs = thumbs
+        self.is_labeled = is_labeled
+        self.label_rows = label_rows
+        self.image_stem = image_stem
+        self.paths = []
+        self._rows_of_path = None
+        self._label_memo = {}
+        self.thumb_ready.connect(self.on_thumb_ready)
+
+    def set_paths(self, paths):
+        self.beginResetModel()
+        self.paths = list(paths)
+        self._rows_of_path = None
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self.paths[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ToolTipRole:
+            return path
+        return None
+
+    def thumbnail(self, row):
+        path = self.paths[row]
+        image = self.thumbs.get(path)
+        if image is None:
+            self.thumbs.request(path, self.thumb_ready.emit)
+        return image
+
+    def stem(self, row):
+        return self.image_stem(self.paths[row])
+
+    def boxes(self, row):
+        path = self.paths[row]
+        if path not in self._label_memo:
+            self._label_memo[path] = self.label_rows(path)
+        return self._label_memo[path]
+
+    def row_of(self, path):
+        if self._rows_of_path is None:
+            self._rows_of_path = {p: i for i, p in enumerate(self.paths)}
+        return self._rows_of_path.get(path, -1)
+
+    def on_thumb_ready(self, path):
+        row = self.row_of(path)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def invalidate_labels(self, stem=None):
+        """
+        Forgets remembered boxes of stem (all images when None) and repaints them.
+        """
+        if stem is None:
+            self._label_memo.clear()
+            if self.paths:
+                self.dataChanged.emit(self.index(0), self.index(len(self.paths) - 1))
+            return
+        for path in [p for p in self._label_memo if self.image_stem(p) == stem]:
+            del self._label_memo[path]
+            index = self.index(self.row_of(path))
+            self.dataChanged.emit(index, index)
+
+
+class FilmstripDelegate(QStyledItemDelegate):
+    """
+    Paints a thumbnail cell: the image, its boxes in class colors, a labeled
+    mark and the file name. color_for(class_id) returns a QColor.
+    """
+
+    def __init__(self, color_for, thumb_size, parent=None):
+        super().__init__(parent)
+        self.color_for = color_for
+        self.thumb_size = thumb_size
+
+    def sizeHint(self, option, index):
+        return QSize(self.thumb_size + 2 * CELL_PADDING, self.thumb_size + CAPTION_HEIGHT + 2 * CELL_PADDING)
+
+    def paint(self, painter, option, index):
+        model = index.model()
+        row = index.row()
+        cell = option.rect
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(cell, option.palette.highlight())
+        square = QRect(cell.x() + CELL_PADDING, cell.y() + CELL_PADDING, self.thumb_size, self.thumb_size)
+        image = model.thumbnail(row)
+        if image is None or image.isNull():
+            painter.fillRect(square, PLACEHOLDER_COLOR)
+        else:
+            size = image.size().scaled(square.size(), Qt.KeepAspectRatio)
+            target = QRect(0, 0, size.width(), size.height())
+            target.moveCenter(square.center())
+            painter.drawImage(target, image)
+            rows = model.boxes(row)
+            if rows is not None and len(rows):
+                painter.setBrush(Qt.NoBrush)
+                for class_id, xc, yc, w, h in rows.tolist():
+                    painter.setPen(QPen(self.color_for(int(class_id)), 1))
+                    painter.drawRect(int(target.x() + (xc - w / 2) * target.width()),
+                                     int(target.y() + (yc - h / 2) * target.height()),
+                                     max(1, int(w * target.width())), max(1, int(h * target.height())))
+        if model.is_labeled(model.stem(row)):
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(LABELED_COLOR)
+            painter.drawEllipse(square.right() - 12, square.y() + 4, 8, 8)
+        selected = option.state & QStyle.State_Selected
+        painter.setPen(option.palette.color(QPalette.HighlightedText if selected else QPalette.Text))
+        caption = QRect(cell.x() + CELL_PADDING, square.bottom() + 1, self.thumb_size, CAPTION_HEIGHT)
+        name = option.fontMetrics.elidedText(index.data(Qt.DisplayRole), Qt.ElideMiddle, caption.width())
+        painter.drawText(caption, Qt.AlignCenter, name)
+        painter.restore()
+
+
+class FilmstripView(QListView):
+    """
+    Wrapping grid of uniform cells. Emits image_chosen(row) on click.
+    """
+
+    image_chosen = pyqtSignal(int)
+
+    def __init__(self, model, delegate, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(delegate)
+        # List mode with wrapping lays out uniform cells arithmetically; icon
+        # mode would keep a position per item.
+        self.setViewMode(QListView.ListMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.Adjust)
+        self.setUniformItemSizes(True)
+        # Lay out huge folders a batch at a time between events.
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(2000)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        # Keys stay with the annotator (Space, A, P...).
+        self.setFocusPolicy(Qt.NoFocus)
+        self.clicked.connect(lambda index: self.image_chosen.emit(index.row()))
+        self.verticalScrollBar().valueChanged.connect(self.drop_offscreen_requests)
+
+    def visible_paths(self):
+        model = self.model()
+        first = self.indexAt(self.viewport().rect().topLeft() + QPoint(CELL_PADDING, CELL_PADDING))
+        if not first.isValid():
+            return set()
+        cell = self.sizeHintForIndex(first)
+        area = self.viewport().rect()
+        columns = max(1, area.width() // max(1, cell.width()))
+        rows = area.height() // max(1, cell.height()) + 2
+        return set(model.paths[first.row():first.row() + columns * rows])
+
+    def drop_offscreen_requests(self):
+        self.model().thumbs.retain(self.visible_paths())
+
+    def show_row(self, row):
+        if 0 <= row < self.model().rowCount():
+            index = self.model().index(row)
+            self.setCurrentIndex(index)
+            self.scrollTo(index)
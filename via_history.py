@@ -0,0 +1,268 @@
+"""
+Undo/redo for box edits and an append-only journal for crash recovery.
+
+Edits are small diffs on a BoxStore rather than snapshots:
+
+    {"op": "add",     "row": r, "box": [box_id, x, y, w, h, class_id]}
+    {"op": "delete",  "row": r, "box": [box_id, x, y, w, h, class_id]}
+    {"op": "clear",   "boxes": [[row, box_id, x, y, w, h, class_id], ...]}
+    {"op": "restore", "boxes": [[row, box_id, x, y, w, h, class_id], ...]}
+    {"op": "add_many",    "boxes": [[row, box_id, x, y, w, h, class_id], ...]}
+    {"op": "delete_many", "boxes": [[row, box_id, x, y, w, h, class_id], ...]}
+
+The same dicts are written to the journal, one JSON line per edit, together
+with "commit" (saved) and "discard" (left without saving) markers. Each edit
+also records the mtime of the label file it was made against ("base"), so
+recovery only replays edits onto the label state they started from.
+"""
+import json
+import os
+import threading
+import time
+
+JOURNAL_NAME = ".via_journal.jsonl"
+OWNER_JOURNAL_PREFIX = ".via_journal-"
+
+
+def add_op(store, x, y, w, h, class_id):
+    """
+    Builds the op for appending a new box to store.
+    """
+    return {"op": "add", "row": len(store), "box": [store.peek_next_id(), x, y, w, h, class_id]}
+
+
+def delete_op(store, row):
+    x, y, w, h = store.coords[row].tolist()
+    return {"op": "delete", "row": row,
+            "box": [int(store.ids[row]), x, y, w, h, int(store.class_ids[row])]}
+
+
+def add_many_op(store, boxes):
+    """
+    Builds one op appending several (x, y, w, h, class_id) boxes, e.g.
+    accepted proposals, so they are undone together.
+    """
+    row, box_id = len(store), store.peek_next_id()
+    return {"op": "add_many", "boxes": [
+        [row + i, box_id + i, x, y, w, h, cid] for i, (x, y, w, h, cid) in enumerate(boxes)
+    ]}
+
+
+def clear_op(store):
+    boxes = [
+        [row, box_id, x, y, w, h, cid]
+        for row, (box_id, (x, y, w, h), cid) in enumerate(
+            zip(store.ids.tolist(), store.coords.tolist(), store.class_ids.tolist()))
+    ]
+    return {"op": "clear", "boxes": boxes}
+
+
+def inverse(op):
+    kind = op["op"]
+    if kind == "add":
+        return {"op": "delete", "row": op["row"], "box": op["box"]}
+    if kind == "delete":
+        return {"op": "add", "row": op["row"], "box": op["box"]}
+    if kind == "clear":
+        return {"op": "restore", "boxes": op["boxes"]}
+    if kind == "add_many":
+        return {"op": "delete_many", "boxes": op["boxes"]}
+    if kind == "delete_many":
+        return {"op": "add_many", "boxes": op["boxes"]}
+    return {"op": "clear", "boxes": op["boxes"]}
+
+
+def apply_op(store, op):
+    kind = op["op"]
+    if kind == "add":
+        box_id, x, y, w, h, cid = op["box"]
+        store.insert(op["row"], x, y, w, h, cid, box_id=box_id)
+    elif kind == "delete":
+        store.pop(op["row"])
+    elif kind == "clear":
+        store.clear()
+    elif kind in ("restore", "add_many"):
+        for row, box_id, x, y, w, h, cid in op["boxes"]:
+            store.insert(row, x, y, w, h, cid, box_id=box_id)
+    elif kind == "delete_many":
+        for box in reversed(op["boxes"]):
+            store.pop(box[0])
+    else:
+        raise ValueError(f"Unknown edit op '{kind}'")
+
+
+class EditHistory:
+    """
+    Undo and redo stacks of the ops applied to the current image.
+    """
+
+    def __init__(self, limit=1000):
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def reset(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def record(self, op):
+        self.undo_stack.append(op)
+        if len(self.undo_stack) > self.limit:
+            del self.undo_stack[0]
+        self.redo_stack.clear()
+
+    def undo(self, store):
+        """
+        Reverts the last op and returns the op that was applied, or None.
+        """
+        if not self.undo_stack:
+            return None
+        op = self.undo_stack.pop()
+        reverse = inverse(op)
+        apply_op(store, reverse)
+        self.redo_stack.append(op)
+        return reverse
+
+    def redo(self, store):
+        if not self.redo_stack:
+            return None
+        op = self.redo_stack.pop()
+        apply_op(store, op)
+        self.undo_stack.append(op)
+        return op
+
+
+class Journal:
+    """
+    Append-only JSON-lines log of edits in the output folder.
+    Each write is one line and a flush, so the cost per edit is constant.
+
+    When several annotators share the output folder (work-queue mode), each
+    passes its owner id and writes .via_journal-<owner>.jsonl, since opening
+    and closing a journal rewrites it. Journals of other owners that were not
+    written or touched for orphan_age seconds belong to crashed instances;
+    they are taken over (renamed, so only one instance gets them) and their
+    unsaved edits recovered here.
+    """
+
+    def __init__(self, output_folder, owner=None, orphan_age=None):
+        name = JOURNAL_NAME if owner is None else f"{OWNER_JOURNAL_PREFIX}{owner}.jsonl"
+        self.path = os.path.join(output_folder, name)
+        self.owned = owner is not None
+        self._lock = threading.Lock()
+        self.pending = self._load_pending(self.path)
+        adopted = self._adopt_orphans(output_folder, orphan_age) if self.owned and orphan_age else []
+        self._compact()
+        for path in adopted:
+            os.remove(path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _adopt_orphans(self, output_folder, orphan_age):
+        """
+        Merges the pending edits of abandoned owner journals into self.pending
+        and returns their (renamed) paths.
+        """
+        adopted = []
+        now = time.time()
+        for name in os.listdir(output_folder):
+            path = os.path.join(output_folder, name)
+            if not name.startswith(OWNER_JOURNAL_PREFIX) or not name.endswith(".jsonl") or path == self.path:
+                continue
+            try:
+                if os.stat(path).st_mtime + orphan_age > now:
+                    continue
+                # The new name still looks like an owner journal, so it is
+                # adopted again should this instance crash before compacting.
+                claimed = f"{self.path}.{name}"
+                os.rename(path, claimed)
+            except OSError:
+                # Gone, or taken over by someone else first.
+                continue
+            for image, (base, ops) in self._load_pending(claimed).items():
+                if image not in self.pending:
+                    self.pending[image] = (base, ops)
+            adopted.append(claimed)
+        return adopted
+
+    @staticmethod
+    def _load_pending(path):
+        """
+        Returns {image: (base, [ops])} for edits after the last commit or discard.
+        """
+        pending = {}
+        if not os.path.exists(path):
+            return pending
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash is ignored.
+                    continue
+                image = entry.get("image")
+                if entry.get("op") in ("commit", "discard"):
+                    pending.pop(image, None)
+                else:
+                    base, ops = pending.setdefault(image, (entry.get("base"), []))
+                    ops.append(entry["edit"])
+        return pending
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for image, (base, ops) in self.pending.items():
+                for op in ops:
+                    f.write(json.dumps({"image": image, "op": "edit", "edit": op, "base": base}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _write(self, entry):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def append(self, image, op, base):
+        self._write({"image": image, "op": "edit", "edit": op, "base": base})
+
+    def commit(self, image):
+        self._write({"image": image, "op": "commit"})
+
+    def discard(self, image):
+        self._write({"image": image, "op": "discard"})
+
+    def touch(self):
+        """
+        Marks an owner journal as alive while no edits are written.
+        """
+        with self._lock:
+            if self._file is not None:
+                os.utime(self.path)
+
+    def take_pending(self, image, base):
+        """
+        Returns and forgets the unsaved ops recovered for image. Nothing is
+        returned if the label file changed since the edits were made.
+        """
+        if image not in self.pending:
+            return []
+        recorded_base, ops = self.pending.pop(image)
+        if recorded_base != base:
+            self.discard(image)
+            return []
+        return ops
+
+    def close(self, clean=True):
+        """
+        Closes the journal; a clean close leaves an empty file behind, or
+        none for an owner journal.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            if clean and self.owned:
+                os.remove(self.path)
+            elif clean:
+                open(self.path, "w").close()
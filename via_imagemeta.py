@@ -0,0 +1,178 @@
+"""
+Reads image dimensions and EXIF orientation from file headers without
+decoding pixels. Supports JPEG, PNG, GIF, BMP, WebP and TIFF.
+"""
+import os
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+
+# orientation follows EXIF (1 = upright, 5-8 = rotated by 90 degrees).
+ImageInfo = namedtuple("ImageInfo", "width height orientation format")
+
+HEADER_BYTES = 64 * 1024
+
+
+def _tiff_orientation_and_size(data, offset=0):
+    """
+    Parses a TIFF structure (also used inside EXIF) starting at offset.
+    Returns (width, height, orientation); missing values are None.
+    """
+    order = data[offset:offset + 2]
+    if order == b"II":
+        endian = "<"
+    elif order == b"MM":
+        endian = ">"
+    else:
+        return None, None, None
+    ifd = struct.unpack_from(endian + "I", data, offset + 4)[0]
+    start = offset + ifd
+    if start + 2 > len(data):
+        return None, None, None
+    count = struct.unpack_from(endian + "H", data, start)[0]
+    width = height = orientation = None
+    for i in range(count):
+        entry = start + 2 + i * 12
+        if entry + 12 > len(data):
+            break
+        tag, typ = struct.unpack_from(endian + "HH", data, entry)
+        if typ == 3:
+            value = struct.unpack_from(endian + "H", data, entry + 8)[0]
+        elif typ == 4:
+            value = struct.unpack_from(endian + "I", data, entry + 8)[0]
+        else:
+            continue
+        if tag == 256:
+            width = value
+        elif tag == 257:
+            height = value
+        elif tag == 274:
+            orientation = value
+    return width, height, orientation
+
+
+def _probe_jpeg(f, data):
+    orientation = 1
+    pos = 2
+    while True:
+        if pos + 4 > len(data):
+            # Large APPn segments can push SOF past the first read.
+            f.seek(0)
+            data = f.read(len(data) * 4)
+            if pos + 4 > len(data):
+                return None
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        length = struct.unpack_from(">H", data, pos + 2)[0]
+        if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+            if pos + 2 + length > len(data):
+                f.seek(0)
+                data = f.read(pos + 2 + length)
+            _, _, value = _tiff_orientation_and_size(data[:pos + 2 + length], pos + 10)
+            if value:
+                orientation = value
+        elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if pos + 9 > len(data):
+                f.seek(0)
+                data = f.read(pos + 9)
+            height, width = struct.unpack_from(">HH", data, pos + 5)
+            return ImageInfo(width, height, orientation, "jpeg")
+        pos += 2 + length
+
+
+def _probe_header(f):
+    data = f.read(HEADER_BYTES)
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack_from(">II", data, 16)
+        return ImageInfo(width, height, 1, "png")
+    if data[:2] == b"\xff\xd8":
+        return _probe_jpeg(f, data)
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack_from("<HH", data, 6)
+        return ImageInfo(width, height, 1, "gif")
+    if data[:2] == b"BM" and len(data) >= 26:
+        width, height = struct.unpack_from("<ii", data, 18)
+        return ImageInfo(width, abs(height), 1, "bmp")
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack_from("<HH", data, 26)
+            return ImageInfo(width & 0x3FFF, height & 0x3FFF, 1, "webp")
+        if chunk == b"VP8L":
+            bits = struct.unpack_from("<I", data, 21)[0]
+            return ImageInfo((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 1, "webp")
+        if chunk == b"VP8X":
+            width = int.from_bytes(data[24:27], "little") + 1
+            height = int.from_bytes(data[27:30], "little") + 1
+            return ImageInfo(width, height, 1, "webp")
+        return None
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        width, height, orientation = _tiff_orientation_and_size(data)
+        if width and height:
+            return ImageInfo(width, height, orientation or 1, "tiff")
+    return None
+
+
+def read_image_info(path):
+    """
+    Returns the ImageInfo of path, or None if the format is not recognized.
+    """
+    try:
+        with open(path, "rb") as f:
+            return _probe_header(f)
+    except (OSError, struct.error, IndexError) as e:
+        print(f"Could not read image header of {path}: {e}")
+        return None
+
+
+class ImageInfoCache:
+    """
+    Per-path cache of ImageInfo, revalidated against file mtime and size.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                return entry[1]
+        info = read_image_info(path)
+        with self._lock:
+            self._entries[path] = (stamp, info)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+
+_default_cache = ImageInfoCache()
+
+
+def probe_image(path):
+    """
+    Cached header probe of path; returns ImageInfo or None.
+    """
+    return _default_cache.get(path)
+
+
+def image_size(path):
+    """
+    Returns (width, height) of the stored pixels, or None if unknown.
+    """
+    info = probe_image(path)
+    if info is None:
+        return None
+    return info.width, info.height
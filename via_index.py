@@ -0,0 +1,131 @@
+"""
+Persistent per-image annotation status stored as SQLite in the output folder.
+Rows are keyed by label stem (the output file name of the image without
+extension, see via_sources.source_name), the same key save_annotation uses
+for label files. Labels in subfolders of labels/ (dataset splits) are keyed
+by their path below it, see via_yolo.label_key.
+"""
+import multiprocessing
+import os
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import via_yolo
+from via_sources import source_name
+
+INDEX_NAME = ".via_index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS labels (
+    stem TEXT PRIMARY KEY,
+    box_count INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS class_counts (
+    stem TEXT NOT NULL,
+    class_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (stem, class_id)
+);
+CREATE INDEX IF NOT EXISTS class_counts_by_class ON class_counts (class_id);
+"""
+
+
+def stem_of(path, root=None):
+    return os.path.splitext(source_name(path, root))[0]
+
+
+def scan_label_file(path, labels_dir):
+    """
+    Returns (key, mtime_ns, {class_id: count}) for a label file in labels_dir.
+    """
+    st = os.stat(path)
+    counts = Counter(row[0] for row in via_yolo.read_labels(path))
+    return via_yolo.label_key(path, labels_dir), st.st_mtime_ns, dict(counts)
+
+
+class AnnotationIndex:
+    """
+    Label status, box counts and class histograms per image.
+    One connection is shared between threads behind a lock.
+
+    WAL mode needs shared memory between the processes using the database,
+    which network file systems do not provide; shared=True (several
+    annotators on one output folder) uses a rollback journal instead.
+    """
+
+    def __init__(self, output_folder, shared=False):
+        self.path = os.path.join(output_folder, INDEX_NAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        try:
+            self._conn.execute("PRAGMA journal_mode=DELETE" if shared else "PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError as e:
+            # Another instance still has the database open in the other mode.
+            print(f"Could not set the index journal mode: {e}")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, cur, stem, mtime_ns, counts):
+        cur.execute("DELETE FROM class_counts WHERE stem = ?", (stem,))
+        if not counts:
+            cur.execute("DELETE FROM labels WHERE stem = ?", (stem,))
+            return
+        cur.execute("INSERT OR REPLACE INTO labels VALUES (?, ?, ?)",
+                    (stem, sum(counts.values()), mtime_ns))
+        cur.executemany("INSERT INTO class_counts VALUES (?, ?, ?)",
+                        [(stem, cid, n) for cid, n in counts.items()])
+
+    def record(self, stem, class_ids, mtime_ns):
+        """
+        Stores the classes of one saved label; an empty class_ids removes it.
+        """
+        counts = Counter(class_ids)
+        with self._lock, self._conn:
+            self._write(self._conn.cursor(), stem, mtime_ns, counts)
+
+    def remove(self, stem):
+        self.record(stem, (), 0)
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM labels LIMIT 1").fetchone() is None
+
+    def labeled_stems(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT stem FROM labels")}
+
+    def stems_with_class(self, class_id):
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                "SELECT stem FROM class_counts WHERE class_id = ?", (class_id,))}
+
+    def class_totals(self):
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT class_id, SUM(count) FROM class_counts GROUP BY class_id"))
+
+    def rebuild(self, labels_dir, workers=None, chunksize=256):
+        """
+        Re-reads every label file in labels_dir and its subfolders on a
+        process pool and replaces the index contents. Returns the number of
+        labeled images.
+        """
+        paths = list(via_yolo.iter_label_files(labels_dir, recursive=True))
+        # Spawned, not forked: the GUI calls this from a Qt thread.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(scan_label_file, paths, repeat(labels_dir), chunksize=chunksize))
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            cur.execute("DELETE FROM labels")
+            cur.execute("DELETE FROM class_counts")
+            for stem, mtime_ns, counts in results:
+                self._write(cur, stem, mtime_ns, counts)
+        return sum(1 for _, _, counts in results if counts)
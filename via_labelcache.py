@@ -0,0 +1,181 @@
+"""
+Binary cache of parsed YOLO labels for a labels folder.
+
+All rows are kept in one (n, 5) float64 array next to a structured index
+with the key, row offset, row count, mtime and size of every label file.
+Files in subfolders are included; their key is the stem with the folder
+("train/x", see via_yolo.label_key).
+Both are .npy files that are memory-mapped on open, so reading the boxes of
+an image is a slice with no text parsing. Files whose mtime or size changed
+since the cache was built are treated as missing, and build() only re-parses
+those. Rows are float64 like via_yolo's parsers, so a label reads the same
+from the cache as from its text.
+
+The arrays are written under a new generation number and published by
+atomically replacing the CURRENT file, so readers never see a mixed cache.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import via_yolo
+
+CACHE_DIR = ".via_labelcache"
+CURRENT_NAME = "CURRENT"
+
+
+def read_rows(path):
+    return via_yolo.read_label_array(path)
+
+
+def _index_dtype(stem_len):
+    return np.dtype([("stem", f"<U{max(1, stem_len)}"), ("offset", "<i8"), ("count", "<i4"),
+                     ("mtime_ns", "<i8"), ("size", "<i8")])
+
+
+class LabelCache:
+    """
+    Memory-mapped parsed labels of labels_dir, stored in labels_dir/.via_labelcache.
+    """
+
+    def __init__(self, labels_dir):
+        self.labels_dir = labels_dir
+        self.cache_dir = os.path.join(labels_dir, CACHE_DIR)
+        self._build_lock = threading.Lock()
+        # (stem -> position, index array, rows array); swapped as a whole.
+        self._state = ({}, None, None)
+        self.load()
+
+    def _paths(self, generation):
+        return (os.path.join(self.cache_dir, f"{generation}.index.npy"),
+                os.path.join(self.cache_dir, f"{generation}.rows.npy"))
+
+    def _current_generation(self):
+        try:
+            with open(os.path.join(self.cache_dir, CURRENT_NAME), "r") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def load(self):
+        """
+        Maps the current cache generation, if there is one.
+        """
+        generation = self._current_generation()
+        if generation is None:
+            return
+        index_path, rows_path = self._paths(generation)
+        try:
+            index = np.load(index_path, mmap_mode="r")
+            rows = np.load(rows_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable label cache: {e}")
+            return
+        if rows.dtype != np.float64:
+            # Written by an older version with float32 rows; rebuilt in full.
+            return
+        positions = {stem: i for i, stem in enumerate(index["stem"].tolist())}
+        self._state = (positions, index, rows)
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def arrays(self):
+        """
+        The current (index, rows) arrays, or (None, None) without a cache.
+        """
+        _, index, rows = self._state
+        return index, rows
+
+    def get(self, stem, path=None):
+        """
+        Returns the cached (n, 5) float64 rows of stem, or None when it is
+        not cached or the label file at path changed since it was cached.
+        """
+        positions, index, rows = self._state
+        i = positions.get(stem)
+        if i is None:
+            return None
+        entry = index[i]
+        if path is not None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            if st.st_mtime_ns != entry["mtime_ns"] or st.st_size != entry["size"]:
+                return None
+        offset = int(entry["offset"])
+        return rows[offset:offset + int(entry["count"])]
+
+    def build(self, workers=None, chunksize=256):
+        """
+        Brings the cache up to date with labels_dir, parsing new and changed
+        files on a process pool. Returns (files, parsed).
+        """
+        with self._build_lock:
+            return self._build(workers, chunksize)
+
+    def _build(self, workers, chunksize):
+        entries = []
+        for path in via_yolo.iter_label_files(self.labels_dir, recursive=True):
+            st = os.stat(path)
+            entries.append((via_yolo.label_key(path, self.labels_dir), path, st.st_mtime_ns, st.st_size))
+
+        # Reuse cached rows of unchanged files; parse the rest in parallel.
+        pieces = {}
+        stale = []
+        positions, old_index, old_rows = self._state
+        for stem, path, mtime_ns, size in entries:
+            i = positions.get(stem)
+            if i is not None and old_index[i]["mtime_ns"] == mtime_ns and old_index[i]["size"] == size:
+                offset = int(old_index[i]["offset"])
+                pieces[stem] = old_rows[offset:offset + int(old_index[i]["count"])]
+            else:
+                stale.append((stem, path))
+        if stale:
+            paths = [path for _, path in stale]
+            # Small updates (e.g. after a few saves) are not worth starting a pool.
+            if workers == 1 or len(stale) < chunksize:
+                parsed = list(map(read_rows, paths))
+            else:
+                # Spawned, not forked: the GUI builds the cache from a Qt thread.
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    parsed = list(pool.map(read_rows, paths, chunksize=chunksize))
+            for (stem, _), rows in zip(stale, parsed):
+                pieces[stem] = rows
+        if not stale and len(entries) == len(positions):
+            return len(entries), 0
+
+        index = np.zeros(len(entries), dtype=_index_dtype(max((len(e[0]) for e in entries), default=1)))
+        offset = 0
+        for i, (stem, _, mtime_ns, size) in enumerate(entries):
+            count = len(pieces[stem])
+            index[i] = (stem, offset, count, mtime_ns, size)
+            offset += count
+        rows = np.zeros((offset, 5), dtype=np.float64)
+        for i, (stem, _, _, _) in enumerate(entries):
+            rows[index[i]["offset"]:index[i]["offset"] + index[i]["count"]] = pieces[stem]
+        self._publish(index, rows)
+        return len(entries), len(stale)
+
+    def _publish(self, index, rows):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        old_generation = self._current_generation()
+        generation = (old_generation or 0) + 1
+        index_path, rows_path = self._paths(generation)
+        np.save(rows_path, rows)
+        np.save(index_path, index)
+        via_yolo.atomic_write_text(os.path.join(self.cache_dir, CURRENT_NAME), f"{generation}\n")
+        self.load()
+        # Mapped old generations stay readable on POSIX; elsewhere they are
+        # removed on a later build.
+        keep = {os.path.basename(p) for p in self._paths(generation)} | {CURRENT_NAME}
+        for name in os.listdir(self.cache_dir):
+            if name not in keep:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
@@ -0,0 +1,187 @@
+"""
+Work-queue batches shared by several annotators through the output folder.
+
+image_list is cut into fixed-size batches numbered from 0; instances that
+scan the same folder see the same batches. A batch is claimed by creating
+output/.via_leases/batch-<n>.lease with O_CREAT | O_EXCL, which succeeds for
+exactly one instance, even on a shared network folder. The lease records its
+owner, and it expires ttl seconds after its mtime, which the owner keeps
+moving forward with heartbeats. A heartbeat never rewrites the lease: it
+touches the file it has just read its own name from, so it cannot overwrite
+a lease reclaimed by someone else in the meantime. An expired lease (its
+owner crashed or lost the folder) may be reclaimed by anyone: it is first
+renamed to a unique name, which again only one instance can do, and then
+claimed afresh. Finished batches get a batch-<n>.done marker and are never
+handed out again.
+
+Expiry compares file times with the local clock, so the clocks of the
+machines involved should agree to well within the lease duration.
+"""
+import json
+import os
+import socket
+import time
+import uuid
+
+import via_yolo
+
+LEASE_DIR = ".via_leases"
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_TTL = 300.0
+
+
+def batch_count(total, batch_size):
+    return -(-total // batch_size)
+
+
+class BatchLeases:
+    """
+    Claims, renews and releases batch leases in output_folder for one owner.
+    """
+
+    def __init__(self, output_folder, batch_size=DEFAULT_BATCH_SIZE, ttl=DEFAULT_TTL, owner=None):
+        self.lease_dir = os.path.join(output_folder, LEASE_DIR)
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        # batch -> (first stem, last stem) of the batches this owner holds.
+        self.held = {}
+        os.makedirs(self.lease_dir, exist_ok=True)
+
+    def _lease_path(self, batch):
+        return os.path.join(self.lease_dir, f"batch-{batch:06d}.lease")
+
+    def _done_path(self, batch):
+        return os.path.join(self.lease_dir, f"batch-{batch:06d}.done")
+
+    def _record(self, batch, first, last):
+        return json.dumps({"batch": batch, "owner": self.owner, "first": first, "last": last}) + "\n"
+
+    def read(self, batch):
+        """
+        The lease record of batch, or None when there is no readable lease.
+        """
+        try:
+            with open(self._lease_path(batch), "r", encoding="utf-8") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def is_done(self, batch):
+        return os.path.exists(self._done_path(batch))
+
+    def _create(self, batch, first, last):
+        try:
+            fd = os.open(self._lease_path(batch), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self._record(batch, first, last))
+        self.held[batch] = (first, last)
+        return True
+
+    def _expired(self, path):
+        try:
+            return os.stat(path).st_mtime + self.ttl <= time.time()
+        except OSError:
+            return True
+
+    def _reclaim_stale(self, batch):
+        """
+        Moves an expired lease of batch out of the way. Returns True if the
+        lease file is gone afterwards.
+        """
+        path = self._lease_path(batch)
+        if not self._expired(path):
+            return False
+        stale = f"{path}.{self.owner}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            # Someone else reclaimed or released it first.
+            return True
+        except OSError:
+            return False
+        # The owner may have renewed it between our check and the rename.
+        if not self._expired(stale):
+            try:
+                os.link(stale, path)
+            except OSError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        print(f"Reclaimed stale lease of batch {batch}")
+        return True
+
+    def claim(self, batch, first="", last=""):
+        """
+        Tries to lease batch; first and last name its images for people
+        reading the lease folder. Returns True when this owner holds it.
+        """
+        if batch in self.held:
+            return True
+        if self.is_done(batch):
+            return False
+        if self._create(batch, first, last):
+            return True
+        return self._reclaim_stale(batch) and self._create(batch, first, last)
+
+    def claim_next(self, count, describe=None, start=0):
+        """
+        Leases the first free batch at or after start, wrapping around.
+        describe(batch) returns its (first, last) names. Returns the batch
+        number or None when every batch is taken or done.
+        """
+        for step in range(count):
+            batch = (start + step) % count
+            first, last = describe(batch) if describe else ("", "")
+            if self.claim(batch, first, last):
+                return batch
+        return None
+
+    def heartbeat(self):
+        """
+        Renews the held leases. Returns the batches that were lost to
+        someone else (e.g. after this instance stalled past the expiry).
+        """
+        lost = []
+        for batch in list(self.held):
+            path = self._lease_path(batch)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    owner = json.loads(f.read()).get("owner")
+                    if owner == self.owner:
+                        # Touches the file just read, even if it was renamed
+                        # away since. Windows cannot rename an open file, so
+                        # there the path still names it.
+                        try:
+                            os.utime(f.fileno() if os.utime in os.supports_fd else path)
+                        except OSError as e:
+                            print(f"Could not renew lease of batch {batch}: {e}")
+            except (OSError, ValueError):
+                owner = None
+            if owner != self.owner:
+                del self.held[batch]
+                lost.append(batch)
+        return lost
+
+    def release(self, batch, done=False):
+        """
+        Gives up batch; with done=True it is marked finished first.
+        """
+        if batch not in self.held:
+            return
+        del self.held[batch]
+        if done:
+            via_yolo.atomic_write_text(self._done_path(batch), self.owner + "\n")
+        record = self.read(batch)
+        if record is not None and record.get("owner") == self.owner:
+            try:
+                os.remove(self._lease_path(batch))
+            except OSError:
+                pass
+
+    def release_all(self):
+        for batch in list(self.held):
+            self.release(batch)
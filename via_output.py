@@ -0,0 +1,204 @@
+"""
+Strategies for placing annotated images in the output images/ folder.
+
+    auto      hardlink, then reflink, then copy
+    hardlink  hard link (same filesystem only), else copy
+    reflink   copy-on-write clone (Linux btrfs/XFS), else copy
+    symlink   symbolic link to the source image
+    copy      plain copy
+    manifest  no image files; source paths are listed in images.txt
+              (as "<output name>\t<source>" when the name is not the
+              source's own, e.g. for images in subfolders)
+
+Images whose output entry already matches the source are skipped. Archive
+members and video frames (see via_sources) have no file to link to and are
+written out ("extract") in every mode but manifest.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from via_sources import read_bytes, source_name, source_stamp, split_source
+
+OUTPUT_MODES = ("auto", "hardlink", "reflink", "symlink", "copy", "manifest")
+MANIFEST_NAME = "images.txt"
+
+# ioctl request code for FICLONE on Linux.
+FICLONE = 0x40049409
+
+
+def manifest_line(name, src):
+    return (src if name == source_name(src) else f"{name}\t{src}") + "\n"
+
+
+def read_manifest(path):
+    """
+    Returns {output name: source id} of a manifest file.
+    """
+    entries = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            name, tab, src = line.rstrip("\n").partition("\t")
+            if not tab:
+                name, src = source_name(name), name
+            if src:
+                entries[name] = src
+    return entries
+
+
+def _temp_path(dst):
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(dst) or ".")
+    os.close(fd)
+    os.remove(tmp_path)
+    return tmp_path
+
+
+def _replace_with(dst, create):
+    """
+    Runs create(tmp_path) and atomically renames the result onto dst.
+    """
+    tmp_path = _temp_path(dst)
+    try:
+        create(tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _reflink(src, dst):
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflink is only supported on Linux")
+    import fcntl
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def is_up_to_date(src, dst):
+    """
+    True if dst already provides the content of src.
+    """
+    if os.path.islink(dst):
+        return os.path.realpath(dst) == os.path.realpath(src)
+    try:
+        s_src, s_dst = os.stat(src), os.stat(dst)
+    except OSError:
+        return False
+    if (s_src.st_dev, s_src.st_ino) == (s_dst.st_dev, s_dst.st_ino):
+        return True
+    return s_src.st_size == s_dst.st_size and s_src.st_mtime_ns == s_dst.st_mtime_ns
+
+
+class ImageOutput:
+    """
+    Places source images into images_dir according to mode.
+    Safe to use from the save worker and the GUI thread at the same time.
+    """
+
+    def __init__(self, images_dir, mode="auto"):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode '{mode}'")
+        self.images_dir = images_dir
+        self.mode = mode
+        self.manifest_path = os.path.join(os.path.dirname(images_dir), MANIFEST_NAME)
+        self._manifest = None
+        self._lock = threading.Lock()
+
+    def path_for(self, name):
+        return os.path.join(self.images_dir, name)
+
+    def _load_manifest(self):
+        if self._manifest is None:
+            self._manifest = {}
+            if os.path.exists(self.manifest_path):
+                self._manifest = read_manifest(self.manifest_path)
+        return self._manifest
+
+    def contains(self, name):
+        if self.mode == "manifest":
+            with self._lock:
+                return name in self._load_manifest()
+        return os.path.lexists(self.path_for(name))
+
+    def place(self, src, name=None):
+        """
+        Places src in the output as name (source_name(src) by default) and
+        returns the strategy that was used ("unchanged" when nothing had to
+        be written).
+        """
+        name = name or source_name(src)
+        if self.mode == "manifest":
+            with self._lock:
+                manifest = self._load_manifest()
+                if manifest.get(name) == src:
+                    return "unchanged"
+                manifest[name] = src
+                with open(self.manifest_path, "a", encoding="utf-8") as f:
+                    f.write(manifest_line(name, src))
+            return "manifest"
+
+        dst = self.path_for(name)
+        if split_source(src)[1] is not None:
+            try:
+                if os.stat(dst).st_mtime_ns >= source_stamp(src)[0]:
+                    return "unchanged"
+            except OSError:
+                pass
+            data = read_bytes(src)
+
+            def write(tmp):
+                with open(tmp, "wb") as f:
+                    f.write(data)
+
+            _replace_with(dst, write)
+            return "extract"
+        if is_up_to_date(src, dst):
+            return "unchanged"
+        attempts = {
+            "auto": ("hardlink", "reflink"),
+            "hardlink": ("hardlink",),
+            "reflink": ("reflink",),
+            "symlink": ("symlink",),
+            "copy": (),
+        }[self.mode]
+        for strategy in attempts:
+            try:
+                if strategy == "hardlink":
+                    _replace_with(dst, lambda tmp: os.link(src, tmp))
+                elif strategy == "reflink":
+                    _replace_with(dst, lambda tmp: _reflink(src, tmp))
+                else:
+                    _replace_with(dst, lambda tmp: os.symlink(os.path.abspath(src), tmp))
+                return strategy
+            except OSError:
+                continue
+        _replace_with(dst, lambda tmp: shutil.copy2(src, tmp))
+        return "copy"
+
+    def remove(self, name, src=None):
+        """
+        Removes the placed copy of name. Never deletes src itself, which is
+        the case when a dataset is edited in place.
+        """
+        if self.mode == "manifest":
+            with self._lock:
+                manifest = self._load_manifest()
+                if manifest.pop(name, None) is None:
+                    return
+                text = "".join(manifest_line(entry, src) for entry, src in manifest.items())
+                fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp",
+                                                dir=os.path.dirname(self.manifest_path))
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, self.manifest_path)
+            return
+        dst = self.path_for(name)
+        if src is not None and os.path.abspath(dst) == os.path.abspath(src):
+            return
+        if os.path.lexists(dst):
+            os.remove(dst)
+            print(f"Deleted image copy: {dst}")
@@ -0,0 +1,141 @@
+"""
+Perceptual hashes for spotting near-duplicate frames.
+
+Each image is decoded at 32x32 grayscale (QImageReader scales while
+decoding), transformed with a 2-D DCT, and the signs of the 8x8 lowest
+frequencies against their median form a 64-bit hash. Hashes are computed on
+a process pool and cached in SQLite by source id, mtime and size.
+"""
+import multiprocessing
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from via_sources import CONTAINER_ERRORS, image_reader, read_image, source_stamp
+
+HASH_SIZE = 8
+SAMPLE_SIZE = 32
+DEFAULT_THRESHOLD = 6
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT = _dct_matrix(SAMPLE_SIZE)
+
+
+def compute_phash(path):
+    """
+    Returns the 64-bit perceptual hash of the image with source id path, or None.
+    """
+    from PyQt5.QtCore import QSize, Qt
+    from PyQt5.QtGui import QImage
+
+    try:
+        reader = image_reader(path)
+    except CONTAINER_ERRORS as e:
+        print(f"Cannot hash {path}: {e}")
+        return None
+    if reader is None:
+        # Video frames are decoded whole and scaled afterwards.
+        image = read_image(path).scaled(SAMPLE_SIZE, SAMPLE_SIZE, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    else:
+        reader.setScaledSize(QSize(SAMPLE_SIZE, SAMPLE_SIZE))
+        image = reader.read()
+    if image.isNull():
+        return None
+    image = image.convertToFormat(QImage.Format_Grayscale8)
+    ptr = image.constBits()
+    ptr.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(ptr, np.uint8).reshape(SAMPLE_SIZE, image.bytesPerLine())[:, :SAMPLE_SIZE]
+    low = (_DCT @ pixels.astype(np.float64) @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only reflects overall brightness.
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def group_duplicates(hashes, threshold=DEFAULT_THRESHOLD):
+    """
+    Groups runs of consecutive near-identical images. Returns, for every
+    position, the index of the first image of its group; an image is a
+    duplicate when that index is not its own. Images are compared with the
+    first image of the run, so slow drift still starts new groups.
+    """
+    anchors = []
+    anchor = None
+    for i, h in enumerate(hashes):
+        if h is None or anchor is None or hashes[anchor] is None or hamming(h, hashes[anchor]) > threshold:
+            anchor = i
+        anchors.append(anchor)
+    return anchors
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class PhashCache:
+    """
+    Hashes keyed by path and revalidated against mtime and size.
+    One connection is shared between threads behind a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, hash INTEGER)"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def hash_paths(self, paths, workers=None, chunksize=32):
+        """
+        Returns the hashes of paths in order (None for unreadable images),
+        computing only the ones missing from the cache.
+        """
+        stamps = []
+        for path in paths:
+            try:
+                stamps.append(source_stamp(path))
+            except OSError:
+                stamps.append(None)
+        with self._lock:
+            cached = {row[0]: row[1:] for row in self._conn.execute("SELECT path, mtime_ns, size, hash FROM hashes")}
+        hashes = [None] * len(paths)
+        missing = []
+        for i, (path, stamp) in enumerate(zip(paths, stamps)):
+            entry = cached.get(path)
+            if stamp is not None and entry is not None and tuple(entry[:2]) == stamp:
+                hashes[i] = None if entry[2] is None else entry[2] & ((1 << 64) - 1)
+            elif stamp is not None:
+                missing.append(i)
+        if missing:
+            # Spawned workers: the GUI process already runs Qt threads.
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = list(pool.map(compute_phash, [paths[i] for i in missing], chunksize=chunksize))
+            for i, value in zip(missing, results):
+                hashes[i] = value
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                    [(paths[i], *stamps[i], None if hashes[i] is None else _to_signed(hashes[i])) for i in missing],
+                )
+        return hashes
@@ -0,0 +1,172 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from via_sources import read_image
+from via_trace import TRACER
+
+
+def decode_image(path, max_size=None):
+    """
+    Decodes the image with source id path into a QImage, scaled down to fit
+    within max_size (width, height) when given.
+    QImage (unlike QPixmap) is safe to create off the GUI thread.
+    """
+    with TRACER.span("decode"):
+        return read_image(path, max_size)
+
+
+def window_order(image_list, index, ahead, behind):
+    """
+    Paths of the ahead next and behind previous entries around index,
+    nearest first.
+    """
+    order = []
+    for step in range(1, max(ahead, behind) + 1):
+        if step <= ahead and index + step < len(image_list):
+            order.append(image_list[index + step])
+        if step <= behind and index - step >= 0:
+            order.append(image_list[index - step])
+    return order
+
+
+class ImageCache:
+    """
+    Thread-safe LRU cache of decoded QImages, bounded by total byte size.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, image):
+        if image is None or image.isNull():
+            return
+        size = image.sizeInBytes()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.sizeInBytes()
+            self._entries[key] = image
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.sizeInBytes()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ImagePrefetcher:
+    """
+    Decodes the neighbours of the current image on a worker pool so that
+    stepping through image_list is served from the cache.
+    ahead/behind control how many next/previous entries are kept warm.
+    With max_size set, images are decoded no larger than that (the viewport)
+    unless full resolution is asked for; cache keys carry the size.
+    """
+
+    def __init__(self, ahead=3, behind=1, max_bytes=512 * 1024 * 1024, workers=2, max_size=None):
+        self.ahead = ahead
+        self.behind = behind
+        self.max_size = max_size
+        self.cache = ImageCache(max_bytes)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="via-prefetch")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def key(self, path, full=False):
+        return path, None if full else self.max_size
+
+    def _decode_into_cache(self, key):
+        # A failed decode must not stay pending, or every later get() of
+        # key would raise its error again.
+        try:
+            image = decode_image(*key)
+            self.cache.put(key, image)
+            return image
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _submit(self, key):
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._decode_into_cache, key)
+                self._pending[key] = future
+            return future
+
+    def get(self, path, full=False):
+        """
+        Returns the decoded QImage for path, waiting on an in-flight decode
+        or decoding synchronously on a cache miss.
+        """
+        key = self.key(path, full)
+        image = self.cache.get(key)
+        if image is not None:
+            return image
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            return future.result()
+        image = decode_image(*key)
+        self.cache.put(key, image)
+        return image
+
+    def fetch(self, path, full=False):
+        """
+        Returns a Future for the decoded QImage of path without blocking.
+        """
+        key = self.key(path, full)
+        image = self.cache.get(key)
+        if image is not None:
+            future = Future()
+            future.set_result(image)
+            return future
+        return self._submit(key)
+
+    def schedule(self, image_list, index):
+        """
+        Queues decodes for the window around index, nearest entries first.
+        """
+        for path in window_order(image_list, index, self.ahead, self.behind):
+            key = self.key(path)
+            if key not in self.cache:
+                self._submit(key)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def clear(self):
+        self.cache.clear()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
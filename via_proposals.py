@@ -0,0 +1,275 @@
+"""
+Model-assisted pre-annotation.
+
+A proposal backend is a picklable object whose propose(image_path) returns a
+list of Proposal(class_id, x, y, w, h, score) in original image pixels.
+Backends run in a separate process pool so inference never blocks the GUI:
+
+    stub                 deterministic fake detections, for testing the pipeline
+    onnx:/path/model.onnx  a YOLOv5/v8-style ONNX detector on CPU (onnxruntime)
+
+ProposalProvider keeps proposals for the same window of images that the
+prefetcher decodes, so they are usually ready when an image is shown.
+"""
+import hashlib
+import multiprocessing
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from via_prefetch import window_order
+from via_sources import image_dims, read_image
+
+Proposal = namedtuple("Proposal", "class_id x y w h score")
+
+
+class StubBackend:
+    """
+    Proposes a few boxes derived from a hash of the file name, so results
+    are stable across runs and processes.
+    """
+
+    def __init__(self, class_ids=(1, 2, 3), count=3):
+        self.class_ids = tuple(class_ids)
+        self.count = count
+
+    def propose(self, image_path):
+        size = image_dims(image_path)
+        if size is None:
+            return []
+        width, height = size
+        seed = int.from_bytes(hashlib.sha1(image_path.encode("utf-8")).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+        proposals = []
+        for _ in range(self.count):
+            w, h = rng.uniform(0.05, 0.3) * width, rng.uniform(0.05, 0.3) * height
+            x, y = rng.uniform(0, width - w), rng.uniform(0, height - h)
+            cid = self.class_ids[int(rng.integers(len(self.class_ids)))]
+            proposals.append(Proposal(cid, x, y, w, h, float(rng.uniform(0.3, 1.0))))
+        return proposals
+
+
+def nms(boxes, scores, iou_threshold):
+    """
+    Greedy non-maximum suppression over (n, 4) x, y, w, h boxes.
+    Returns the kept indices, best score first.
+    """
+    order = np.argsort(-scores)
+    x0, y0 = boxes[:, 0], boxes[:, 1]
+    x1, y1 = x0 + boxes[:, 2], y0 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x1[i], x1[rest]) - np.maximum(x0[i], x0[rest]), 0, None)
+        ih = np.clip(np.minimum(y1[i], y1[rest]) - np.maximum(y0[i], y0[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return keep
+
+
+class OnnxBackend:
+    """
+    CPU inference of a YOLOv5/v8 ONNX export with onnxruntime.
+    Model class index i becomes class id class_ids[i] (default i + 1, the
+    numbering of the default classes.yaml).
+    """
+
+    def __init__(self, model_path, input_size=640, class_ids=None, score_threshold=0.25, iou_threshold=0.45):
+        self.model_path = model_path
+        self.input_size = input_size
+        self.class_ids = class_ids
+        self.score_threshold = score_threshold
+        self.iou_threshold = iou_threshold
+        self._session = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_session"] = None
+        return state
+
+    def _load(self):
+        if self._session is None:
+            import onnxruntime  # pip install onnxruntime
+            self._session = onnxruntime.InferenceSession(self.model_path, providers=["CPUExecutionProvider"])
+        return self._session
+
+    def _letterbox(self, image_path):
+        """
+        Returns the image scaled into a square input as a (1, 3, s, s) float
+        array, with the scale factor and padding applied.
+        """
+        from PyQt5.QtCore import Qt
+        from PyQt5.QtGui import QImage, QPainter
+
+        size = image_dims(image_path)
+        if size is None:
+            raise OSError(f"Cannot read {image_path}")
+        width, height = size
+        s = self.input_size
+        scale = min(s / width, s / height)
+        image = read_image(image_path, (max(1, round(width * scale)), max(1, round(height * scale))))
+        if image.isNull():
+            raise OSError(f"Cannot decode {image_path}")
+        scaled = image.size()
+        canvas = QImage(s, s, QImage.Format_RGB888)
+        canvas.fill(Qt.gray)
+        pad_x, pad_y = (s - scaled.width()) // 2, (s - scaled.height()) // 2
+        painter = QPainter(canvas)
+        painter.drawImage(pad_x, pad_y, image)
+        painter.end()
+        ptr = canvas.constBits()
+        ptr.setsize(canvas.sizeInBytes())
+        rgb = np.frombuffer(ptr, np.uint8).reshape(s, canvas.bytesPerLine())[:, :s * 3].reshape(s, s, 3)
+        tensor = rgb.transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return tensor, scale, pad_x, pad_y
+
+    def propose(self, image_path):
+        session = self._load()
+        tensor, scale, pad_x, pad_y = self._letterbox(image_path)
+        output = session.run(None, {session.get_inputs()[0].name: tensor})[0][0]
+        # YOLOv8 exports (4 + classes, n); YOLOv5 exports (n, 5 + classes) with objectness.
+        if output.shape[0] < output.shape[1]:
+            output = output.T
+            boxes, class_scores = output[:, :4], output[:, 4:]
+        else:
+            boxes, class_scores = output[:, :4], output[:, 5:] * output[:, 4:5]
+        class_index = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_scores)), class_index]
+        mask = scores >= self.score_threshold
+        boxes, scores, class_index = boxes[mask], scores[mask], class_index[mask]
+        if not len(boxes):
+            return []
+        xywh = np.stack([(boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / scale,
+                         (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / scale,
+                         boxes[:, 2] / scale, boxes[:, 3] / scale], axis=1)
+        proposals = []
+        for i in nms(xywh, scores, self.iou_threshold):
+            idx = int(class_index[i])
+            cid = self.class_ids[idx] if self.class_ids else idx + 1
+            proposals.append(Proposal(cid, *map(float, xywh[i]), float(scores[i])))
+        return proposals
+
+
+def make_backend(spec):
+    """
+    Builds a backend from "stub" or "onnx:<model path>".
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "stub":
+        return StubBackend()
+    if kind == "onnx" and arg:
+        return OnnxBackend(arg)
+    raise ValueError(f"Unknown proposal backend '{spec}'")
+
+
+_worker_backend = None
+
+
+def _init_worker(backend):
+    global _worker_backend
+    _worker_backend = backend
+
+
+def _propose(path):
+    try:
+        return [tuple(p) for p in _worker_backend.propose(path)]
+    except Exception as e:
+        print(f"Proposal backend failed on {path}: {e}")
+        return []
+
+
+def filter_new(proposals, coords, iou_threshold=0.5):
+    """
+    Drops proposals overlapping an existing (n, 4) box by more than iou_threshold.
+    """
+    if not proposals or not len(coords):
+        return list(proposals)
+    kept = []
+    x0, y0 = coords[:, 0], coords[:, 1]
+    x1, y1 = x0 + coords[:, 2], y0 + coords[:, 3]
+    areas = coords[:, 2] * coords[:, 3]
+    for p in proposals:
+        iw = np.clip(np.minimum(x1, p.x + p.w) - np.maximum(x0, p.x), 0, None)
+        ih = np.clip(np.minimum(y1, p.y + p.h) - np.maximum(y0, p.y), 0, None)
+        inter = iw * ih
+        if not (inter / (areas + p.w * p.h - inter + 1e-9) > iou_threshold).any():
+            kept.append(p)
+    return kept
+
+
+class ProposalProvider:
+    """
+    Runs a backend on a process pool for the current image and the
+    prefetch window around it. on_ready(path, proposals) is called from a
+    pool thread when an image's proposals arrive.
+    """
+
+    def __init__(self, backend, ahead=3, behind=1, workers=1, max_entries=256, on_ready=None):
+        self.ahead = ahead
+        self.behind = behind
+        self.max_entries = max_entries
+        self.on_ready = on_ready
+        # Spawned rather than forked: the GUI process already runs Qt and pool threads.
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_worker, initargs=(backend,))
+        self._results = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _done(self, path, future):
+        if future.cancelled():
+            return
+        try:
+            proposals = [Proposal(*p) for p in future.result()]
+        except Exception as e:
+            print(f"Proposal worker failed on {path}: {e}")
+            proposals = []
+        with self._lock:
+            self._pending.pop(path, None)
+            self._results[path] = proposals
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        if self.on_ready is not None:
+            self.on_ready(path, proposals)
+
+    def get(self, path):
+        """
+        Returns the proposals for path, or None while they are not ready.
+        """
+        with self._lock:
+            return self._results.get(path)
+
+    def schedule(self, image_list, index):
+        """
+        Queues index itself first, then the prefetch window around it.
+        """
+        order = [image_list[index]] + window_order(image_list, index, self.ahead, self.behind)
+        submitted = []
+        with self._lock:
+            for path in order:
+                if path in self._results or path in self._pending:
+                    continue
+                try:
+                    future = self._pool.submit(_propose, path)
+                except RuntimeError as e:
+                    # The pool broke or was shut down; navigation carries on without proposals.
+                    print(f"Proposals unavailable: {e}")
+                    break
+                self._pending[path] = future
+                submitted.append((path, future))
+        # Outside the lock: a callback on an already finished future runs right away.
+        for path, future in submitted:
+            future.add_done_callback(lambda f, p=path: self._done(p, f))
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
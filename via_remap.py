@@ -0,0 +1,333 @@
+"""
+Dataset-wide class id migration of a YOLO labels folder.
+
+A mapping {old id: new id, or None to drop} is applied to every label file
+on a process pool. Only the class token of affected lines is rewritten; the
+coordinates are kept exactly as written and untouched files are not written
+at all.
+
+Mappings are not idempotent (swapping 1 and 2 undoes itself when applied
+twice), so an interrupted run must never apply them to a file twice. Files
+are therefore processed in chunks of consecutive names, each in two phases:
+new contents are first written next to the labels as <name>.txt.remap, and
+only after the whole chunk is staged and flushed are they renamed over the
+labels. Labels in subfolders (dataset splits) are included and chunks are
+ranges of via_yolo.label_key. The phase of every chunk is recorded in labels/.via_remap.json, so a
+run resumed after a crash restages chunks that were not fully staged (their
+labels are untouched) and finishes renaming the staged ones.
+
+Labels written after the run started (e.g. saved with the new ids while a
+resume was declined) must not be remapped either: the state records the
+start time, as the mtime of the state file itself so it comes from the same
+clock as the labels, and newer labels are left alone when staging and when
+renaming.
+"""
+import bisect
+import json
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import via_yolo
+
+STATE_NAME = ".via_remap.json"
+STAGED_EXT = ".remap"
+CHUNK_FILES = 2048
+
+
+def class_mapping(old_ids, kept):
+    """
+    kept maps the original id of every class still in the class table to
+    its new id. Returns {old: new} for renumbered or merged classes and
+    {old: None} for removed ones.
+    """
+    mapping = {old: None for old in old_ids if old not in kept}
+    mapping.update({old: new for old, new in kept.items() if old != new})
+    return mapping
+
+
+def remap_text(text, mapping):
+    """
+    Applies mapping to the class ids of YOLO label text.
+    Returns (new text, boxes remapped, boxes dropped).
+    """
+    lines = []
+    changed = dropped = 0
+    for line in text.splitlines(keepends=True):
+        parts = line.split(None, 1)
+        if parts:
+            try:
+                class_id = int(parts[0])
+            except ValueError:
+                class_id = None
+            if class_id in mapping:
+                new_id = mapping[class_id]
+                if new_id is None:
+                    dropped += 1
+                    continue
+                changed += 1
+                line = line.replace(parts[0], str(new_id), 1)
+        lines.append(line)
+    return "".join(lines), changed, dropped
+
+
+def _staged_path(path):
+    return path + STAGED_EXT
+
+
+def _sync_dir(directory):
+    """
+    Makes renames and new entries in directory durable. Directories cannot
+    be opened on Windows, where NTFS journals them anyway.
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _sync_dirs(paths):
+    for directory in sorted({os.path.dirname(path) for path in paths}):
+        _sync_dir(directory)
+
+
+def stage_chunk(job):
+    """
+    Remaps the files of a chunk; with write=True the new contents are
+    staged next to them. Files modified after since_ns (when given) are
+    skipped. Returns (files changed, boxes remapped, boxes dropped,
+    {path: (boxes remapped, boxes dropped)} of the changed files).
+    """
+    paths, mapping, write, since_ns = job
+    files = boxes = dropped = 0
+    changes = {}
+    for path in paths:
+        with open(path, "r") as f:
+            if since_ns is not None and os.fstat(f.fileno()).st_mtime_ns > since_ns:
+                continue
+            text, changed, removed = remap_text(f.read(), mapping)
+        if not changed and not removed:
+            continue
+        files += 1
+        boxes += changed
+        dropped += removed
+        changes[path] = (changed, removed)
+        if write:
+            with open(_staged_path(path), "w") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+    if write and files:
+        _sync_dirs(paths)
+    return files, boxes, dropped, changes
+
+
+def commit_chunk(paths):
+    """
+    Renames the staged files of a chunk over their labels. Labels renamed
+    by an interrupted earlier attempt have no staged file left; labels saved
+    again after they were staged keep the newer contents. Returns the paths
+    that were rewritten.
+    """
+    replaced = []
+    for path in paths:
+        staged = _staged_path(path)
+        try:
+            if os.stat(path).st_mtime_ns > os.stat(staged).st_mtime_ns:
+                os.remove(staged)
+                continue
+            os.replace(staged, path)
+            replaced.append(path)
+        except FileNotFoundError:
+            pass
+    _sync_dirs(paths)
+    return replaced
+
+
+def pending_remap(labels_dir):
+    """
+    The mapping of an unfinished remap of labels_dir, or None.
+    """
+    try:
+        with open(os.path.join(labels_dir, STATE_NAME), "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return _decode_mapping(state.get("mapping", {}))
+
+
+def discard_remap(labels_dir):
+    """
+    Abandons an unfinished remap of labels_dir: its staged files and state
+    are removed and labels already rewritten stay as they are.
+    """
+    for path in via_yolo.iter_label_files(labels_dir, recursive=True):
+        try:
+            os.remove(_staged_path(path))
+        except FileNotFoundError:
+            pass
+    try:
+        os.remove(os.path.join(labels_dir, STATE_NAME))
+    except FileNotFoundError:
+        pass
+
+
+def _spawn():
+    # Not forked: the GUI runs remaps from a Qt thread.
+    return multiprocessing.get_context("spawn")
+
+
+def _decode_mapping(items):
+    return {int(old): None if new is None else int(new) for old, new in items.items()}
+
+
+class ClassRemap:
+    """
+    Applies mapping to every label file in labels_dir, resumably.
+    """
+
+    def __init__(self, labels_dir, mapping, chunk_files=CHUNK_FILES):
+        self.labels_dir = labels_dir
+        self.mapping = dict(mapping)
+        self.chunk_files = chunk_files
+        self.state_path = os.path.join(labels_dir, STATE_NAME)
+
+    def _chunks(self, paths):
+        return [paths[i:i + self.chunk_files] for i in range(0, len(paths), self.chunk_files)]
+
+    def _map(self, func, jobs, workers):
+        # A single chunk is not worth starting a pool.
+        if workers == 1 or len(jobs) <= 1:
+            return list(map(func, jobs))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_spawn()) as pool:
+            return list(pool.map(func, jobs))
+
+    def plan(self, workers=None):
+        """
+        Dry run. Returns (label files, files changed, boxes remapped, boxes dropped).
+        """
+        paths = list(via_yolo.iter_label_files(self.labels_dir, recursive=True))
+        jobs = [(chunk, self.mapping, False, None) for chunk in self._chunks(paths)]
+        totals = [0, 0, 0]
+        for result in self._map(stage_chunk, jobs, workers):
+            self._add_counts(totals, result[:3])
+        return (len(paths),) + tuple(totals)
+
+    def _load_state(self, paths):
+        """
+        Chunks of paths and the state to record their progress in. An
+        unfinished run of the same mapping is continued where it stopped.
+        """
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = None
+        if state is None:
+            chunks = self._chunks(paths)
+            state = {"mapping": {str(k): v for k, v in self.mapping.items()},
+                     "chunks": [[self._key(c[0]), self._key(c[-1])] for c in chunks],
+                     "staged": [], "done": []}
+            self._save_state(state)
+            state["started_ns"] = os.stat(self.state_path).st_mtime_ns
+            self._save_state(state)
+            return chunks, state
+        if _decode_mapping(state["mapping"]) != self.mapping:
+            raise ValueError(f"{self.state_path} holds an unfinished remap with a different mapping")
+        # Chunks are ranges of keys, so labels are found again after a restart.
+        names = [self._key(p) for p in paths]
+        chunks = []
+        for first, last in state["chunks"]:
+            lo = bisect.bisect_left(names, first)
+            hi = bisect.bisect_right(names, last)
+            chunks.append(paths[lo:hi])
+        return chunks, state
+
+    def _key(self, path):
+        return via_yolo.label_key(path, self.labels_dir)
+
+    def _save_state(self, state):
+        via_yolo.atomic_write_text(self.state_path, json.dumps(state) + "\n")
+
+    def run(self, workers=None, progress=None):
+        """
+        Rewrites the labels, continuing an interrupted run of the same
+        mapping. Returns (files changed, boxes remapped, boxes dropped) of
+        the chunks processed by this call.
+
+        progress(path, counts) is called for every label file of a chunk
+        once the chunk is done. counts is (boxes remapped, boxes dropped),
+        (0, 0) for a file left as it was and None for a file rewritten from
+        contents staged by an interrupted earlier run.
+        """
+        paths = list(via_yolo.iter_label_files(self.labels_dir, recursive=True))
+        chunks, state = self._load_state(paths)
+        staged, done = set(state["staged"]), set(state["done"])
+        since_ns = state["started_ns"]
+        totals = [0, 0, 0]
+        # Chunk -> changes of the chunks staged by this call.
+        changes = {}
+
+        def staged_now(k, result):
+            self._add_counts(totals, result[:3])
+            changes[k] = result[3]
+            self._mark(state, "staged", k)
+
+        def committed(k, replaced):
+            self._mark(state, "done", k)
+            if progress is None:
+                return
+            replaced = set(replaced)
+            chunk_changes = changes.pop(k, None)
+            for path in chunks[k]:
+                if path not in replaced:
+                    progress(path, (0, 0))
+                else:
+                    progress(path, None if chunk_changes is None else chunk_changes.get(path))
+
+        if workers == 1 or len(chunks) <= 1:
+            for k, chunk in enumerate(chunks):
+                if k in done:
+                    continue
+                if k not in staged:
+                    staged_now(k, stage_chunk((chunk, self.mapping, True, since_ns)))
+                committed(k, commit_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_spawn()) as pool:
+                futures = {}
+                for k, chunk in enumerate(chunks):
+                    if k in done:
+                        continue
+                    if k in staged:
+                        futures[pool.submit(commit_chunk, chunk)] = ("done", k)
+                    else:
+                        futures[pool.submit(stage_chunk, (chunk, self.mapping, True, since_ns))] = ("staged", k)
+                while futures:
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        phase, k = futures.pop(future)
+                        result = future.result()
+                        if phase == "staged":
+                            staged_now(k, result)
+                            futures[pool.submit(commit_chunk, chunks[k])] = ("done", k)
+                        else:
+                            committed(k, result)
+        os.remove(self.state_path)
+        return tuple(totals)
+
+    @staticmethod
+    def _add_counts(totals, counts):
+        for i, value in enumerate(counts):
+            totals[i] += value
+
+    def _mark(self, state, phase, k):
+        # stage_chunk and commit_chunk have synced their files, so the state
+        # never claims more than is on disk.
+        state[phase].append(k)
+        self._save_state(state)
@@ -0,0 +1,130 @@
+"""
+Write-behind queue for annotation output.
+Saves are snapshotted on the GUI thread and written by a background worker,
+so navigation never waits on the output disk.
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import via_yolo
+from via_trace import TRACER
+
+# image_name is the output file name of image_src (via_sources.source_name)
+# and image_output the via_output.ImageOutput that places the image copy, or
+# None when the images are edited in place (dataset mode).
+# label_text is None for a delete (no boxes left on the image).
+SaveJob = namedtuple("SaveJob", "image_src image_name image_output label_path label_text")
+
+
+def run_save_job(job):
+    with TRACER.span("save"):
+        _write_job(job)
+
+
+def _write_job(job):
+    if job.label_text is None:
+        if os.path.exists(job.label_path):
+            os.remove(job.label_path)
+            print(f"Deleted annotation file: {job.label_path}")
+        if job.image_output is not None:
+            job.image_output.remove(job.image_name, job.image_src)
+        return
+    if job.image_output is not None:
+        job.image_output.place(job.image_src, job.image_name)
+    else:
+        # The split folder (labels/val/...) of a dataset may not exist yet.
+        os.makedirs(os.path.dirname(job.label_path), exist_ok=True)
+    via_yolo.atomic_write_text(job.label_path, job.label_text)
+
+
+class SaveQueue:
+    """
+    Single background worker servicing SaveJobs in submission order.
+    A job submitted while an older job for the same label path is still
+    queued replaces it, so repeated saves of one image are written once.
+    """
+
+    def __init__(self, runner=run_save_job, on_saved=None, on_failed=None):
+        self.runner = runner
+        # Called on the worker thread with each job that was written, and
+        # with (job, error message) for each job that failed.
+        self.on_saved = on_saved
+        self.on_failed = on_failed
+        self.coalesced = 0
+        # label path -> error of its last save, while that save is the last one.
+        self._errors = {}
+        self._jobs = OrderedDict()
+        self._active = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="via-save", daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        with self._cond:
+            if job.label_path in self._jobs:
+                self.coalesced += 1
+            self._jobs[job.label_path] = job
+            self._cond.notify_all()
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._jobs) + (1 if self._active else 0)
+
+    def is_pending(self, label_path):
+        with self._cond:
+            return label_path in self._jobs or self._active == label_path
+
+    def wait_for(self, label_path):
+        """
+        Blocks until any queued or running save of label_path has finished.
+        Returns the error message if the last save of it failed, else None.
+        """
+        with self._cond:
+            while label_path in self._jobs or self._active == label_path:
+                self._cond.wait()
+            return self._errors.get(label_path)
+
+    def drain(self):
+        with self._cond:
+            while self._jobs or self._active:
+                self._cond.wait()
+
+    def close(self):
+        self.drain()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closed:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                key, job = self._jobs.popitem(last=False)
+                self._active = key
+            error = None
+            try:
+                self.runner(job)
+            except Exception as e:
+                print(f"Error saving {key}: {e}")
+                error = str(e)
+            with self._cond:
+                if error is None:
+                    self._errors.pop(key, None)
+                else:
+                    self._errors[key] = error
+            try:
+                if error is None and self.on_saved is not None:
+                    self.on_saved(job)
+                elif error is not None and self.on_failed is not None:
+                    self.on_failed(job, error)
+            except Exception as e:
+                print(f"Error after saving {key}: {e}")
+            with self._cond:
+                self._active = None
+                self._cond.notify_all()
@@ -0,0 +1,88 @@
+"""
+Streaming image folder scanning with natural ("img2" before "img10") order.
+"""
+import os
+import re
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+_digits = re.compile(r"(\d+)")
+
+
+def natural_key(text):
+    """
+    Sort key that compares runs of digits numerically.
+    """
+    return [int(part) if part.isdigit() else part.casefold() for part in _digits.split(text)]
+
+
+def path_key(path, root):
+    return natural_key(os.path.relpath(path, root).replace(os.sep, "/"))
+
+
+def iter_image_paths(folder, recursive=False, exts=IMAGE_EXTS):
+    """
+    Yields image paths under folder as os.scandir finds them.
+    """
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive and not entry.name.startswith("."):
+                                stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in exts:
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Cannot scan {current}: {e}")
+
+
+class FolderScanner(QThread):
+    """
+    Scans a folder off the GUI thread and emits found paths in batches.
+    The first path is emitted on its own so it can be shown immediately.
+    iterate(folder, recursive) yields the paths (see via_sources.iter_source_ids).
+    """
+
+    found = pyqtSignal(list)
+    done = pyqtSignal(int)
+
+    def __init__(self, folder, recursive=False, interval=0.2, iterate=iter_image_paths, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.recursive = recursive
+        self.iterate = iterate
+        self.interval = interval
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+        self.wait()
+
+    def run(self):
+        batch = []
+        total = 0
+        last = 0.0
+        for path in self.iterate(self.folder, self.recursive):
+            if self._stopped:
+                return
+            batch.append(path)
+            now = time.monotonic()
+            if total == 0 or now - last >= self.interval:
+                total += len(batch)
+                self.found.emit(batch)
+                batch = []
+                last = now
+        if batch and not self._stopped:
+            total += len(batch)
+            self.found.emit(batch)
+        if not self._stopped:
+            self.done.emit(total)
@@ -0,0 +1,379 @@
+"""
+Image sources: plain image files, members of zip/tar archives and video frames.
+
+Every image has a source id. For a plain file it is the file path; an
+archive member is "<archive path>::<member name>" and a video frame
+"<video path>::<frame number>". Ids are stable across runs, so they key
+labels and caches. source_name() turns an id into the file name used in the
+output folder, e.g. "shard-0001__images__cat.jpg" for images/cat.jpg in
+shard-0001.tar and "clip__frame000042.jpg" for frame 42 of clip.mp4. Given
+the scanned root, images in its subfolders are prefixed with their relative
+folder ("a__dup.jpg" for root/a/dup.jpg), so equal names in different
+subfolders get different labels.
+
+Containers are opened lazily, once per process, so pool workers that only
+receive ids can read them too. Archives are indexed when opened and then
+read by member offset; tar archives must be uncompressed for that. Videos
+need OpenCV (pip install opencv-python). Frame numbers count frames in
+decoding order, so they must not depend on how a frame is reached: see
+VideoContainer.
+"""
+import os
+import tarfile
+import threading
+import zipfile
+from collections import OrderedDict
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PyQt5.QtGui import QImage, QImageReader
+
+from via_imagemeta import image_size
+from via_scan import IMAGE_EXTS, iter_image_paths
+
+SEP = "::"
+ARCHIVE_EXTS = (".zip", ".tar")
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+CONTAINER_EXTS = ARCHIVE_EXTS + VIDEO_EXTS
+VIDEO_FRAME_CACHE = 8
+# Forward jumps up to this many frames decode through instead of seeking.
+VIDEO_SEEK_GAP = 32
+FRAME_QUALITY = 95
+
+# What opening or reading a broken container can raise.
+CONTAINER_ERRORS = (OSError, ImportError, KeyError, ValueError, zipfile.BadZipFile, tarfile.TarError)
+
+
+def _ext(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def is_container(path):
+    return _ext(path) in CONTAINER_EXTS
+
+
+def split_source(source_id):
+    """
+    Returns (container, member) of an id, or (source_id, None) for a plain file.
+    """
+    container, sep, member = source_id.partition(SEP)
+    if sep and is_container(container):
+        return container, member
+    return source_id, None
+
+
+def _folder_prefix(path, root):
+    """
+    "a__b__" for a path in root/a/b/; "" directly in root, outside it or
+    without a root.
+    """
+    if not root:
+        return ""
+    try:
+        folder = os.path.relpath(os.path.dirname(path), root)
+    except ValueError:
+        # Another drive on Windows.
+        return ""
+    if folder == "." or folder == ".." or folder.startswith(".." + os.sep):
+        return ""
+    return folder.replace(os.sep, "__") + "__"
+
+
+def source_name(source_id, root=None):
+    """
+    File name of source_id in the output folder; its stem names the label.
+    root is the scanned folder; see the module docstring.
+    """
+    container, member = split_source(source_id)
+    prefix = _folder_prefix(container, root)
+    if member is None:
+        return prefix + os.path.basename(source_id)
+    stem = prefix + os.path.splitext(os.path.basename(container))[0]
+    if _ext(container) in VIDEO_EXTS:
+        return f"{stem}__frame{int(member):06d}.jpg"
+    return f"{stem}__{member.replace('/', '__')}"
+
+
+def source_stamp(source_id):
+    """
+    (mtime_ns, size) of the file holding source_id; raises OSError.
+    """
+    st = os.stat(split_source(source_id)[0])
+    return st.st_mtime_ns, st.st_size
+
+
+class ZipContainer:
+    def __init__(self, path):
+        self._zip = zipfile.ZipFile(path)
+        self._lock = threading.Lock()
+        self.members = [info.filename for info in self._zip.infolist()
+                        if not info.is_dir() and _ext(info.filename) in IMAGE_EXTS]
+
+    def read(self, member):
+        with self._lock:
+            return self._zip.read(member)
+
+    def size_of(self, member):
+        return self._zip.getinfo(member).file_size
+
+
+class TarContainer:
+    """
+    Indexes member data offsets in one pass over the headers, then reads
+    members with a seek and a read.
+    """
+
+    def __init__(self, path):
+        self._index = {}
+        try:
+            with tarfile.open(path, "r:") as tar:
+                for info in tar:
+                    if info.isfile() and _ext(info.name) in IMAGE_EXTS:
+                        self._index[info.name] = (info.offset_data, info.size)
+        except tarfile.ReadError as e:
+            raise tarfile.ReadError(f"{e} (compressed tar archives cannot be read by offset)") from e
+        self.members = list(self._index)
+        self._file = open(path, "rb")
+        self._lock = threading.Lock()
+
+    def read(self, member):
+        offset, size = self._index[member]
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def size_of(self, member):
+        return self._index[member][1]
+
+
+class VideoContainer:
+    """
+    Frames of a video by number. Frames are listed from CAP_PROP_FRAME_COUNT,
+    which is container metadata and can be off by a few: that only adds
+    unreadable numbers at the end or leaves the last frames out, and it is
+    noticed when a listed frame cannot be read. Seeking with
+    CAP_PROP_POS_FRAMES often lands before the requested frame (e.g. on a
+    keyframe), so a seek decodes forward from the position the backend
+    reports, backing off further when it lands past the frame. The last few
+    decoded frames are kept.
+    """
+
+    def __init__(self, path):
+        import cv2  # pip install opencv-python
+        self._cv2 = cv2
+        self._path = path
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise OSError(f"Cannot open video {path}")
+        self.size = (int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.members = [str(i) for i in range(int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT)))]
+        # Number of the frame the next read() returns; -1 when unknown.
+        self._next = 0
+        self._short_reported = False
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _seek(self, index):
+        """
+        Positions the capture so that the next read() returns frame index.
+        Returns False when the video ends first.
+        """
+        cv2 = self._cv2
+        if index == self._next:
+            return True
+        if self._next < 0 or not 0 <= index - self._next <= VIDEO_SEEK_GAP:
+            target, back = index, VIDEO_SEEK_GAP
+            while True:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                landed = round(self._cap.get(cv2.CAP_PROP_POS_FRAMES))
+                if 0 <= landed <= index:
+                    self._next = landed
+                    break
+                if target == 0:
+                    # Nothing sensible reported: decode from the start.
+                    self._cap.release()
+                    self._cap = cv2.VideoCapture(self._path)
+                    self._next = 0
+                    break
+                target, back = max(0, index - back), back * 2
+        while self._next < index:
+            if not self._cap.grab():
+                self._next = -1
+                return False
+            self._next += 1
+        return True
+
+    def frame(self, index):
+        """
+        Decodes frame index as a QImage (null when it cannot be read).
+        """
+        cv2 = self._cv2
+        with self._lock:
+            image = self._frames.get(index)
+            if image is not None:
+                self._frames.move_to_end(index)
+                return image
+            ok = self._seek(index)
+            if ok:
+                ok, bgr = self._cap.read()
+            self._next = index + 1 if ok else -1
+            if not ok:
+                if index < len(self.members) and not self._short_reported:
+                    self._short_reported = True
+                    print(f"{self._path} has fewer frames than its header lists; frame {index} cannot be read")
+                return QImage()
+            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            height, width = rgb.shape[:2]
+            image = QImage(rgb.data, width, height, rgb.strides[0], QImage.Format_RGB888).copy()
+            self._frames[index] = image
+            while len(self._frames) > VIDEO_FRAME_CACHE:
+                self._frames.popitem(last=False)
+            return image
+
+    def read(self, member):
+        image = self.frame(int(member))
+        if image.isNull():
+            raise OSError(f"Cannot decode frame {member}")
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        image.save(buffer, "JPG", FRAME_QUALITY)
+        buffer.close()
+        return bytes(data)
+
+
+_containers = {}
+_containers_lock = threading.Lock()
+
+
+def open_container(path):
+    """
+    The open container at path, indexing it on first use in this process.
+    """
+    with _containers_lock:
+        container = _containers.get(path)
+        if container is None:
+            ext = _ext(path)
+            if ext == ".zip":
+                container = ZipContainer(path)
+            elif ext == ".tar":
+                container = TarContainer(path)
+            else:
+                container = VideoContainer(path)
+            _containers[path] = container
+        return container
+
+
+def iter_source_ids(root, recursive=False):
+    """
+    Yields the source ids under root, which is a folder, an archive or a
+    video. Archives and videos found in a folder are expanded in place.
+    """
+    if os.path.isfile(root):
+        paths = [root]
+    else:
+        paths = iter_image_paths(root, recursive, IMAGE_EXTS + CONTAINER_EXTS)
+    for path in paths:
+        if not is_container(path):
+            yield path
+            continue
+        try:
+            members = open_container(path).members
+        except CONTAINER_ERRORS as e:
+            print(f"Cannot open {path}: {e}")
+            continue
+        for member in members:
+            yield f"{path}{SEP}{member}"
+
+
+def read_bytes(source_id):
+    """
+    Encoded image data of source_id: the file or member as stored, or a
+    JPEG of a video frame.
+    """
+    container, member = split_source(source_id)
+    if member is None:
+        with open(source_id, "rb") as f:
+            return f.read()
+    return open_container(container).read(member)
+
+
+def source_size(source_id):
+    """
+    Stored size in bytes of source_id; 0 for video frames, which are only
+    encoded when read.
+    """
+    container, member = split_source(source_id)
+    if member is None:
+        return os.path.getsize(source_id)
+    opened = open_container(container)
+    if isinstance(opened, VideoContainer):
+        return 0
+    return opened.size_of(member)
+
+
+def image_reader(source_id):
+    """
+    A QImageReader for a file or archive member; None for video frames.
+    """
+    container, member = split_source(source_id)
+    if member is None:
+        return QImageReader(source_id)
+    opened = open_container(container)
+    if isinstance(opened, VideoContainer):
+        return None
+    buffer = QBuffer()
+    buffer.setData(opened.read(member))
+    buffer.open(QIODevice.ReadOnly)
+    reader = QImageReader(buffer)
+    # The reader does not own its device.
+    reader.buffer = buffer
+    return reader
+
+
+def read_image(source_id, max_size=None):
+    """
+    Decodes source_id into a QImage, scaled down to fit within max_size
+    (width, height) when given. Returns a null QImage on failure.
+    """
+    try:
+        reader = image_reader(source_id)
+        if reader is None:
+            container, member = split_source(source_id)
+            image = open_container(container).frame(int(member))
+            if max_size is not None and (image.width() > max_size[0] or image.height() > max_size[1]):
+                image = image.scaled(max_size[0], max_size[1], Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            return image
+    except CONTAINER_ERRORS as e:
+        print(f"Failed to read {source_id}: {e}")
+        return QImage()
+    if max_size is not None:
+        size = reader.size()
+        if size.isValid() and (size.width() > max_size[0] or size.height() > max_size[1]):
+            # Scaling in the reader lets the JPEG plugin decode at 1/2, 1/4
+            # or 1/8 size in the DCT domain instead of decoding everything.
+            reader.setScaledSize(size.scaled(max_size[0], max_size[1], Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        print(f"Failed to decode {source_id}: {reader.errorString()}")
+    return image
+
+
+def image_dims(source_id):
+    """
+    (width, height) of source_id without decoding pixels where the format
+    allows, or None if unknown.
+    """
+    container, member = split_source(source_id)
+    if member is None:
+        size = image_size(source_id)
+        if size is not None:
+            return size
+    try:
+        reader = image_reader(source_id)
+        if reader is None:
+            return open_container(container).size
+    except CONTAINER_ERRORS as e:
+        print(f"Failed to read {source_id}: {e}")
+        return None
+    size = reader.size()
+    return (size.width(), size.height()) if size.isValid() else None
@@ -0,0 +1,146 @@
+"""
+Dataset statistics over a labels folder, kept up to date per save.
+
+Totals are sums of per-image contributions, so replacing one image's rows
+only subtracts its old contribution and adds the new one. A full rebuild
+runs vectorized over the rows array of a LabelCache, with no text parsing;
+updates made while that cache was being built are applied again on top.
+"""
+from collections import Counter
+
+import numpy as np
+
+SIZE_BINS = np.linspace(0.0, 1.0, 21)
+TINY_SIZE = 0.01  # sqrt(w * h) as a fraction of the image side
+BOUNDS_TOLERANCE = 1e-6
+
+
+def box_metrics(rows):
+    """
+    Returns (sizes, out_of_bounds, degenerate) for an (n, 5) array of YOLO rows.
+    """
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+    xc, yc, w, h = rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4]
+    degenerate = (w <= 0) | (h <= 0)
+    lo, hi = -BOUNDS_TOLERANCE, 1.0 + BOUNDS_TOLERANCE
+    out_of_bounds = ~degenerate & ((xc - w / 2 < lo) | (xc + w / 2 > hi) | (yc - h / 2 < lo) | (yc + h / 2 > hi))
+    sizes = np.sqrt(np.clip(w, 0, None) * np.clip(h, 0, None))
+    return sizes, out_of_bounds, degenerate
+
+
+class DatasetStats:
+    """
+    Class balance, box size histogram, boxes-per-image counts and
+    problem counts (out of bounds, degenerate, tiny) for a labels folder.
+    """
+
+    def __init__(self):
+        # stem -> rows of the updates since begin_rebuild(), or None.
+        self._recorded = None
+        self.reset()
+
+    def reset(self):
+        self._rows = {}
+        self.class_counts = Counter()
+        self.size_hist = np.zeros(len(SIZE_BINS) - 1, dtype=np.int64)
+        self.boxes_per_image = Counter()
+        self.boxes = 0
+        self.out_of_bounds = 0
+        self.degenerate = 0
+        self.tiny = 0
+
+    @property
+    def labeled_images(self):
+        return len(self._rows)
+
+    def _apply(self, rows, sign):
+        if not len(rows):
+            return
+        sizes, oob, degenerate = box_metrics(rows)
+        classes, counts = np.unique(np.asarray(rows)[:, 0].astype(np.int64), return_counts=True)
+        for cid, n in zip(classes.tolist(), counts.tolist()):
+            self.class_counts[cid] += sign * n
+            if not self.class_counts[cid]:
+                del self.class_counts[cid]
+        self.size_hist += sign * np.histogram(np.clip(sizes, 0, 1), SIZE_BINS)[0]
+        self.boxes_per_image[len(rows)] += sign
+        if not self.boxes_per_image[len(rows)]:
+            del self.boxes_per_image[len(rows)]
+        self.boxes += sign * len(rows)
+        self.out_of_bounds += sign * int(oob.sum())
+        self.degenerate += sign * int(degenerate.sum())
+        self.tiny += sign * int(((sizes < TINY_SIZE) & ~degenerate).sum())
+
+    def update(self, stem, rows):
+        """
+        Replaces the rows of stem; an empty array removes the image.
+        """
+        old = self._rows.pop(stem, None)
+        if old is not None:
+            self._apply(old, -1)
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+        if self._recorded is not None:
+            self._recorded[stem] = rows
+        if len(rows):
+            self._rows[stem] = rows
+            self._apply(rows, 1)
+
+    def begin_rebuild(self):
+        """
+        Starts recording updates until the next rebuild(), for a label cache
+        that is being built in the background and may miss them.
+        """
+        self._recorded = {}
+
+    def rebuild(self, label_cache):
+        """
+        Recomputes everything from a LabelCache, then reapplies the updates
+        recorded since begin_rebuild().
+        """
+        recorded, self._recorded = self._recorded or {}, None
+        self._recount(label_cache)
+        for stem, rows in recorded.items():
+            self.update(stem, rows)
+
+    def _recount(self, label_cache):
+        # A few array operations over the whole cache.
+        self.reset()
+        index, rows = label_cache.arrays()
+        if index is None or not len(index):
+            return
+        counts = np.asarray(index["count"], dtype=np.int64)
+        offsets = np.asarray(index["offset"], dtype=np.int64)
+        for stem, offset, count in zip(index["stem"].tolist(), offsets.tolist(), counts.tolist()):
+            if count:
+                self._rows[stem] = rows[offset:offset + count]
+        if not len(rows):
+            return
+        sizes, oob, degenerate = box_metrics(rows)
+        classes, class_totals = np.unique(np.asarray(rows[:, 0]).astype(np.int64), return_counts=True)
+        self.class_counts = Counter(dict(zip(classes.tolist(), class_totals.tolist())))
+        self.size_hist = np.histogram(np.clip(sizes, 0, 1), SIZE_BINS)[0].astype(np.int64)
+        per_image, images = np.unique(counts[counts > 0], return_counts=True)
+        self.boxes_per_image = Counter(dict(zip(per_image.tolist(), images.tolist())))
+        self.boxes = len(rows)
+        self.out_of_bounds = int(oob.sum())
+        self.degenerate = int(degenerate.sum())
+        self.tiny = int(((sizes < TINY_SIZE) & ~degenerate).sum())
+
+    def summary(self, class_names=None, total_images=None):
+        """
+        Returns the statistics as text lines, for the CLI.
+        """
+        class_names = class_names or {}
+        lines = [f"Labeled images: {self.labeled_images}"]
+        if total_images is not None:
+            lines.append(f"Unlabeled images: {max(0, total_images - self.labeled_images)}")
+        lines.append(f"Boxes: {self.boxes}")
+        for cid, n in sorted(self.class_counts.items()):
+            share = 100.0 * n / self.boxes if self.boxes else 0.0
+            lines.append(f"  class {cid} ({class_names.get(cid, '?')}): {n} ({share:.1f}%)")
+        lines.append(f"Out of bounds: {self.out_of_bounds}  Degenerate: {self.degenerate}  "
+                     f"Tiny (<{TINY_SIZE:.0%} of side): {self.tiny}")
+        if self.labeled_images:
+            lines.append(f"Boxes per image: mean {self.boxes / self.labeled_images:.2f}, "
+                         f"max {max(self.boxes_per_image)}")
+        return lines
@@ -0,0 +1,101 @@
+"""
+Dock panel drawing DatasetStats as simple bar charts with QPainter.
+"""
+from PyQt5.QtCore import QRect, Qt
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+from via_stats import SIZE_BINS
+
+MAX_BOXES_BIN = 20
+BAR_COLOR = QColor(90, 160, 230)
+PROBLEM_COLOR = QColor(230, 90, 90)
+
+
+class StatsPanel(QWidget):
+    """
+    Shows totals, class balance, box sizes and boxes per image.
+    Call set_stats after the statistics change; painting reads them as is.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.stats = None
+        self.total_images = 0
+        self.class_names = {}
+        self.class_colors = {}
+        self.setMinimumWidth(260)
+        self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Expanding)
+
+    def set_stats(self, stats, total_images, class_names, class_colors):
+        self.stats = stats
+        self.total_images = total_images
+        self.class_names = class_names
+        self.class_colors = class_colors
+        self.update()
+
+    def _draw_bars(self, painter, rect, title, values, labels, colors=None):
+        painter.setPen(QColor(230, 230, 230))
+        painter.drawText(rect.x(), rect.y() + 12, title)
+        area = QRect(rect.x(), rect.y() + 18, rect.width(), rect.height() - 34)
+        peak = max(values) if values and max(values) > 0 else 1
+        n = max(1, len(values))
+        bar_w = area.width() / n
+        for i, value in enumerate(values):
+            h = int(area.height() * value / peak)
+            color = colors[i] if colors else BAR_COLOR
+            painter.fillRect(int(area.x() + i * bar_w + 1), area.bottom() - h, max(1, int(bar_w) - 2), h, color)
+        painter.setPen(QColor(170, 170, 170))
+        # Label the first, middle and last bars only; there is no room for more.
+        for i in sorted({0, n // 2, n - 1}):
+            if i < len(labels):
+                painter.drawText(int(area.x() + i * bar_w), area.bottom() + 14, labels[i])
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(40, 40, 40))
+        stats = self.stats
+        if stats is None:
+            painter.setPen(QColor(200, 200, 200))
+            painter.drawText(self.rect(), Qt.AlignCenter, "No output folder")
+            painter.end()
+            return
+        margin = 8
+        width = self.width() - 2 * margin
+        mean = stats.boxes / stats.labeled_images if stats.labeled_images else 0.0
+        lines = [
+            f"Labeled {stats.labeled_images}   Unlabeled {max(0, self.total_images - stats.labeled_images)}",
+            f"Boxes {stats.boxes}   Per image {mean:.1f}",
+        ]
+        y = margin + 12
+        painter.setPen(QColor(230, 230, 230))
+        for line in lines:
+            painter.drawText(margin, y, line)
+            y += 16
+        problems = stats.out_of_bounds + stats.degenerate + stats.tiny
+        painter.setPen(PROBLEM_COLOR if problems else QColor(120, 200, 120))
+        painter.drawText(margin, y, f"Out of bounds {stats.out_of_bounds}   Degenerate {stats.degenerate}")
+        painter.drawText(margin, y + 16, f"Tiny {stats.tiny}")
+        y += 28
+
+        chart_h = max(80, (self.height() - y - margin) // 3)
+        class_ids = sorted(stats.class_counts)
+        self._draw_bars(
+            painter, QRect(margin, y, width, chart_h), "Boxes per class",
+            [stats.class_counts[cid] for cid in class_ids],
+            [self.class_names.get(cid, str(cid)) for cid in class_ids],
+            [self.class_colors.get(cid, BAR_COLOR) for cid in class_ids],
+        )
+        y += chart_h
+        self._draw_bars(
+            painter, QRect(margin, y, width, chart_h), "Box size (sqrt area / image side)",
+            stats.size_hist.tolist(), [f"{edge:.2f}" for edge in SIZE_BINS[:-1]],
+        )
+        y += chart_h
+        per_image = [stats.boxes_per_image.get(n, 0) for n in range(1, MAX_BOXES_BIN)]
+        per_image.append(sum(v for n, v in stats.boxes_per_image.items() if n >= MAX_BOXES_BIN))
+        self._draw_bars(
+            painter, QRect(margin, y, width, chart_h), "Images by box count",
+            per_image, [str(n) for n in range(1, MAX_BOXES_BIN)] + [f"{MAX_BOXES_BIN}+"],
+        )
+        painter.end()
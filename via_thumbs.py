@@ -0,0 +1,120 @@
+"""
+Persistent thumbnail cache for the filmstrip.
+
+Thumbnails are small JPEGs named after a SHA-1 of the image path, mtime and
+size, so an edited image simply gets a new file and reopening a folder reads
+thumbnails back instead of decoding the images again. Files are written under
+a temporary name and renamed, so several workers (or windows) can fill the
+cache at once. Loading and generation run on a thread pool; decoded
+thumbnails are also kept in a small in-memory LRU.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtGui import QImage
+
+from via_prefetch import ImageCache
+from via_sources import read_image, source_stamp
+
+THUMB_SIZE = 128
+THUMB_QUALITY = 85
+
+
+def thumb_key(path):
+    """
+    Cache key of the image with source id path; raises OSError when it is missing.
+    """
+    mtime_ns, size = source_stamp(path)
+    ident = f"{os.path.abspath(path)}\0{mtime_ns}\0{size}"
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+
+def make_thumbnail(path, size=THUMB_SIZE):
+    """
+    Decodes path scaled to fit a size x size square (JPEGs are scaled while
+    decoding). Returns a null QImage when the image cannot be read.
+    """
+    return read_image(path, (size, size))
+
+
+class ThumbnailCache:
+    """
+    Thumbnails of image paths, stored under root/<2 hex>/<sha1>.jpg.
+    get() only looks in memory; request() loads or generates a thumbnail in
+    the background and calls on_ready(path) from a pool thread when done.
+    """
+
+    def __init__(self, root, size=THUMB_SIZE, workers=2, max_bytes=64 * 1024 * 1024):
+        self.root = root
+        self.size = size
+        self.memory = ImageCache(max_bytes)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="via-thumbs")
+        self._pending = {}
+        # Unreadable images are not retried until the cache is cleared.
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        return os.path.join(self.root, key[:2], key + ".jpg")
+
+    def _load(self, path):
+        try:
+            file = self._file(thumb_key(path))
+            image = QImage(file) if os.path.exists(file) else QImage()
+            if image.isNull():
+                image = make_thumbnail(path, self.size)
+                if not image.isNull():
+                    os.makedirs(os.path.dirname(file), exist_ok=True)
+                    tmp = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    if image.save(tmp, "JPG", THUMB_QUALITY):
+                        os.replace(tmp, file)
+            if image.isNull():
+                with self._lock:
+                    self._failed.add(path)
+            self.memory.put(path, image)
+        except OSError as e:
+            print(f"Thumbnail cache error for {path}: {e}")
+            with self._lock:
+                self._failed.add(path)
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def get(self, path):
+        return self.memory.get(path)
+
+    def request(self, path, on_ready):
+        with self._lock:
+            if path in self._pending or path in self._failed:
+                return
+            try:
+                future = self._pool.submit(self._load, path)
+            except RuntimeError:
+                # Shut down while the window closes.
+                return
+            self._pending[path] = future
+        future.add_done_callback(lambda f: f.cancelled() or on_ready(path))
+
+    def retain(self, paths):
+        """
+        Cancels queued requests for paths no longer wanted, e.g. cells that
+        were scrolled past before their thumbnail was started.
+        """
+        with self._lock:
+            for path, future in list(self._pending.items()):
+                if path not in paths and future.cancel():
+                    del self._pending[path]
+
+    def clear(self):
+        self.memory.clear()
+        with self._lock:
+            self._failed.clear()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
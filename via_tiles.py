@@ -0,0 +1,92 @@
+import math
+
+from PyQt5.QtCore import Qt, QRect, QRectF
+from PyQt5.QtGui import QPainter
+
+from via_prefetch import ImageCache
+
+
+class TilePyramid:
+    """
+    Mip-mapped, tiled view of a large QImage.
+    Level 0 is the source image and every further level halves it. Levels are
+    built lazily and cut into fixed-size tiles that are cached in an LRU, so
+    rendering cost and memory follow the viewport rather than the zoom.
+    """
+
+    def __init__(self, image, tile_size=512, max_bytes=256 * 1024 * 1024):
+        self.tile_size = tile_size
+        self.levels = [image]
+        self.tiles = ImageCache(max_bytes)
+
+    def width(self):
+        return self.levels[0].width()
+
+    def height(self):
+        return self.levels[0].height()
+
+    def level_count(self):
+        longest = max(self.width(), self.height(), 1)
+        return max(1, int(math.ceil(math.log2(longest / self.tile_size))) + 1)
+
+    def level(self, index):
+        while len(self.levels) <= index:
+            prev = self.levels[-1]
+            self.levels.append(prev.scaled(
+                max(1, prev.width() // 2), max(1, prev.height() // 2),
+                Qt.IgnoreAspectRatio, Qt.SmoothTransformation
+            ))
+        return self.levels[index]
+
+    def level_for_scale(self, scale):
+        """
+        Returns the coarsest level that still has at least one source pixel
+        per display pixel at the given display scale.
+        """
+        if scale <= 0:
+            return 0
+        index = int(math.floor(math.log2(1.0 / scale))) if scale < 1.0 else 0
+        return max(0, min(index, self.level_count() - 1))
+
+    def tile(self, index, tx, ty):
+        key = (index, tx, ty)
+        image = self.tiles.get(key)
+        if image is None:
+            level = self.level(index)
+            t = self.tile_size
+            image = level.copy(QRect(tx * t, ty * t, t, t).intersected(level.rect()))
+            self.tiles.put(key, image)
+        return image
+
+    def render(self, painter, image_rect, viewport):
+        """
+        Draws the tiles of image_rect (the full image in display coordinates)
+        that intersect viewport.
+        """
+        visible = image_rect.intersected(viewport)
+        if visible.isEmpty() or image_rect.width() <= 0:
+            return
+        scale = image_rect.width() / self.width()
+        index = self.level_for_scale(scale)
+        level = self.level(index)
+        # Display pixels per pixel of the chosen level.
+        level_scale = image_rect.width() / level.width()
+        t = self.tile_size
+        lx0 = (visible.left() - image_rect.x()) / level_scale
+        ly0 = (visible.top() - image_rect.y()) / level_scale
+        lx1 = (visible.right() + 1 - image_rect.x()) / level_scale
+        ly1 = (visible.bottom() + 1 - image_rect.y()) / level_scale
+        tx0, ty0 = max(0, int(lx0 // t)), max(0, int(ly0 // t))
+        tx1 = min((level.width() - 1) // t, int(lx1 // t))
+        ty1 = min((level.height() - 1) // t, int(ly1 // t))
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                tile = self.tile(index, tx, ty)
+                target = QRectF(
+                    image_rect.x() + tx * t * level_scale,
+                    image_rect.y() + ty * t * level_scale,
+                    tile.width() * level_scale,
+                    tile.height() * level_scale
+                )
+                painter.drawImage(target, tile)
@@ -0,0 +1,123 @@
+"""
+Lightweight timing spans for the hot paths.
+
+    with TRACER.span("decode"):
+        ...
+
+When tracing is disabled span() returns a shared no-op context manager, so
+the cost is one attribute check and a call. When enabled, spans feed rolling
+per-name statistics (for the on-canvas overlay) and a ring buffer of Chrome
+trace events that can be written out and opened in chrome://tracing or
+Perfetto.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class Tracer:
+    """
+    Collects span durations and counter samples.
+    history is the number of recent durations kept per span name and
+    max_events the size of the trace event ring buffer.
+    """
+
+    def __init__(self, enabled=False, history=120, max_events=200000):
+        self.enabled = enabled
+        self.history = history
+        self.durations = {}
+        self.counters = {}
+        self.events = deque(maxlen=max_events)
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def _tid(self):
+        ident = threading.get_ident()
+        tid = self._threads.get(ident)
+        if tid is None:
+            tid = len(self._threads) + 1
+            self._threads[ident] = tid
+            self.events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                                "args": {"name": threading.current_thread().name}})
+        return tid
+
+    def record(self, name, start, duration):
+        with self._lock:
+            samples = self.durations.get(name)
+            if samples is None:
+                samples = self.durations[name] = deque(maxlen=self.history)
+            samples.append(duration)
+            self.events.append({
+                "name": name, "ph": "X", "pid": self._pid, "tid": self._tid(),
+                "ts": (start - self._origin) * 1e6, "dur": duration * 1e6,
+            })
+
+    def counter(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = value
+            self.events.append({
+                "name": name, "ph": "C", "pid": self._pid, "tid": self._tid(),
+                "ts": (time.perf_counter() - self._origin) * 1e6, "args": {name: value},
+            })
+
+    def last_ms(self, name):
+        samples = self.durations.get(name)
+        return samples[-1] * 1000 if samples else None
+
+    def mean_ms(self, name):
+        samples = self.durations.get(name)
+        return 1000 * sum(samples) / len(samples) if samples else None
+
+    def write(self, path):
+        """
+        Writes the buffered events as a Chrome trace JSON file.
+        """
+        with self._lock:
+            events = list(self.events)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        os.replace(tmp_path, path)
+
+
+TRACER = Tracer(enabled=os.environ.get("VIA_TRACE", "") not in ("", "0"))
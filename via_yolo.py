@@ -0,0 +1,189 @@
+"""
+GUI-free YOLO label I/O shared by the annotator and the batch tools.
+A label row is a tuple (class_id, x_center, y_center, width, height) with
+coordinates normalized to the image size.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+LABEL_EXT = ".txt"
+DEFAULT_PRECISION = 6
+
+
+def parse_labels(text):
+    """
+    Parses YOLO label text.
+    Returns (rows, malformed) where malformed lists the 1-based numbers of
+    lines that are not blank and could not be parsed.
+    """
+    rows = []
+    malformed = []
+    for number, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) != 5:
+            malformed.append(number)
+            continue
+        try:
+            rows.append((int(parts[0]), float(parts[1]), float(parts[2]),
+                         float(parts[3]), float(parts[4])))
+        except ValueError:
+            malformed.append(number)
+    return rows, malformed
+
+
+def read_labels(path):
+    with open(path, "r") as f:
+        rows, _ = parse_labels(f.read())
+    return rows
+
+
+def parse_label_array(text):
+    """
+    Parses YOLO label text into an (n, 5) float64 array.
+    Well-formed text is converted in one NumPy call; anything else falls back
+    to parse_labels, which skips malformed lines.
+    """
+    tokens = text.split()
+    lines = sum(1 for line in text.splitlines() if line.strip())
+    if len(tokens) == lines * 5:
+        try:
+            return np.array(tokens, dtype=np.float64).reshape(-1, 5)
+        except ValueError:
+            pass
+    rows, _ = parse_labels(text)
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+
+def read_label_array(path):
+    with open(path, "r") as f:
+        return parse_label_array(f.read())
+
+
+def format_label_array(rows, precision=DEFAULT_PRECISION):
+    """
+    Formats an (n, 5) array like format_labels with a single format call.
+    """
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+    if not len(rows):
+        return ""
+    # %d truncates the float class id column just like int().
+    line = f"%d %.{precision}f %.{precision}f %.{precision}f %.{precision}f\n"
+    return (line * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def format_labels(rows, precision=DEFAULT_PRECISION):
+    return "".join(
+        f"{cid} {xc:.{precision}f} {yc:.{precision}f} {w:.{precision}f} {h:.{precision}f}\n"
+        for cid, xc, yc, w, h in rows
+    )
+
+
+def atomic_write_text(path, text):
+    """
+    Writes text to a temporary file next to path and renames it into place,
+    so readers never observe a half-written file.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_labels(path, rows, precision=DEFAULT_PRECISION):
+    atomic_write_text(path, format_labels(rows, precision))
+
+
+def row_to_box(row, img_width, img_height):
+    """
+    Converts a label row to (class_id, x, y, w, h) in integer pixels.
+    """
+    cid, xc, yc, wn, hn = row
+    x = int((xc - wn / 2) * img_width)
+    y = int((yc - hn / 2) * img_height)
+    return cid, x, y, int(wn * img_width), int(hn * img_height)
+
+
+def box_to_row(class_id, x, y, w, h, img_width, img_height):
+    return (class_id, (x + w / 2) / img_width, (y + h / 2) / img_height,
+            w / img_width, h / img_height)
+
+
+def validate_rows(rows, known_ids=None, tolerance=1e-6):
+    """
+    Returns a list of (row_index, message) for rows that are degenerate,
+    out of the [0, 1] range or use a class id outside known_ids.
+    """
+    issues = []
+    lo, hi = -tolerance, 1.0 + tolerance
+    for i, (cid, xc, yc, w, h) in enumerate(rows):
+        if known_ids is not None and cid not in known_ids:
+            issues.append((i, f"unknown class id {cid}"))
+        if w <= 0 or h <= 0:
+            issues.append((i, f"degenerate box (w={w}, h={h})"))
+            continue
+        if not (lo <= xc - w / 2 and xc + w / 2 <= hi and lo <= yc - h / 2 and yc + h / 2 <= hi):
+            issues.append((i, "coordinates out of range"))
+    return issues
+
+
+def label_path_for(labels_dir, image_name):
+    base_name, _ = os.path.splitext(os.path.basename(image_name))
+    return os.path.join(labels_dir, base_name + LABEL_EXT)
+
+
+def label_key(path, root):
+    """
+    Key of the label (or image) file at path: its path below root without
+    the extension and with "/" separators, so "train/x" for
+    root/train/x.txt and "x" for root/x.txt. None outside root.
+    """
+    try:
+        rel = os.path.relpath(path, root)
+    except ValueError:
+        # Another drive on Windows.
+        return None
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return None
+    return os.path.splitext(rel)[0].replace(os.sep, "/")
+
+
+def key_label_path(labels_dir, key):
+    """
+    The label file of key below labels_dir; the inverse of label_key.
+    """
+    return os.path.join(labels_dir, *key.split("/")) + LABEL_EXT
+
+
+def iter_label_files(labels_dir, recursive=False):
+    """
+    Yields the paths of all label files directly inside labels_dir, sorted.
+    With recursive=True, subfolders are searched too (except hidden ones
+    such as the label cache) and paths are sorted by label_key.
+    """
+    if not recursive:
+        with os.scandir(labels_dir) as it:
+            names = sorted(e.name for e in it if e.is_file() and e.name.endswith(LABEL_EXT))
+        for name in names:
+            yield os.path.join(labels_dir, name)
+        return
+    keys = []
+    for folder, dirs, files in os.walk(labels_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        keys.extend(label_key(os.path.join(folder, name), labels_dir)
+                    for name in files if name.endswith(LABEL_EXT))
+    for key in sorted(keys):
+        yield key_label_path(labels_dir, key)